@@ -2,14 +2,38 @@
 API package for the Zolkin application.
 """
 import os
-from typing import List
+import asyncio
+from contextlib import asynccontextmanager, suppress
+from typing import AsyncIterator, List
 
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
+from prometheus_client import make_asgi_app
 from starlette.middleware.sessions import SessionMiddleware
 from uvicorn.middleware.proxy_headers import ProxyHeadersMiddleware
 
 from .routes import api_router
+from .routes.files import INGEST_MODE, MAX_BATCH_BYTES, MAX_UPLOAD_BYTES
+from .middleware import UploadSizeLimitMiddleware
+from .file_to_rag import refresh_on_ingestion_done
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI) -> AsyncIterator[None]:
+    """
+    Arranca y detiene las tareas de fondo de la API.
+    
+    En modo "queue" escucha los jobs terminados por los workers para actualizar
+    la descripción RAG de los agentes en caché.
+    """
+    task = asyncio.create_task(refresh_on_ingestion_done()) if INGEST_MODE == "queue" else None
+    try:
+        yield
+    finally:
+        if task is not None:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
 
 
 def create_app(cors_origins: List[str]) -> FastAPI:
@@ -24,6 +48,7 @@ def create_app(cors_origins: List[str]) -> FastAPI:
         title="Zolkin API",
         description="API para el asistente Zolkin con Herramientas de Google y RAG",
         version="0.2.0",
+        lifespan=lifespan,
     )
     
     # Configurar middleware CORS
@@ -35,6 +60,20 @@ def create_app(cors_origins: List[str]) -> FastAPI:
         allow_headers=["*"],
     )
     
+    # Rechazar subidas demasiado grandes antes de recibir el cuerpo completo
+    # (margen de 1 MB para los campos y delimitadores del multipart)
+    app.add_middleware(
+        UploadSizeLimitMiddleware,
+        max_bytes=MAX_UPLOAD_BYTES + 1024 * 1024,
+        path_prefixes=["/upload_file"],
+        exclude_prefixes=["/upload_file/batch"],
+    )
+    app.add_middleware(
+        UploadSizeLimitMiddleware,
+        max_bytes=MAX_BATCH_BYTES + 1024 * 1024,
+        path_prefixes=["/upload_file/batch"],
+    )
+    
     # Add ProxyHeadersMiddleware to handle forwarded headers
     app.add_middleware(ProxyHeadersMiddleware, trusted_hosts="*")
     
@@ -50,4 +89,8 @@ def create_app(cors_origins: List[str]) -> FastAPI:
     # Incluir las rutas de la API
     app.include_router(api_router)
     
+    # Métricas de ingesta en formato Prometheus
+    if os.getenv("METRICS_ENDPOINT", "true").lower() == "true":
+        app.mount("/metrics", make_asgi_app())
+    
     return app
@@ -1,90 +1,143 @@
 """Function to upsert a file into the RAG system."""
+import asyncio
 import logging
-from pathlib import Path
+from typing import Any, Dict, List, Optional
 
 from fastapi import HTTPException
 
-from services import (
-    AgentManager,
-    OCRProcessor,
-    manage_files,
-    get_milvus_conn,
-)
+from services import AgentManager, IngestionError, IngestionQueue, get_redis_conn, ingest_batch_async, ingest_file
 
 
 logger = logging.getLogger(__name__)
 
+# Mensajes de error devueltos al cliente por etapa fallida
+STAGE_ERRORS = {
+    "convert": "Error al procesar el archivo",
+    "ocr": "Error al procesar el archivo PDF",
+    "extract": "Error al procesar el archivo PDF",
+    "index": "Error al actualizar el almacenamiento",
+}
+
+
+def refresh_rag_description(user_email: str) -> None:
+    """
+    Actualiza la descripción de la herramienta RAG del agente del usuario, si está en caché.
+    """
+    zolkin_agent = AgentManager().get_zolkin(user_email)
+    if not zolkin_agent:
+        logger.warning(f"Agente no encontrado en caché para usuario: {user_email}")
+        return
+    try:
+        logger.info("Actualizando descripción RAG del agente")
+        zolkin_agent.update_rag_tool_description()
+        logger.info("Descripción RAG del agente actualizada correctamente")
+    except Exception as e:
+        logger.error(f"Error al actualizar la descripción RAG del agente: {e}")
+        raise HTTPException(status_code=500, detail="Error al actualizar la descripción del agente") from e
+
+
+async def refresh_on_ingestion_done() -> None:
+    """
+    Actualiza la descripción RAG de los agentes en caché cuando un worker termina un job.
+
+    Los workers publican el namespace de cada job terminado (`IngestionQueue.finish_job`),
+    así que el agente se actualiza aunque ningún cliente consulte el estado del job.
+    Se ejecuta hasta que se cancela.
+    """
+    pubsub = None
+    try:
+        while True:
+            try:
+                if pubsub is None:
+                    pubsub = await asyncio.to_thread(IngestionQueue(get_redis_conn()).subscribe_done)
+                message = await asyncio.to_thread(pubsub.get_message, timeout=1.0)
+            except Exception as e:
+                logger.error(f"Error al leer los jobs terminados: {e}")
+                if pubsub is not None:
+                    await asyncio.to_thread(pubsub.close)
+                    pubsub = None
+                await asyncio.sleep(5)
+                continue
+            if not message:
+                continue
+            data = message["data"]
+            user_email = data.decode() if isinstance(data, bytes) else data
+            try:
+                await asyncio.to_thread(refresh_rag_description, user_email)
+            except Exception as e:
+                logger.error(f"Error al actualizar el agente de {user_email} tras la ingesta: {e}")
+    finally:
+        if pubsub is not None:
+            await asyncio.to_thread(pubsub.close)
+
 
 def upsert_file_to_rag(
         user_email: str,
         file_path: str,
         pdfs_dir: str,
-    ) -> str:
+        sha256: Optional[str] = None,
+        language: Optional[str] = None,
+    ) -> Dict[str, Any]:
     """
     Función para insertar un archivo en el sistema RAG.
-    """
-    # Instanciar el gestor de agentes
-    agent_manager = AgentManager()
 
+    Si se indica el hash del archivo y el contenido ya fue procesado, se reutilizan
+    sus vectores o sus páginas extraídas. Si no se indica el idioma del OCR se usa el
+    fijado por el usuario o se detecta en cada documento.
+
+    Returns:
+        Dict[str, Any]: Nombre del PDF procesado, estadísticas de deduplicación, reporte y tiempos por etapa
+    """
     # Obtener el agente asociado al usuario
-    zolkin_agent = agent_manager.get_zolkin(user_email)
-    if not zolkin_agent:
+    if not AgentManager().get_zolkin(user_email):
         logger.error(f"Agente no encontrado en caché para usuario: {user_email}")
         raise HTTPException(status_code=500, detail="Agente no encontrado en caché")
-    
-    # Procesar el archivo
-    try:
-        logger.info(f"Procesando archivo con FileManager para: {file_path}")
-        pdf_file = manage_files(file_path, pdfs_dir)
-        if not pdf_file:
-            raise ValueError("Error al procesar el archivo a PDF")
-        logger.info(f"Archivo procesado correctamente, PDF ubicado en {pdf_file}")
-    except Exception as e:
-        logger.error(f"Error al procesar el archivo con FileManager: {e}")
-        raise HTTPException(status_code=500, detail="Error al procesar el archivo") from e
-    
-    # Aplicar OCR y cargar el contenido
+
+    # Procesar el archivo por todas las etapas de ingesta
     try:
-        logger.info("Iniciando proceso de OCR en archivo PDF")
-        ocr_processor = OCRProcessor()
-        ocr_pdf = ocr_processor.ocr_pdf(pdf_file)
-        if not ocr_pdf:
-            raise ValueError("Error al aplicar OCR al PDF")
-            
-        file_content = ocr_processor.load_pdf(
-            file_path=ocr_pdf, 
+        result = ingest_file(
             namespace=user_email,
+            file_path=file_path,
+            pdfs_dir=pdfs_dir,
+            sha256=sha256,
+            language=language,
         )
-        
-        if not file_content:
-            raise ValueError("Error al cargar el contenido del PDF")
-            
-        logger.info("OCR y carga de archivo completados correctamente")
-    except Exception as e:
-        logger.error(f"Error durante OCR o carga de archivo: {e}")
-        raise HTTPException(status_code=500, detail="Error al procesar el archivo PDF") from e
-    
-    # Actualizar Milvus
-    try:
-        milvus_conn = get_milvus_conn()
-        milvus_storage = milvus_conn.use_collection()
-        if not milvus_storage:
-            raise ValueError("Error al conectar con Milvus")
-            
-        logger.info("Actualizando almacenamiento Milvus con el contenido del archivo")
-        milvus_conn.upsert_files(milvus_storage, file_content)
-        logger.info("Almacenamiento Milvus actualizado correctamente")
-    except Exception as e:
-        logger.error(f"Error al actualizar el almacenamiento Milvus: {e}")
-        raise HTTPException(status_code=500, detail="Error al actualizar el almacenamiento") from e
-    
+    except IngestionError as e:
+        logger.error(f"Error en la etapa '{e.stage}' de ingesta: {e}")
+        raise HTTPException(status_code=500, detail=STAGE_ERRORS.get(e.stage, "Error al procesar el archivo")) from e
+
     # Actualizar la descripción RAG del agente
+    refresh_rag_description(user_email)
+
+    return result
+
+
+async def upsert_batch_to_rag(
+        user_email: str,
+        files: List[Dict[str, Any]],
+        pdfs_dir: str,
+        language: Optional[str] = None,
+    ) -> Dict[str, Any]:
+    """
+    Función para insertar varios archivos en el sistema RAG en una sola pasada.
+
+    Los archivos se procesan en paralelo y comparten los lotes de embeddings y de
+    inserción en Milvus.
+
+    Returns:
+        Dict[str, Any]: Estado de cada archivo y totales de la carga
+    """
+    if not AgentManager().get_zolkin(user_email):
+        logger.error(f"Agente no encontrado en caché para usuario: {user_email}")
+        raise HTTPException(status_code=500, detail="Agente no encontrado en caché")
+
     try:
-        logger.info("Actualizando descripción RAG del agente")
-        zolkin_agent.update_rag_tool_description()
-        logger.info("Descripción RAG del agente actualizada correctamente")
-    except Exception as e:
-        logger.error(f"Error al actualizar la descripción RAG del agente: {e}")
-        raise HTTPException(status_code=500, detail="Error al actualizar la descripción del agente")from e
-    
-    return Path(pdf_file).name
+        summary = await ingest_batch_async(namespace=user_email, files=files, pdfs_dir=pdfs_dir, language=language)
+    except IngestionError as e:
+        logger.error(f"Error en la etapa '{e.stage}' de la carga por lotes: {e}")
+        raise HTTPException(status_code=500, detail=STAGE_ERRORS.get(e.stage, "Error al procesar los archivos")) from e
+
+    if summary["done"]:
+        await asyncio.to_thread(refresh_rag_description, user_email)
+
+    return summary
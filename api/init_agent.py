@@ -6,6 +6,7 @@ from fastapi import HTTPException
 from google.oauth2.credentials import Credentials
 
 from services import (
+    ContentStore,
     MilvusStorage,
     ZolkinAgent,
     AgentManager,
@@ -40,6 +41,7 @@ def init_agent(user_email: str, credentials: Credentials) -> None:
             milvus_conn=milvus_conn,
             milvus_storage=milvus_storage,
             partition_key_field=user_email,
+            document_catalog=ContentStore(get_redis_conn()),
         )
         
         # Inicializar herramientas
@@ -0,0 +1,90 @@
+"""Middlewares for the app routes."""
+import logging
+from typing import Iterable
+
+from starlette.responses import JSONResponse
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+
+logger = logging.getLogger(__name__)
+
+
+class UploadSizeLimitMiddleware:
+    """
+    Rechaza las subidas que superan el tamaño máximo antes de leer el cuerpo completo.
+
+    Si la petición declara Content-Length se rechaza de inmediato; si no, se cuentan
+    los bytes recibidos y se corta la petición al superar el límite. El 413 lo envía
+    el propio middleware: una excepción lanzada mientras la app lee el formulario
+    la convertiría FastAPI en un 400 genérico.
+    """
+
+    def __init__(
+        self,
+        app: ASGIApp,
+        max_bytes: int,
+        path_prefixes: Iterable[str],
+        exclude_prefixes: Iterable[str] = (),
+    ) -> None:
+        self.app = app
+        self.max_bytes = max_bytes
+        self.path_prefixes = tuple(path_prefixes)
+        self.exclude_prefixes = tuple(exclude_prefixes)
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if (
+            scope["type"] != "http"
+            or scope["method"] not in ("POST", "PUT", "PATCH")
+            or not scope["path"].startswith(self.path_prefixes)
+            or (self.exclude_prefixes and scope["path"].startswith(self.exclude_prefixes))
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and int(content_length) > self.max_bytes:
+            logger.warning(f"Subida rechazada: Content-Length {int(content_length)} > {self.max_bytes}")
+            await self._reject(scope, receive, send)
+            return
+
+        received = 0
+        response_started = False
+        rejected = False
+
+        async def limited_receive() -> Message:
+            nonlocal received, rejected
+            if rejected:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes and not response_started:
+                    logger.warning(f"Subida cortada al superar {self.max_bytes} bytes")
+                    rejected = True
+                    await self._reject(scope, receive, send)
+                    # La app ve un cliente desconectado y deja de leer el cuerpo
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message: Message) -> None:
+            nonlocal response_started
+            # Ya se respondió con 413: se descarta lo que conteste la app
+            if rejected:
+                return
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not rejected:
+                raise
+
+    async def _reject(self, scope: Scope, receive: Receive, send: Send) -> None:
+        response = JSONResponse(
+            status_code=413,
+            content={"detail": f"El archivo supera el tamaño máximo de {self.max_bytes // (1024 * 1024)} MB"},
+        )
+        await response(scope, receive, send)
@@ -2,14 +2,43 @@
 File upload and processing routes for the Zolkin application.
 """
 import os
+import uuid
+import shutil
+import tempfile
+import asyncio
 import logging
 from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+from collections import defaultdict
 
-from fastapi.responses import JSONResponse
-from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form
+from fastapi.responses import FileResponse, JSONResponse
+from fastapi.concurrency import run_in_threadpool
+from starlette.requests import ClientDisconnect
+from fastapi import APIRouter, HTTPException, Request, UploadFile, File, Form, Header
 
-from services import secure_filename
-from ..file_to_rag import upsert_file_to_rag
+from services import (
+    ArchiveError,
+    IngestionQueue,
+    OCRScheduler,
+    ResumableUploads,
+    StorageManager,
+    StorageQuotaError,
+    UploadChecksumError,
+    UploadOffsetError,
+    UploadTooLargeError,
+    collect_ocr_metrics,
+    extract_archive,
+    get_milvus_conn,
+    get_redis_conn,
+    get_user_language,
+    manage_files_async,
+    namespace_folder,
+    normalize_language,
+    save_upload,
+    secure_filename,
+    set_user_language,
+)
+from ..file_to_rag import upsert_batch_to_rag, upsert_file_to_rag
 
 
 logger = logging.getLogger(__name__)
@@ -22,6 +51,10 @@ router = APIRouter(prefix="/upload_file", tags=["upload_file"])
 BASE_DIR = Path(os.environ.get("BASE_DIR", "./uploads"))
 UPLOAD_FOLDER = BASE_DIR / "originals"
 PDFS_FOLDER = BASE_DIR / "pdfs"
+# Archivos parciales de las subidas reanudables
+PARTIAL_FOLDER = UPLOAD_FOLDER / ".resumable"
+# Vistas previas generadas bajo demanda, una carpeta por hash de contenido
+PREVIEWS_FOLDER = PDFS_FOLDER / ".previews"
 
 # Create directories relative to project root
 try:
@@ -34,6 +67,21 @@ except OSError as e:
 
 ALLOWED_EXTENSIONS = {"pdf", "png", "jpg", "jpeg", "ppt", "pptx", "doc", "docx"}
 
+# Evita convertir dos veces el mismo archivo si se piden vistas previas simultáneas
+_preview_locks: defaultdict = defaultdict(asyncio.Lock)
+
+# Tamaño máximo de un archivo subido
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_MB", "100")) * 1024 * 1024
+# Tamaño máximo de un archivo subido por partes (subida reanudable)
+MAX_RESUMABLE_UPLOAD_BYTES = int(os.getenv("MAX_RESUMABLE_UPLOAD_MB", "1000")) * 1024 * 1024
+
+# Límites de una carga por lotes (archivos sueltos o un .zip)
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "100"))
+MAX_BATCH_BYTES = int(os.getenv("MAX_BATCH_MB", "1000")) * 1024 * 1024
+
+# "queue" delega la ingesta a los workers; "inline" la ejecuta en la propia petición
+INGEST_MODE = os.getenv("INGEST_MODE", "queue").lower()
+
 
 def allowed_file(filename: str) -> bool:
     """
@@ -48,24 +96,83 @@ def allowed_file(filename: str) -> bool:
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+async def check_storage_quota(user_email: str, incoming: int, paths: List[Path] = ()) -> None:
+    """
+    Verifica que los archivos recibidos caben en la cuota de almacenamiento del usuario.
+    
+    Args:
+        user_email (str): Namespace del usuario
+        incoming (int): Bytes que se van a almacenar
+        paths (List[Path]): Archivos ya guardados, que se eliminan si se supera la cuota
+    """
+    try:
+        await run_in_threadpool(StorageManager(get_redis_conn()).check_quota, user_email, incoming)
+    except StorageQuotaError as e:
+        logger.warning(f"Cuota de almacenamiento superada para {user_email}: {e}")
+        for path in paths:
+            Path(path).unlink(missing_ok=True)
+        raise HTTPException(status_code=507, detail="Se ha superado la cuota de almacenamiento") from e
+
+
+def user_folders(user_email: str) -> Tuple[Path, Path]:
+    """
+    Devuelve las carpetas de originales y de PDFs del usuario, creándolas si no existen.
+    
+    Cada usuario tiene las suyas, de modo que un archivo con el mismo nombre que el
+    de otro usuario no lo sobrescribe.
+    
+    Args:
+        user_email (str): Namespace del usuario
+        
+    Returns:
+        Tuple[Path, Path]: Carpeta de originales y carpeta de PDFs
+    """
+    uploads_dir = namespace_folder(UPLOAD_FOLDER, user_email)
+    pdfs_dir = namespace_folder(PDFS_FOLDER, user_email)
+    uploads_dir.mkdir(parents=True, exist_ok=True)
+    pdfs_dir.mkdir(parents=True, exist_ok=True)
+    return uploads_dir, pdfs_dir
+
+
+def validate_language(language: Optional[str]) -> Optional[str]:
+    """
+    Valida el idioma de OCR solicitado (p. ej. "spa" o "eng+spa").
+    
+    Args:
+        language (Optional[str]): Códigos de idioma de tesseract unidos con "+"
+        
+    Returns:
+        Optional[str]: El idioma normalizado, o None si no se indicó
+    """
+    if not language:
+        return None
+    try:
+        return normalize_language(language)
+    except ValueError as e:
+        logger.warning(f"Idioma de OCR no válido: {language}")
+        raise HTTPException(status_code=400, detail=str(e)) from e
+
+
 @router.post("/")
 async def upload_file(
     request: Request,
     file: UploadFile = File(...),
     filename: str = Form(...),
+    language: Optional[str] = Form(None),
 ):
     """
     Endpoint para subir un archivo.
     
-    Valida la autenticación del usuario, el archivo y el nombre proporcionado.
-    Guarda el archivo de forma segura, procesa el PDF mediante OCR, actualiza la base de datos 
-    Milvus y actualiza la descripción del agente.
+    Valida la autenticación del usuario, el archivo y el nombre proporcionado y
+    guarda el archivo de forma segura. En modo "queue" encola la ingesta (conversión,
+    OCR, extracción e indexado en Milvus) y responde de inmediato con el id del job;
+    en modo "inline" la ejecuta antes de responder.
     
     Args:
         request: Objeto de solicitud de FastAPI
         file: Archivo subido
         filename: Nombre personalizado para el archivo
-        redis: Conexión a Redis
+        language: Idioma del OCR (p. ej. "spa"); si se omite se usa el del usuario o se detecta
         
     Returns:
         JSONResponse: Respuesta con el resultado de la operación
@@ -90,30 +197,77 @@ async def upload_file(
     if not allowed_file(file.filename):
         logger.warning(f"Formato de archivo no válido para: {file.filename}")
         raise HTTPException(status_code=400, detail="Formato de archivo no válido")
+    
+    language = validate_language(language)
       
     # Construir el nuevo nombre de archivo de forma segura
     file_ext = file.filename.rsplit('.', 1)[1].lower()
     new_filename = secure_filename(f"{filename}.{file_ext}")
     logger.debug(f"Nuevo nombre de archivo seguro generado: {new_filename}")
     
-    # Preparar la ruta del archivo
-    file_path = UPLOAD_FOLDER / new_filename
+    # Preparar la ruta del archivo en la carpeta del usuario
+    uploads_dir, _ = user_folders(user_email)
+    file_path = uploads_dir / new_filename
     
     try:
-        # Guardar el archivo
-        contents = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(contents)
+        # Guardar el archivo por bloques, calculando su hash y limitando su tamaño
+        file_size, file_hash = await save_upload(file, file_path, max_bytes=MAX_UPLOAD_BYTES)
         logger.info(f"Archivo guardado correctamente en {file_path}")
+    except UploadTooLargeError as e:
+        logger.warning(f"Archivo '{new_filename}' rechazado: {e}")
+        raise HTTPException(status_code=413, detail="El archivo supera el tamaño máximo permitido") from e
     except Exception as e:
         logger.error(f"Error al guardar el archivo '{new_filename}': {e}")
         raise HTTPException(status_code=500, detail="Error al guardar el archivo") from e
     
-    # Procesar el archivo para el RAG
-    pdf_file = upsert_file_to_rag(
+    await check_storage_quota(user_email, file_size, [file_path])
+    return await _start_ingestion(request, user_email, file_path, file_size, file_hash, language)
+
+
+async def _start_ingestion(
+    request: Request,
+    user_email: str,
+    file_path: Path,
+    file_size: int,
+    file_hash: str,
+    language: Optional[str],
+) -> JSONResponse:
+    """
+    Inicia la ingesta de un archivo ya guardado en disco.
+    
+    En modo "queue" encola el job y responde con su id; en modo "inline" procesa
+    el archivo antes de responder.
+    """
+    _, pdfs_dir = user_folders(user_email)
+    # Encolar la ingesta para que la procese un worker fuera del proceso de la API
+    if INGEST_MODE == "queue":
+        job_id = IngestionQueue(get_redis_conn()).enqueue(
+            namespace=user_email,
+            file_path=str(file_path),
+            pdfs_dir=str(pdfs_dir),
+            filename=file_path.name,
+            sha256=file_hash,
+            size=file_size,
+            language=language,
+        )
+        return JSONResponse(
+            status_code=202,
+            content={
+                "message": "Archivo recibido, procesamiento en curso",
+                "filename": file_path.name,
+                "job_id": job_id,
+                "status_url": str(request.url_for("upload_status", job_id=job_id)),
+            }
+        )
+    
+    # Procesar el archivo para el RAG sin bloquear el event loop
+    result = await run_in_threadpool(
+        upsert_file_to_rag,
         user_email=user_email,
         file_path=str(file_path),
-        pdfs_dir=str(PDFS_FOLDER)
+        pdfs_dir=str(pdfs_dir),
+        sha256=file_hash,
+        language=language,
     )
     logger.info("Proceso de subida de archivo completado correctamente")
 
@@ -121,7 +275,572 @@ async def upload_file(
         status_code=200,
         content={
             "message": "Archivo subido correctamente",
-            "filename": new_filename,
-            "pdf_file": pdf_file
+            "filename": file_path.name,
+            "pdf_file": result["pdf_file"],
+            "linked_from": result.get("linked_from"),
+            "dedup": result["dedup"],
+            "stages": result["stages"],
+            "timings": result.get("timings"),
+        }
+    )
+
+
+def _batch_destination(filename: str, stems: Set[str], uploads_dir: Path) -> Path:
+    """
+    Devuelve la ruta de un archivo del lote con un nombre base único dentro del lote.
+    
+    El nombre base identifica el documento indexado, así que dos archivos del mismo
+    lote no pueden compartirlo (p. ej. "informe.pdf" e "informe.docx"). La ruta está
+    en la carpeta del usuario (`user_folders`), nunca en la compartida.
+    """
+    path = Path(filename)
+    stem, counter = path.stem, 1
+    while stem in stems:
+        stem = f"{path.stem}_{counter}"
+        counter += 1
+    stems.add(stem)
+    return uploads_dir / f"{stem}{path.suffix}"
+
+
+@router.post("/batch")
+async def upload_batch(
+    request: Request,
+    files: List[UploadFile] = File(...),
+    language: Optional[str] = Form(None),
+):
+    """
+    Endpoint para subir varios archivos de una vez.
+    
+    Acepta varios archivos y/o archivos .zip, que se descomprimen en disco. Todos los
+    archivos se procesan en un solo job: la conversión, el OCR y la extracción se
+    hacen en paralelo y los embeddings e inserciones en Milvus se agrupan entre
+    archivos. El progreso de cada archivo se consulta en el estado del job.
+    
+    Args:
+        request: Objeto de solicitud de FastAPI
+        files: Archivos subidos
+        language: Idioma del OCR para todos los archivos; si se omite se usa el del usuario o se detecta
+        
+    Returns:
+        JSONResponse: Archivos aceptados y rechazados y el id del job (o el resultado en modo "inline")
+    """
+    user_email = request.session.get("user_email")
+    if not user_email:
+        logger.warning("Usuario no autenticado en endpoint de subida por lotes")
+        raise HTTPException(status_code=401, detail="Usuario no autenticado")
+    
+    logger.info(f"Subida por lotes de {len(files)} archivos recibida de usuario: {user_email}")
+    language = validate_language(language)
+    
+    accepted: List[Dict[str, Any]] = []
+    rejected: List[Dict[str, str]] = []
+    stems: Set[str] = set()
+    uploads_dir, pdfs_dir = user_folders(user_email)
+    total_bytes = 0
+    
+    # El lote se guarda aparte y solo pasa a la carpeta del usuario una vez validado entero,
+    # para no dejar archivos huérfanos si un archivo posterior lo hace fallar
+    staging_dir = UPLOAD_FOLDER / f".batch-{uuid.uuid4().hex}"
+    staging_dir.mkdir()
+    staged: List[Tuple[Path, Path]] = []
+    try:
+        try:
+            for index, upload in enumerate(files):
+                name = upload.filename or ""
+                file_ext = name.rsplit('.', 1)[1].lower() if '.' in name else ""
+                
+                if file_ext == "zip":
+                    # Descomprimir y asignar a cada archivo un nombre único dentro del lote
+                    archive = staging_dir / f".archive-{index}.zip"
+                    size, _ = await save_upload(upload, archive, max_bytes=MAX_BATCH_BYTES - total_bytes)
+                    members = await run_in_threadpool(
+                        extract_archive,
+                        archive,
+                        staging_dir / f".archive-{index}",
+                        ALLOWED_EXTENSIONS,
+                        MAX_BATCH_BYTES - total_bytes,
+                        MAX_BATCH_FILES - len(accepted),
+                    )
+                    archive.unlink(missing_ok=True)
+                    for member_path, member_size, member_hash in members:
+                        destination = _batch_destination(member_path.name, stems, uploads_dir)
+                        staged.append((member_path, destination))
+                        accepted.append({"file_path": str(destination), "filename": destination.name, "sha256": member_hash})
+                        total_bytes += member_size
+                    continue
+                
+                if not allowed_file(name):
+                    rejected.append({"filename": name, "error": "Formato de archivo no válido"})
+                    continue
+                if len(accepted) >= MAX_BATCH_FILES:
+                    raise ArchiveError(f"El lote supera el máximo de {MAX_BATCH_FILES} archivos")
+                
+                destination = _batch_destination(secure_filename(name), stems, uploads_dir)
+                staged_path = staging_dir / destination.name
+                size, file_hash = await save_upload(
+                    upload, staged_path, max_bytes=min(MAX_UPLOAD_BYTES, MAX_BATCH_BYTES - total_bytes)
+                )
+                staged.append((staged_path, destination))
+                total_bytes += size
+                accepted.append({"file_path": str(destination), "filename": destination.name, "sha256": file_hash})
+        except UploadTooLargeError as e:
+            logger.warning(f"Lote rechazado por tamaño: {e}")
+            raise HTTPException(status_code=413, detail="El lote supera el tamaño máximo permitido") from e
+        except ArchiveError as e:
+            logger.warning(f"Lote rechazado: {e}")
+            raise HTTPException(status_code=400, detail=str(e)) from e
+        
+        if not accepted:
+            raise HTTPException(status_code=400, detail="El lote no contiene archivos válidos")
+        await check_storage_quota(user_email, total_bytes)
+        
+        for staged_path, destination in staged:
+            os.replace(staged_path, destination)
+    finally:
+        shutil.rmtree(staging_dir, ignore_errors=True)
+    
+    logger.info(f"Lote de {len(accepted)} archivos ({total_bytes} bytes) guardado para {user_email}")
+    
+    if INGEST_MODE == "queue":
+        job_id = IngestionQueue(get_redis_conn()).enqueue(
+            namespace=user_email,
+            file_path="",
+            pdfs_dir=str(pdfs_dir),
+            filename=f"{len(accepted)} archivos",
+            files=accepted,
+            size=total_bytes,
+            language=language,
+        )
+        return JSONResponse(
+            status_code=202,
+            content={
+                "message": "Archivos recibidos, procesamiento en curso",
+                "files": [item["filename"] for item in accepted],
+                "rejected": rejected,
+                "job_id": job_id,
+                "status_url": str(request.url_for("upload_status", job_id=job_id)),
+            }
+        )
+    
+    summary = await upsert_batch_to_rag(
+        user_email=user_email, files=accepted, pdfs_dir=str(pdfs_dir), language=language
+    )
+    return JSONResponse(
+        status_code=200,
+        content={
+            "message": "Archivos procesados",
+            "rejected": rejected,
+            **summary,
+        }
+    )
+
+
+def _resumable_session(uploads: ResumableUploads, upload_id: str, user_email: str) -> Dict[str, Any]:
+    """Devuelve la sesión de subida del usuario o responde 404."""
+    session = uploads.get(upload_id)
+    if session is None or session["namespace"] != user_email:
+        raise HTTPException(status_code=404, detail="Subida no encontrada")
+    return session
+
+
+@router.post("/resumable", name="resumable_create")
+async def create_resumable_upload(
+    request: Request,
+    filename: str = Form(...),
+    size: int = Form(...),
+    sha256: Optional[str] = Form(None),
+    language: Optional[str] = Form(None),
+):
+    """
+    Endpoint para iniciar una subida reanudable.
+    
+    El archivo se envía después por partes con PATCH a la URL devuelta, indicando
+    en la cabecera "Upload-Offset" la posición de cada parte. Si la conexión se
+    corta, se consulta la posición guardada y se continúa desde ahí. La ingesta
+    empieza automáticamente al recibir la última parte.
+    
+    Args:
+        request: Objeto de solicitud de FastAPI
+        filename: Nombre del archivo, con su extensión
+        size: Tamaño total del archivo en bytes
+        sha256: SHA-256 del archivo completo (hex), verificado al terminar la subida
+        language: Idioma del OCR (p. ej. "spa"); si se omite se usa el del usuario o se detecta
+        
+    Returns:
+        JSONResponse: Id de la subida, posición actual y URL a la que enviar las partes
+    """
+    user_email = request.session.get("user_email")
+    if not user_email:
+        logger.warning("Usuario no autenticado en endpoint de subida reanudable")
+        raise HTTPException(status_code=401, detail="Usuario no autenticado")
+    
+    if not allowed_file(filename):
+        logger.warning(f"Formato de archivo no válido para: {filename}")
+        raise HTTPException(status_code=400, detail="Formato de archivo no válido")
+    if size <= 0:
+        raise HTTPException(status_code=400, detail="Tamaño de archivo no válido")
+    if size > MAX_RESUMABLE_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="El archivo supera el tamaño máximo permitido")
+    if sha256 and (len(sha256) != 64 or any(c not in "0123456789abcdef" for c in sha256.lower())):
+        raise HTTPException(status_code=400, detail="SHA-256 no válido")
+    language = validate_language(language)
+    await check_storage_quota(user_email, size)
+    
+    uploads = ResumableUploads(get_redis_conn(), PARTIAL_FOLDER)
+    session = await run_in_threadpool(
+        uploads.create, user_email, secure_filename(filename), size, sha256, language=language
+    )
+    upload_url = str(request.url_for("resumable_status", upload_id=session["upload_id"]))
+    return JSONResponse(
+        status_code=201,
+        headers={"Location": upload_url, "Upload-Offset": "0"},
+        content={
+            "upload_id": session["upload_id"],
+            "filename": session["filename"],
+            "offset": 0,
+            "size": size,
+            "upload_url": upload_url,
+        }
+    )
+
+
+@router.get("/resumable/{upload_id}", name="resumable_status")
+async def resumable_upload_status(request: Request, upload_id: str):
+    """
+    Endpoint para consultar cuántos bytes de una subida reanudable se han recibido.
+    
+    Args:
+        request: Objeto de solicitud de FastAPI
+        upload_id: ID devuelto al iniciar la subida
+        
+    Returns:
+        JSONResponse: Posición desde la que continuar y tamaño total
+    """
+    user_email = request.session.get("user_email")
+    if not user_email:
+        logger.warning("Usuario no autenticado en endpoint de subida reanudable")
+        raise HTTPException(status_code=401, detail="Usuario no autenticado")
+    
+    uploads = ResumableUploads(get_redis_conn(), PARTIAL_FOLDER)
+    session = await run_in_threadpool(_resumable_session, uploads, upload_id, user_email)
+    return JSONResponse(
+        status_code=200,
+        headers={"Upload-Offset": str(session["offset"]), "Cache-Control": "no-store"},
+        content={
+            "upload_id": upload_id,
+            "filename": session["filename"],
+            "offset": session["offset"],
+            "size": session["size"],
+        }
+    )
+
+
+@router.patch("/resumable/{upload_id}")
+async def upload_resumable_chunk(
+    request: Request,
+    upload_id: str,
+    upload_offset: int = Header(..., alias="Upload-Offset"),
+    upload_checksum: Optional[str] = Header(None, alias="Upload-Checksum"),
+):
+    """
+    Endpoint para enviar una parte de una subida reanudable.
+    
+    El cuerpo de la petición son los bytes de la parte. Si la parte lleva la
+    cabecera "Upload-Checksum" (SHA-256 en hex) se descarta entera cuando no
+    coincide o llega incompleta; sin ella, los bytes recibidos antes de un corte
+    se conservan. Al recibir la última parte se verifica el archivo completo y se
+    inicia la ingesta.
+    
+    Args:
+        request: Objeto de solicitud de FastAPI
+        upload_id: ID devuelto al iniciar la subida
+        upload_offset: Posición de la parte dentro del archivo
+        upload_checksum: SHA-256 de la parte (opcional)
+        
+    Returns:
+        JSONResponse: La nueva posición o, con la última parte, el resultado de la ingesta
+    """
+    user_email = request.session.get("user_email")
+    if not user_email:
+        logger.warning("Usuario no autenticado en endpoint de subida reanudable")
+        raise HTTPException(status_code=401, detail="Usuario no autenticado")
+    
+    uploads = ResumableUploads(get_redis_conn(), PARTIAL_FOLDER)
+    session = await run_in_threadpool(_resumable_session, uploads, upload_id, user_email)
+    
+    try:
+        session = await uploads.write_chunk(upload_id, upload_offset, request.stream(), upload_checksum)
+    except UploadOffsetError as e:
+        logger.warning(f"Parte rechazada en la subida {upload_id}: {e}")
+        return JSONResponse(
+            status_code=409,
+            headers={"Upload-Offset": str(e.offset)},
+            content={"detail": str(e), "offset": e.offset},
+        )
+    except UploadChecksumError as e:
+        logger.warning(f"Parte corrupta en la subida {upload_id}: {e}")
+        raise HTTPException(status_code=460, detail=str(e)) from e
+    except UploadTooLargeError as e:
+        logger.warning(f"Parte rechazada en la subida {upload_id}: {e}")
+        raise HTTPException(status_code=413, detail="La parte supera el tamaño permitido") from e
+    except KeyError as e:
+        raise HTTPException(status_code=404, detail="Subida no encontrada") from e
+    except ClientDisconnect:
+        logger.info(f"Conexión cortada durante la subida {upload_id}; se podrá reanudar")
+        return JSONResponse(status_code=400, content={"detail": "Conexión cortada"})
+    
+    if session["offset"] < session["size"]:
+        return JSONResponse(
+            status_code=200,
+            headers={"Upload-Offset": str(session["offset"])},
+            content={"upload_id": upload_id, "offset": session["offset"], "size": session["size"]},
+        )
+    
+    # Última parte: verificar el archivo completo, moverlo a su sitio e iniciar la ingesta
+    uploads_dir, _ = user_folders(user_email)
+    file_path = uploads_dir / session["filename"]
+    try:
+        file_size, file_hash = await run_in_threadpool(uploads.complete, upload_id, file_path)
+    except UploadChecksumError as e:
+        logger.warning(f"Subida {upload_id} descartada: {e}")
+        raise HTTPException(status_code=460, detail=str(e)) from e
+    except KeyError as e:
+        # Otra petición completó la subida entre tanto
+        raise HTTPException(status_code=404, detail="Subida no encontrada") from e
+    logger.info(f"Subida reanudable {upload_id} completada en {file_path}")
+    
+    return await _start_ingestion(request, user_email, file_path, file_size, file_hash, session.get("language"))
+
+
+@router.delete("/resumable/{upload_id}")
+async def delete_resumable_upload(request: Request, upload_id: str):
+    """
+    Endpoint para cancelar una subida reanudable y borrar los bytes recibidos.
+    
+    Args:
+        request: Objeto de solicitud de FastAPI
+        upload_id: ID devuelto al iniciar la subida
+        
+    Returns:
+        JSONResponse: Confirmación de la cancelación
+    """
+    user_email = request.session.get("user_email")
+    if not user_email:
+        logger.warning("Usuario no autenticado en endpoint de subida reanudable")
+        raise HTTPException(status_code=401, detail="Usuario no autenticado")
+    
+    uploads = ResumableUploads(get_redis_conn(), PARTIAL_FOLDER)
+    await run_in_threadpool(_resumable_session, uploads, upload_id, user_email)
+    await run_in_threadpool(uploads.delete, upload_id)
+    return JSONResponse(status_code=200, content={"message": "Subida cancelada", "upload_id": upload_id})
+
+
+@router.get("/storage", name="storage_usage")
+async def storage_usage(request: Request):
+    """
+    Endpoint para consultar el espacio en disco que ocupan los archivos del usuario.
+    
+    Los archivos compartidos con otros usuarios (mismo contenido) se cuentan
+    completos para cada uno y se indican también en "shared_bytes".
+    
+    Args:
+        request: Objeto de solicitud de FastAPI
+        
+    Returns:
+        JSONResponse: Documentos, bytes de originales y PDFs, originales comprimidos o eliminados y la cuota
+    """
+    user_email = request.session.get("user_email")
+    if not user_email:
+        logger.warning("Usuario no autenticado en endpoint de almacenamiento")
+        raise HTTPException(status_code=401, detail="Usuario no autenticado")
+    
+    usage = await run_in_threadpool(StorageManager(get_redis_conn()).usage, user_email)
+    return JSONResponse(status_code=200, content=usage)
+
+
+@router.get("/ocr/metrics", name="ocr_metrics")
+async def ocr_metrics(request: Request):
+    """
+    Endpoint para consultar la carga del planificador de OCR.
+    
+    Devuelve las métricas publicadas por cada worker de ingesta (y por la API si
+    procesa archivos en modo "inline") junto con los totales.
+    
+    Args:
+        request: Objeto de solicitud de FastAPI
+        
+    Returns:
+        JSONResponse: Profundidad de la cola, páginas en curso y páginas por segundo
+    """
+    user_email = request.session.get("user_email")
+    if not user_email:
+        logger.warning("Usuario no autenticado en endpoint de métricas de OCR")
+        raise HTTPException(status_code=401, detail="Usuario no autenticado")
+    
+    processes = await run_in_threadpool(collect_ocr_metrics, get_redis_conn())
+    scheduler = OCRScheduler.current()
+    if scheduler is not None:
+        processes["api"] = scheduler.metrics()
+    
+    return JSONResponse(
+        status_code=200,
+        content={
+            "queue_depth": sum(m["queue_depth"] for m in processes.values()),
+            "in_flight": sum(m["in_flight"] for m in processes.values()),
+            "workers": sum(m["workers"] for m in processes.values()),
+            "pages_per_second": round(sum(m["pages_per_second"] for m in processes.values()), 3),
+            "processes": processes,
+        }
+    )
+
+
+@router.get("/ocr/language", name="ocr_language")
+async def get_ocr_language(request: Request):
+    """
+    Endpoint para consultar el idioma de OCR fijado por el usuario.
+    
+    Args:
+        request: Objeto de solicitud de FastAPI
+        
+    Returns:
+        JSONResponse: Idioma fijado (None si se detecta en cada documento)
+    """
+    user_email = request.session.get("user_email")
+    if not user_email:
+        logger.warning("Usuario no autenticado en endpoint de idioma de OCR")
+        raise HTTPException(status_code=401, detail="Usuario no autenticado")
+    
+    language = await run_in_threadpool(get_user_language, get_redis_conn(), user_email)
+    return JSONResponse(status_code=200, content={"language": language})
+
+
+@router.put("/ocr/language")
+async def put_ocr_language(request: Request, language: Optional[str] = Form(None)):
+    """
+    Endpoint para fijar el idioma de OCR de todas las subidas del usuario.
+    
+    Un idioma vacío vuelve a la detección automática en cada documento.
+    
+    Args:
+        request: Objeto de solicitud de FastAPI
+        language: Códigos de idioma de tesseract unidos con "+" (p. ej. "spa")
+        
+    Returns:
+        JSONResponse: Idioma fijado
+    """
+    user_email = request.session.get("user_email")
+    if not user_email:
+        logger.warning("Usuario no autenticado en endpoint de idioma de OCR")
+        raise HTTPException(status_code=401, detail="Usuario no autenticado")
+    
+    language = validate_language(language)
+    await run_in_threadpool(set_user_language, get_redis_conn(), user_email, language)
+    logger.info(f"Idioma de OCR de {user_email}: {language or 'detección automática'}")
+    return JSONResponse(status_code=200, content={"language": language})
+
+
+@router.get("/{job_id}", name="upload_status")
+async def upload_status(request: Request, job_id: str):
+    """
+    Endpoint para consultar el progreso de una ingesta encolada.
+    
+    Args:
+        request: Objeto de solicitud de FastAPI
+        job_id: ID del job devuelto al subir el archivo
+        
+    Returns:
+        JSONResponse: Estado del job y progreso de cada etapa
+    """
+    user_email = request.session.get("user_email")
+    if not user_email:
+        logger.warning("Usuario no autenticado en endpoint de estado de subida")
+        raise HTTPException(status_code=401, detail="Usuario no autenticado")
+    
+    # El agente se actualiza al terminar el job (`refresh_on_ingestion_done`), no al consultarlo
+    job = await run_in_threadpool(IngestionQueue(get_redis_conn()).get_job, job_id)
+    if job is None or job.get("namespace") != user_email:
+        raise HTTPException(status_code=404, detail="Job no encontrado")
+    
+    return JSONResponse(
+        status_code=200,
+        content={
+            "job_id": job_id,
+            "filename": job.get("filename"),
+            "status": job["status"],
+            "stage": job.get("stage"),
+            "stages": job.get("stages", {}),
+            "result": job.get("result"),
+            "files": job.get("files"),
+            "error": job.get("error"),
         }
     )
+
+
+@router.get("/preview/{source}", name="upload_preview")
+async def upload_preview(request: Request, source: str):
+    """
+    Endpoint para obtener la vista previa en PDF de un archivo indexado.
+    
+    El archivo se resuelve a través del registro de almacenamiento del propio usuario
+    (`StorageManager.locate`), nunca por nombre en las carpetas compartidas, de modo
+    que un archivo homónimo de otro usuario no se sirve jamás. Los documentos DOCX/PPTX
+    se indexan sin convertirlos, por lo que su PDF se genera la primera vez que se pide
+    la vista previa, en una carpeta propia de su contenido, y se reutiliza después.
+    
+    Args:
+        request: Objeto de solicitud de FastAPI
+        source: Nombre del archivo indexado (p. ej. "informe.pdf")
+        
+    Returns:
+        FileResponse: El PDF del archivo
+    """
+    user_email = request.session.get("user_email")
+    if not user_email:
+        logger.warning("Usuario no autenticado en endpoint de vista previa")
+        raise HTTPException(status_code=401, detail="Usuario no autenticado")
+    
+    source = secure_filename(source)
+    if not source.endswith(".pdf"):
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+    
+    # Solo se sirven archivos indexados y registrados en el namespace del usuario
+    milvus_conn = get_milvus_conn()
+    if not milvus_conn or not await run_in_threadpool(milvus_conn.has_source, user_email, source):
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+    storage = StorageManager(get_redis_conn())
+    located = await run_in_threadpool(storage.locate, user_email, source)
+    if located is None:
+        logger.warning(f"'{source}' no tiene registro de almacenamiento en el namespace {user_email}")
+        raise HTTPException(status_code=404, detail="Archivo no encontrado")
+    sha256, files = located
+    
+    async with _preview_locks[sha256]:
+        # Otra petición puede haber generado la vista previa mientras se esperaba el bloqueo
+        _, files = await run_in_threadpool(storage.locate, user_email, source) or located
+        pdf_path = files.get("pdf")
+        original = files.get("original")
+        if pdf_path is None and original is not None and original.suffix == ".pdf":
+            pdf_path = original
+        if pdf_path is None:
+            if original is None:
+                logger.warning(f"Original de '{source}' no encontrado para generar la vista previa")
+                raise HTTPException(status_code=404, detail="Archivo no encontrado")
+            
+            preview_dir = PREVIEWS_FOLDER / sha256
+            preview_dir.mkdir(parents=True, exist_ok=True)
+            if original.suffix != ".gz":
+                logger.info(f"Generando vista previa de '{original}'")
+                converted = await manage_files_async(str(original), str(preview_dir))
+            else:
+                # Los originales ya indexados se guardan comprimidos: se descomprime una copia temporal
+                logger.info(f"Generando vista previa de '{original}'")
+                with tempfile.TemporaryDirectory(dir=BASE_DIR) as tmpdir:
+                    restored = await run_in_threadpool(StorageManager.restore, original, Path(tmpdir))
+                    converted = await manage_files_async(str(restored), str(preview_dir))
+            if not converted:
+                raise HTTPException(status_code=500, detail="Error al generar la vista previa")
+            pdf_path = Path(converted)
+            # El PDF se registra con el documento: cuenta en la cuota y se borra con él
+            await run_in_threadpool(storage.record, user_email, sha256, source, None, str(pdf_path))
+    
+    return FileResponse(pdf_path, media_type="application/pdf", filename=source)
@@ -2,7 +2,34 @@
 from .auth import UserManager, GoogleAuthManager
 from .connections import get_redis_conn, get_milvus_conn
 from .agent import ZolkinAgent, AgentManager, RedisSaver, MilvusStorage
-from .files import FileManager, OCRProcessor, manage_files, secure_filename
+from .files import (
+    ArchiveError,
+    ContentStore,
+    FileManager,
+    IngestionError,
+    NearDuplicateFilter,
+    OCRProcessor,
+    OCRScheduler,
+    ResumableUploads,
+    StorageManager,
+    StorageQuotaError,
+    collect_ocr_metrics,
+    extract_archive,
+    get_user_language,
+    ingest_batch_async,
+    ingest_file,
+    manage_files,
+    manage_files_async,
+    namespace_folder,
+    normalize_language,
+    save_upload,
+    secure_filename,
+    set_user_language,
+    UploadChecksumError,
+    UploadOffsetError,
+    UploadTooLargeError,
+)
+from .jobs import IngestionQueue
 
 
 __all__ = [
@@ -14,8 +41,30 @@ __all__ = [
     "MilvusStorage",
     "UserManager",
     "GoogleAuthManager",
+    "ArchiveError",
+    "ContentStore",
     "FileManager",
+    "IngestionError",
+    "IngestionQueue",
+    "NearDuplicateFilter",
+    "extract_archive",
+    "ingest_batch_async",
+    "ingest_file",
     "manage_files",
+    "manage_files_async",
+    "namespace_folder",
     "OCRProcessor",
+    "OCRScheduler",
+    "ResumableUploads",
+    "StorageManager",
+    "StorageQuotaError",
+    "collect_ocr_metrics",
+    "get_user_language",
+    "normalize_language",
+    "save_upload",
     "secure_filename",
+    "set_user_language",
+    "UploadChecksumError",
+    "UploadOffsetError",
+    "UploadTooLargeError",
 ]
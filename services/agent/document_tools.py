@@ -0,0 +1,162 @@
+"""
+Herramienta del agente para consultar el catálogo de documentos del usuario.
+
+Devuelve el resumen y las palabras clave calculados al indexar cada documento
+(INGEST_SUMMARIES=true), sin embeddings ni búsquedas en Milvus, de modo que
+preguntas como "¿qué contiene el archivo X?" o "¿qué documentos hablan de Y?"
+se responden con una sola llamada barata antes de buscar en los documentos.
+"""
+import os
+import logging
+import unicodedata
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from pydantic import BaseModel, Field
+from langchain_core.tools import StructuredTool
+
+
+logger = logging.getLogger(__name__)
+
+# Documentos devueltos como máximo en una llamada
+MAX_DOCUMENTS = int(os.getenv("RAG_SUMMARY_MAX_DOCS", "20"))
+
+
+class DocumentSummaryInput(BaseModel):
+    """Esquema de entrada de la herramienta de resúmenes de documentos."""
+    consulta: Optional[str] = Field(
+        default=None,
+        description=(
+            "Nombre de archivo, tema o palabras a buscar en los resúmenes y palabras clave. "
+            "Omítela para listar todos los documentos."
+        ),
+    )
+
+
+def _normalize(text: str) -> str:
+    """Pasa el texto a minúsculas y sin acentos para compararlo."""
+    text = unicodedata.normalize("NFKD", text.lower())
+    return "".join(c for c in text if not unicodedata.combining(c))
+
+
+def format_summaries(documents: List[Dict[str, Any]], consulta: Optional[str] = None) -> str:
+    """
+    Filtra los documentos por la consulta y los presenta como texto para el agente.
+
+    Los documentos se ordenan por el número de términos de la consulta que aparecen
+    en su nombre, resumen o palabras clave. Los que no tienen resumen remiten a
+    buscar_informacion, también cuando la consulta los descarta, porque su contenido
+    no se ha podido comparar.
+
+    Args:
+        documents: Entradas de `ContentStore.summaries`
+        consulta: Términos a buscar; si se omite se devuelven todos los documentos
+
+    Returns:
+        Texto con un documento por línea
+    """
+    terms = [t for t in _normalize(consulta or "").split() if len(t) > 2]
+    unsummarized = 0
+    if terms:
+        scored = []
+        for document in documents:
+            haystack = _normalize(" ".join([
+                document["source"],
+                *document.get("aliases", []),
+                document.get("summary") or "",
+                *document.get("keywords", []),
+            ]))
+            score = sum(1 for t in terms if t in haystack)
+            if score:
+                scored.append((score, document))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        matched = [document for _, document in scored]
+        unsummarized = sum(1 for document in documents if not document.get("summary") and document not in matched)
+        documents = matched
+        if not documents:
+            return f"Ningún documento coincide con '{consulta}'. Prueba con buscar_informacion."
+
+    lines = []
+    for document in documents[:MAX_DOCUMENTS]:
+        names = ", ".join([document["source"], *document.get("aliases", [])])
+        pages = f" ({document['pages']} páginas)" if document.get("pages") else ""
+        summary = document.get("summary") or "sin resumen; consulta su contenido con buscar_informacion"
+        line = f"- {names}{pages}: {summary}"
+        if document.get("keywords"):
+            line += f" | Palabras clave: {', '.join(document['keywords'])}"
+        lines.append(line)
+    if len(documents) > MAX_DOCUMENTS:
+        lines.append(f"... y {len(documents) - MAX_DOCUMENTS} documentos más; concreta la consulta.")
+    if unsummarized:
+        lines.append(f"Hay {unsummarized} documentos más sin resumen; búscalos con buscar_informacion.")
+    return "\n".join(lines)
+
+
+def add_uncatalogued(documents: List[Dict[str, Any]], sources: Iterable[str]) -> List[Dict[str, Any]]:
+    """
+    Añade los documentos indexados que no están en el catálogo, p. ej. los indexados antes
+    de que existiera, como entradas sin resumen.
+
+    Args:
+        documents: Entradas de `ContentStore.summaries`
+        sources: Nombres de los documentos indexados en Milvus
+
+    Returns:
+        Las entradas del catálogo seguidas de las de los documentos que faltan
+    """
+    known = {name for document in documents for name in [document["source"], *document.get("aliases", [])]}
+    missing = [
+        {"source": source, "aliases": [], "pages": 0, "summary": None, "keywords": []}
+        for source in sorted(set(sources) - known)
+    ]
+    return documents + missing
+
+
+def create_document_summary_tool(
+    catalog: Any,
+    namespace: str,
+    list_sources: Optional[Callable[[], Iterable[str]]] = None,
+) -> Optional[StructuredTool]:
+    """
+    Crea la herramienta que consulta los resúmenes de los documentos del usuario.
+
+    Args:
+        catalog: Catálogo de contenidos con un método `summaries(namespace)` (p. ej. `ContentStore`)
+        namespace: Espacio de nombres del usuario
+        list_sources: Devuelve los documentos indexados del usuario, para incluir los que no
+            están en el catálogo
+
+    Returns:
+        Herramienta de resúmenes o None si hay error
+    """
+    def _summaries(consulta: Optional[str] = None) -> str:
+        try:
+            documents = catalog.summaries(namespace)
+        except Exception as e:
+            logger.error(f"Error al leer los resúmenes de documentos: {e}")
+            documents = []
+        if list_sources is not None:
+            try:
+                documents = add_uncatalogued(documents, list_sources())
+            except Exception as e:
+                logger.error(f"Error al listar los documentos indexados: {e}")
+        if not documents:
+            return "No hay resúmenes de documentos disponibles. Prueba con buscar_informacion."
+        return format_summaries(documents, consulta)
+
+    try:
+        tool = StructuredTool.from_function(
+            func=_summaries,
+            name="resumen_documentos",
+            description=(
+                "Devuelve el resumen y las palabras clave de los documentos del usuario, o solo de los "
+                "que coinciden con la consulta. Es rápida: úsala primero para saber qué contiene un "
+                "archivo o qué documentos tratan un tema, y usa buscar_informacion solo si necesitas "
+                "el detalle del texto."
+            ),
+            args_schema=DocumentSummaryInput,
+        )
+        logger.info(f"Herramienta de resúmenes creada para namespace: {namespace}")
+        return tool
+    except Exception as e:
+        logger.error(f"Error creando herramienta de resúmenes: {e}")
+        return None
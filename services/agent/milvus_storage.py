@@ -3,18 +3,92 @@ import os
 import json
 import hashlib
 import logging
-from typing import Optional, List
+from typing import Any, Dict, Optional, List
 
+from pydantic import BaseModel, Field
 from pymilvus import MilvusClient
 from langchain_milvus import Milvus
-from langchain_core.tools import Tool
+from langchain_core.tools import Tool, StructuredTool
 from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
 from langchain_openai import OpenAIEmbeddings
 from langchain.tools.retriever import create_retriever_tool
 
+from .retrieval import (
+    CrossEncoderReranker,
+    maximal_marginal_relevance,
+    reciprocal_rank_fusion,
+)
+
 
 logger = logging.getLogger(__name__)
 
+# Campos de la colección que se devuelven en las búsquedas directas con MilvusClient
+SEARCH_OUTPUT_FIELDS = ["text", "namespace", "source", "page", "author"]
+# Similitud coseno mínima de un documento recuperado
+SCORE_THRESHOLD = float(os.getenv("RAG_SCORE_THRESHOLD", "0.75"))
+
+
+class MultiQueryInput(BaseModel):
+    """Esquema de entrada de la herramienta de búsqueda multi-consulta."""
+    consultas: List[str] = Field(
+        description=(
+            "Lista de 2 a 5 reformulaciones o sub-preguntas de la consulta del usuario. "
+            "Todas se buscan a la vez en una sola llamada."
+        )
+    )
+
+
+class NamespaceRetriever(BaseRetriever):
+    """
+    Retriever sobre Milvus filtrado por namespace con MMR y re-ranking opcionales.
+    
+    Sobre-recupera `fetch_k` candidatos en una sola búsqueda. Con
+    `search_type="mmr"` los diversifica localmente usando los vectores devueltos
+    con los hits y, si hay un re-ranker disponible, los re-ordena antes de
+    devolver los `k` mejores.
+    """
+    storage: Any
+    namespace: str
+    k: int = 3
+    fetch_k: int = 30
+    score_threshold: float = SCORE_THRESHOLD
+    search_type: str = "similarity"
+    lambda_mult: float = 0.5
+    reranker: Optional[Any] = None
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        use_mmr = self.search_type == "mmr"
+        vector = self.storage.embeddings_model.embed_query(query)
+        output_fields = SEARCH_OUTPUT_FIELDS + ["vector"] if use_mmr else None
+        hits = self.storage.search_by_vectors(
+            [vector], self.namespace, limit=self.fetch_k, output_fields=output_fields
+        )
+        candidates = []
+        vectors = []
+        for hit in hits[0] if hits else []:
+            if hit.get("distance", 0.0) < self.score_threshold:
+                continue
+            entity = dict(hit["entity"])
+            text = entity.pop("text", "")
+            vectors.append(entity.pop("vector", None))
+            entity["score"] = hit["distance"]
+            candidates.append(Document(page_content=text, metadata=entity))
+        
+        if use_mmr and candidates:
+            # Con re-ranker se deja un margen de candidatos diversos para re-ordenar
+            mmr_k = max(self.k, self.fetch_k // 3) if self.reranker is not None else self.k
+            selected = maximal_marginal_relevance(vector, vectors, mmr_k, self.lambda_mult)
+            candidates = [candidates[i] for i in selected]
+        
+        if self.reranker is not None:
+            docs, _ = self.reranker.rerank(query, candidates, self.k)
+            return docs
+        return candidates[:self.k]
+
 
 class MilvusStorage:
     """
@@ -35,6 +109,19 @@ class MilvusStorage:
             api_key=os.getenv("OPENAI_API_KEY")
         )
         self.collection_name = collection_name
+        self._client: Optional[MilvusClient] = None
+
+    @property
+    def client(self) -> MilvusClient:
+        """
+        Cliente de Milvus reutilizable para búsquedas directas.
+        
+        Returns:
+            Instancia de MilvusClient conectada a MILVUS_URL
+        """
+        if self._client is None:
+            self._client = MilvusClient(uri=self.milvus_url)
+        return self._client
 
     def _deterministic_hash(self, text: str) -> str:
         """
@@ -70,23 +157,33 @@ class MilvusStorage:
         except Exception as e:
             logger.error(f"Error eliminando documentos por IDs: {e}")
 
-    def use_collection(self, partition_key_field: str = "namespace") -> Optional[Milvus]:
+    def use_collection(
+        self,
+        partition_key_field: str = "namespace",
+        drop_old: Optional[bool] = None,
+    ) -> Optional[Milvus]:
         """
         Inicializa y conecta a una colección de Milvus.
         
         Args:
             partition_key_field: Campo para particionar la colección
+            drop_old: Eliminar la colección existente (por defecto usa MILVUS_DROP_OLD de env, false).
+                Solo debe activarse donde se quiere reiniciar la colección a propósito: se llama
+                en cada login e ingesta y borraría la colección promovida por `services.reindex`
             
         Returns:
             Instancia de Milvus conectada o None si hay error
         """
+        if drop_old is None:
+            drop_old = os.getenv("MILVUS_DROP_OLD", "false").lower() == "true"
+        
         try:
             logger.info(f"Conectando a Milvus en: {self.milvus_url}")
             vector_storage = Milvus(
                 embedding_function=self.embeddings_model,
                 collection_name=self.collection_name,
                 connection_args={"uri": self.milvus_url},
-                drop_old=True,
+                drop_old=drop_old,
                 auto_id=False,
                 primary_field="primary_key",
                 index_params={"metric_type": "COSINE"},
@@ -103,6 +200,7 @@ class MilvusStorage:
                             "source": "initialization",
                             "page": 0,
                             "author": "system",
+                            "chunk": 0,
                         },
                         page_content="Documento de inicialización",
                     )
@@ -115,6 +213,76 @@ class MilvusStorage:
             logger.error(f"Error al conectar a Milvus: {type(e).__name__} - {str(e)}")
             return None
 
+    def document_id(self, doc: Document, chunk: Optional[int] = None) -> str:
+        """
+        ID determinístico de un documento a partir de sus metadatos.
+        
+        El índice del fragmento solo entra en el hash cuando es mayor que 0, así las
+        páginas de un solo fragmento conservan el ID que tenían antes de guardar el
+        campo `chunk` en los metadatos.
+        
+        Args:
+            doc: Documento a identificar
+            chunk: Índice del fragmento dentro de la página (por defecto, el de sus metadatos)
+            
+        Returns:
+            String con el hash SHA-256 hexadecimal
+        """
+        if chunk is None:
+            chunk = doc.metadata.get("chunk", 0)
+        metadata = {key: value for key, value in doc.metadata.items() if key != "chunk"}
+        if chunk:
+            metadata["chunk"] = chunk
+        return self._deterministic_hash(json.dumps(metadata))
+
+    def _collection_fields(self) -> List[str]:
+        """
+        Campos del esquema de la colección.
+        
+        Las colecciones creadas antes de guardar `chunk` en los metadatos no tienen ese campo.
+        
+        Returns:
+            Lista con el nombre de cada campo
+        """
+        description = self.client.describe_collection(self.collection_name)
+        return [field["name"] for field in description.get("fields", [])]
+
+    def upsert_embeddings(
+        self,
+        vectorstore: Milvus,
+        docs: List[Document],
+        embeddings: List[List[float]],
+        ids: List[str],
+    ) -> Optional[List[str]]:
+        """
+        Inserta o actualiza documentos cuyos vectores ya fueron calculados.
+        
+        Args:
+            vectorstore: Instancia de Milvus ya conectada
+            docs: Documentos a insertar/actualizar
+            embeddings: Vector de cada documento
+            ids: ID de cada documento
+            
+        Returns:
+            Lista de IDs de los documentos insertados o None si hay error
+        """
+        if not docs:
+            return None
+        
+        try:
+            self._delete_by_ids(ids)
+            inserted = vectorstore.add_embeddings(
+                texts=[doc.page_content for doc in docs],
+                embeddings=embeddings,
+                metadatas=[doc.metadata for doc in docs],
+                ids=ids,
+            )
+            logger.info(f"Insertados/actualizados {len(inserted)} documentos en Milvus")
+            return inserted
+        except Exception as e:
+            logger.error(f"Error al insertar/actualizar documentos: {e}")
+            return None
+
     def upsert_files(self, vectorstore: Milvus, docs: List[Document]) -> Optional[List[str]]:
         """
         Inserta o actualiza documentos en el vectorstore.
@@ -131,8 +299,8 @@ class MilvusStorage:
             return None
         
         try:
-            # Generar IDs determinísticos basados en metadatos
-            uuids = [self._deterministic_hash(json.dumps(doc.metadata)) for doc in docs]
+            # Generar IDs determinísticos basados en metadatos (incluido el índice del fragmento)
+            uuids = [self.document_id(doc) for doc in docs]
             
             # Eliminar documentos existentes con los mismos IDs
             self._delete_by_ids(uuids)
@@ -145,6 +313,92 @@ class MilvusStorage:
             logger.error(f"Error al insertar/actualizar documentos: {e}")
             return None
 
+    def has_source(self, namespace: str, source: str) -> bool:
+        """
+        Indica si un archivo tiene filas indexadas en el namespace.
+        
+        Args:
+            namespace: Espacio de nombres del archivo
+            source: Nombre del archivo
+            
+        Returns:
+            True si existe al menos una fila del archivo
+        """
+        rows = self.client.query(
+            collection_name=self.collection_name,
+            filter=f"namespace == '{namespace}' and source == '{source}'",
+            output_fields=["source"],
+            limit=1,
+        )
+        return bool(rows)
+
+    def delete_source(self, namespace: str, source: str) -> None:
+        """
+        Elimina todas las filas de un archivo del namespace.
+        
+        Args:
+            namespace: Espacio de nombres del archivo
+            source: Nombre del archivo
+        """
+        self.client.delete(
+            collection_name=self.collection_name,
+            filter=f"namespace == '{namespace}' and source == '{source}'",
+        )
+        logger.info(f"Eliminadas las filas de '{source}' del namespace {namespace}")
+
+    def copy_source(
+        self,
+        vectorstore: Milvus,
+        namespace: str,
+        source: str,
+        new_source: str,
+    ) -> int:
+        """
+        Copia los vectores de un archivo ya indexado bajo un nuevo nombre, sin volver a embeberlos.
+        
+        Args:
+            vectorstore: Instancia de Milvus ya conectada
+            namespace: Espacio de nombres del archivo
+            source: Nombre con el que el archivo ya está indexado
+            new_source: Nuevo nombre para las copias
+            
+        Returns:
+            Número de filas copiadas
+        """
+        has_chunk = "chunk" in self._collection_fields()
+        rows = self.client.query(
+            collection_name=self.collection_name,
+            filter=f"namespace == '{namespace}' and source == '{source}'",
+            output_fields=SEARCH_OUTPUT_FIELDS + ["vector"] + (["chunk"] if has_chunk else []),
+        )
+        if not rows:
+            logger.info(f"No hay filas de '{source}' para copiar")
+            return 0
+        
+        texts, embeddings, docs = [], [], []
+        # Sin el campo `chunk` se numeran los fragmentos de cada página para que sus IDs no choquen
+        page_chunks: Dict[Any, int] = {}
+        for row in sorted(rows, key=lambda r: (r.get("page", 0), r.get("chunk", 0))):
+            page = row.get("page", 0)
+            chunk = row["chunk"] if has_chunk else page_chunks.get(page, 0)
+            page_chunks[page] = chunk + 1
+            texts.append(row["text"])
+            embeddings.append(row["vector"])
+            docs.append(Document(page_content=row["text"], metadata={
+                "namespace": namespace,
+                "source": new_source,
+                "page": page,
+                "author": row.get("author", ""),
+                "chunk": chunk,
+            }))
+        
+        metadatas = [doc.metadata for doc in docs]
+        uuids = [self.document_id(doc) for doc in docs]
+        self._delete_by_ids(uuids)
+        vectorstore.add_embeddings(texts, embeddings, metadatas, ids=uuids)
+        logger.info(f"Copiadas {len(uuids)} filas de '{source}' a '{new_source}' sin re-embeber")
+        return len(uuids)
+
     def create_retriever_tool(self, vectorstore: Milvus, namespace: str) -> Optional[Tool]:
         """
         Crea una herramienta de recuperación para LangChain.
@@ -161,15 +415,36 @@ class MilvusStorage:
             return None
         
         try:
-            # Configurar el retriever con filtro por namespace
-            retriever = vectorstore.as_retriever(
-                search_kwargs={
-                    "expr": f"namespace == '{namespace}'",
-                    "k": 3,  # Aumentado a 3 para mejorar la recuperación de contexto
-                    "metric_type": "COSINE",
-                    "score_threshold": 0.75,  # Ajustado para mejor recall
-                }
-            )
+            reranker = None
+            if os.getenv("RAG_RERANK", "false").lower() == "true":
+                reranker = CrossEncoderReranker()
+                if not reranker.available:
+                    reranker = None
+            
+            search_type = os.getenv("RAG_SEARCH_TYPE", "similarity").lower()
+            
+            if reranker is not None or search_type == "mmr":
+                # Sobre-recuperar candidatos, diversificarlos y/o re-ordenarlos localmente
+                retriever = NamespaceRetriever(
+                    storage=self,
+                    namespace=namespace,
+                    k=int(os.getenv("RAG_K", "3")),
+                    fetch_k=int(os.getenv("RAG_FETCH_K", "30")),
+                    score_threshold=SCORE_THRESHOLD,
+                    search_type=search_type,
+                    lambda_mult=float(os.getenv("RAG_MMR_LAMBDA", "0.5")),
+                    reranker=reranker,
+                )
+            else:
+                # Configurar el retriever con filtro por namespace
+                retriever = vectorstore.as_retriever(
+                    search_kwargs={
+                        "expr": f"namespace == '{namespace}'",
+                        "k": 3,  # Aumentado a 3 para mejorar la recuperación de contexto
+                        "metric_type": "COSINE",
+                        "score_threshold": SCORE_THRESHOLD,  # Ajustado para mejor recall
+                    }
+                )
             
             # Crear la herramienta de recuperación
             retriever_tool = create_retriever_tool(
@@ -181,4 +456,113 @@ class MilvusStorage:
             return retriever_tool
         except Exception as e:
             logger.error(f"Error creando herramienta de recuperación: {e}")
-            return None
\ No newline at end of file
+            return None
+
+    def search_by_vectors(
+        self,
+        vectors: List[List[float]],
+        namespace: str,
+        limit: int,
+        output_fields: Optional[List[str]] = None,
+    ) -> List[List[Dict[str, Any]]]:
+        """
+        Ejecuta una única búsqueda en Milvus con `nq = len(vectors)`.
+        
+        Args:
+            vectors: Vectores de consulta
+            namespace: Espacio de nombres para filtrar la búsqueda
+            limit: Número de hits por consulta
+            output_fields: Campos a devolver con cada hit
+            
+        Returns:
+            Una lista de hits por vector de consulta
+        """
+        if not vectors:
+            return []
+        return self.client.search(
+            collection_name=self.collection_name,
+            data=vectors,
+            filter=f"namespace == '{namespace}'",
+            limit=limit,
+            output_fields=output_fields or SEARCH_OUTPUT_FIELDS,
+            search_params={"metric_type": "COSINE"},
+            anns_field="vector",
+        )
+
+    def multi_query_search(
+        self,
+        queries: List[str],
+        namespace: str,
+        k: int = 3,
+        fetch_k: int = 10,
+        score_threshold: float = SCORE_THRESHOLD,
+    ) -> List[Document]:
+        """
+        Busca varias consultas a la vez y fusiona los resultados con RRF.
+        
+        Las consultas se embeben en una sola petición por lotes y se buscan en una
+        sola llamada a Milvus; los hits se deduplican por clave primaria.
+        
+        Args:
+            queries: Variantes o sub-preguntas de la consulta original
+            namespace: Espacio de nombres para filtrar la búsqueda
+            k: Número de documentos a devolver tras la fusión
+            fetch_k: Número de hits por consulta antes de fusionar
+            score_threshold: Similitud mínima de un hit para participar en la fusión
+            
+        Returns:
+            Lista de documentos ordenados por puntuación RRF
+        """
+        queries = list(dict.fromkeys(q.strip() for q in queries if q and q.strip()))
+        if not queries:
+            return []
+        
+        vectors = self.embeddings_model.embed_documents(queries)
+        results = self.search_by_vectors(vectors, namespace, limit=fetch_k)
+        fused = reciprocal_rank_fusion(results, score_threshold=score_threshold)
+        
+        docs = []
+        for hit in fused[:k]:
+            entity = dict(hit["entity"])
+            text = entity.pop("text", "")
+            entity["score"] = hit["distance"]
+            entity["rrf_score"] = hit["rrf_score"]
+            docs.append(Document(page_content=text, metadata=entity))
+        logger.info(f"Búsqueda multi-consulta: {len(queries)} consultas, {len(docs)} documentos devueltos")
+        return docs
+
+    def create_multi_query_tool(self, namespace: str, k: int = 3) -> Optional[StructuredTool]:
+        """
+        Crea una herramienta que busca varias reformulaciones en una sola llamada.
+        
+        Args:
+            namespace: Espacio de nombres para filtrar la búsqueda
+            k: Número de documentos a devolver
+            
+        Returns:
+            Herramienta de búsqueda multi-consulta o None si hay error
+        """
+        def _search(consultas: List[str]) -> str:
+            try:
+                docs = self.multi_query_search(consultas, namespace, k=k)
+            except Exception as e:
+                logger.error(f"Error en la búsqueda multi-consulta: {e}")
+                return "No se pudo buscar en los documentos del usuario. Inténtalo de nuevo más tarde."
+            return "\n\n".join(doc.page_content for doc in docs)
+        
+        try:
+            tool = StructuredTool.from_function(
+                func=_search,
+                name="buscar_informacion_multiple",
+                description=(
+                    "Busca en la base de conocimiento varias reformulaciones o sub-preguntas a la vez. "
+                    "Úsala en lugar de llamar varias veces a buscar_informacion cuando la pregunta "
+                    "tenga varias partes o admita distintas formulaciones."
+                ),
+                args_schema=MultiQueryInput,
+            )
+            logger.info(f"Herramienta multi-consulta creada para namespace: {namespace}")
+            return tool
+        except Exception as e:
+            logger.error(f"Error creando herramienta multi-consulta: {e}")
+            return None
@@ -0,0 +1,205 @@
+"""
+Utilidades de recuperación para el sistema RAG.
+Incluye la fusión de rankings (Reciprocal Rank Fusion) usada por la búsqueda
+multi-consulta sobre Milvus, la diversificación MMR y el re-ranking local
+con un cross-encoder.
+"""
+import os
+import time
+import logging
+import threading
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+
+logger = logging.getLogger(__name__)
+
+# Constante de suavizado estándar de RRF (Cormack et al., 2009)
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(
+    results: List[List[Dict[str, Any]]],
+    k: int = RRF_K,
+    score_threshold: float = 0.0,
+) -> List[Dict[str, Any]]:
+    """
+    Fusiona varias listas de resultados de Milvus usando Reciprocal Rank Fusion.
+
+    Cada lista corresponde a una consulta (un vector de `nq`). Los hits se
+    deduplican por clave primaria y se ordenan por la suma de 1 / (k + rango).
+
+    Args:
+        results: Resultados de `MilvusClient.search`, una lista de hits por consulta
+        k: Constante de suavizado de RRF
+        score_threshold: Similitud mínima que debe tener un hit para participar
+
+    Returns:
+        Lista de hits fusionados, cada uno con las claves `id`, `entity`,
+        `distance` (mejor similitud observada) y `rrf_score`
+    """
+    fused: Dict[Any, Dict[str, Any]] = {}
+    for hits in results:
+        rank = 0
+        for hit in hits:
+            if hit.get("distance", 0.0) < score_threshold:
+                continue
+            rank += 1
+            hit_id = hit["id"]
+            entry = fused.get(hit_id)
+            if entry is None:
+                entry = {
+                    "id": hit_id,
+                    "entity": hit.get("entity", {}),
+                    "distance": hit.get("distance", 0.0),
+                    "rrf_score": 0.0,
+                }
+                fused[hit_id] = entry
+            entry["rrf_score"] += 1.0 / (k + rank)
+            entry["distance"] = max(entry["distance"], hit.get("distance", 0.0))
+
+    ranked = sorted(fused.values(), key=lambda e: e["rrf_score"], reverse=True)
+    logger.debug(f"RRF: {sum(len(h) for h in results)} hits fusionados en {len(ranked)} únicos")
+    return ranked
+
+
+def maximal_marginal_relevance(
+    query_vector: List[float],
+    candidate_vectors: List[List[float]],
+    k: int,
+    lambda_mult: float = 0.5,
+) -> List[int]:
+    """
+    Selecciona `k` candidatos con Maximal Marginal Relevance.
+
+    Las similitudes se calculan una sola vez como productos de matrices
+    normalizadas; cada iteración sólo actualiza la redundancia máxima con el
+    último candidato elegido.
+
+    Args:
+        query_vector: Vector de la consulta
+        candidate_vectors: Vectores de los candidatos, en orden de relevancia
+        k: Número de candidatos a seleccionar
+        lambda_mult: 1 prioriza relevancia, 0 prioriza diversidad
+
+    Returns:
+        Índices de los candidatos seleccionados, en orden de selección
+    """
+    if not candidate_vectors or k <= 0:
+        return []
+
+    candidates = np.asarray(candidate_vectors, dtype=np.float32)
+    query = np.asarray(query_vector, dtype=np.float32)
+    candidates /= np.linalg.norm(candidates, axis=1, keepdims=True) + 1e-12
+    query /= np.linalg.norm(query) + 1e-12
+
+    relevance = candidates @ query
+    similarity = candidates @ candidates.T
+
+    selected = [int(np.argmax(relevance))]
+    redundancy = similarity[selected[0]].copy()
+    available = np.ones(len(candidates), dtype=bool)
+    available[selected[0]] = False
+
+    while len(selected) < min(k, len(candidates)):
+        scores = lambda_mult * relevance - (1 - lambda_mult) * redundancy
+        scores[~available] = -np.inf
+        best = int(np.argmax(scores))
+        selected.append(best)
+        available[best] = False
+        np.maximum(redundancy, similarity[best], out=redundancy)
+
+    return selected
+
+
+class CrossEncoderReranker:
+    """
+    Re-ranking de pasajes con un cross-encoder pequeño ejecutado en CPU.
+
+    El modelo se carga una sola vez por proceso y se comparte entre todos los
+    agentes. Requiere el grupo de dependencias opcional `rerank`
+    (sentence-transformers); si no está instalado o el modelo no se puede
+    descargar o cargar, `available` es False (el fallo se recuerda por proceso).
+    """
+
+    _models: Dict[str, Any] = {}
+    _lock = threading.Lock()
+
+    def __init__(self, model_name: Optional[str] = None, batch_size: int = 32):
+        """
+        Inicializa el re-ranker.
+
+        Args:
+            model_name: Modelo de Hugging Face (por defecto usa RAG_RERANK_MODEL de env)
+            batch_size: Tamaño de lote del forward pass
+        """
+        self.model_name = model_name or os.getenv(
+            "RAG_RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2"
+        )
+        self.batch_size = batch_size
+        self.last_rerank_ms: float = 0.0
+
+    def _get_model(self) -> Optional[Any]:
+        """Carga (una vez por proceso) y devuelve el cross-encoder."""
+        model = self._models.get(self.model_name)
+        if model is not None:
+            return model
+        with self._lock:
+            if self.model_name not in self._models:
+                try:
+                    from sentence_transformers import CrossEncoder
+                    logger.info(f"Cargando cross-encoder '{self.model_name}' en CPU")
+                    self._models[self.model_name] = CrossEncoder(self.model_name, device="cpu")
+                except ImportError:
+                    logger.warning("sentence-transformers no está instalado; re-ranking deshabilitado")
+                    self._models[self.model_name] = None
+                except Exception as e:
+                    # Descarga o carga fallida: se sigue con la recuperación sin re-ranking
+                    logger.error(f"No se pudo cargar el cross-encoder '{self.model_name}'; re-ranking deshabilitado: {e}")
+                    self._models[self.model_name] = None
+        return self._models[self.model_name]
+
+    @property
+    def available(self) -> bool:
+        """Indica si el modelo puede usarse en este proceso."""
+        return self._get_model() is not None
+
+    def rerank(self, query: str, docs: List[Document], top_k: int) -> Tuple[List[Document], float]:
+        """
+        Puntúa los candidatos en un único forward pass por lotes y devuelve los mejores.
+
+        Args:
+            query: Consulta del usuario
+            docs: Documentos candidatos (sobre-recuperados de Milvus)
+            top_k: Número de documentos a devolver
+
+        Returns:
+            Tupla con los documentos re-ordenados y el tiempo de re-ranking en ms
+        """
+        model = self._get_model()
+        if model is None or not docs:
+            return docs[:top_k], 0.0
+
+        start = time.perf_counter()
+        try:
+            scores = model.predict(
+                [(query, doc.page_content) for doc in docs],
+                batch_size=self.batch_size,
+                show_progress_bar=False,
+            )
+        except Exception as e:
+            logger.error(f"Error en el re-ranking; se devuelven los candidatos sin re-ordenar: {e}")
+            return docs[:top_k], 0.0
+        ranked = sorted(zip(docs, scores), key=lambda pair: float(pair[1]), reverse=True)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        self.last_rerank_ms = elapsed_ms
+
+        top_docs = []
+        for doc, score in ranked[:top_k]:
+            doc.metadata["rerank_score"] = float(score)
+            doc.metadata["rerank_ms"] = round(elapsed_ms, 2)
+            top_docs.append(doc)
+        logger.info(f"Re-ranking de {len(docs)} candidatos en {elapsed_ms:.1f} ms")
+        return top_docs, elapsed_ms
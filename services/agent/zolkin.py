@@ -19,6 +19,7 @@ from langgraph.prebuilt import create_react_agent
 from .memory import RedisSaver
 from .milvus_storage import MilvusStorage
 from .google_tools import get_google_toolkit
+from .document_tools import create_document_summary_tool
 
 
 logger = logging.getLogger(__name__)
@@ -41,7 +42,8 @@ class ZolkinAgent:
         partition_key_field: str,
         model_name: Optional[str] = None,
         api_key: Optional[str] = None,
-        system_message: Optional[str] = None
+        system_message: Optional[str] = None,
+        document_catalog: Optional[Any] = None
     ):
         """
         Inicializa el agente Zolkin.
@@ -54,20 +56,31 @@ class ZolkinAgent:
             model_name: Nombre del modelo a utilizar (por defecto usa OPENAI_MODEL de env)
             api_key: API key para el modelo (por defecto usa OPENAI_API_KEY de env)
             system_message: Mensaje de sistema personalizado
+            document_catalog: Catálogo con los resúmenes de los documentos (p. ej. `ContentStore`);
+                si se indica y INGEST_SUMMARIES está activado, el agente dispone de la
+                herramienta resumen_documentos
         """
         self.google_creds = google_creds
         self.milvus_conn = milvus_conn
         self.milvus_storage = milvus_storage
         self.partition_key_field = partition_key_field
+        # Sin resúmenes al indexar la herramienta solo listaría documentos sin resumen
+        summaries = os.getenv("INGEST_SUMMARIES", "false").lower() == "true"
+        self.document_catalog = document_catalog if summaries else None
         self._model = ChatOpenAI(
             model=model_name or os.getenv("OPENAI_MODEL", "gpt-4o-mini"),
             api_key=api_key or os.getenv("OPENAI_API_KEY"),
             temperature=0.2  # Temperatura más baja para respuestas más consistentes
         )
         self._tools: List[Tool] = []
+        summary_hint = (
+            "Para saber qué contiene un documento o qué documentos tratan un tema, consulta primero "
+            "resumen_documentos. "
+        ) if self.document_catalog is not None else ""
         self._default_system_message = system_message or (
             "Eres un asistente útil capaz de gestionar el correo electrónico y calendario del usuario. "
             "También puedes encontrar información valiosa usando la herramienta RAG. "
+            f"{summary_hint}"
             "Responde siempre en el mismo idioma que utilice el usuario. "
             "Si necesitas información adicional para completar una tarea, pregúntale al usuario de manera clara y directa."
         )
@@ -95,7 +108,22 @@ class ZolkinAgent:
                         f"Documentos disponibles: {file_list}. "
                         f"Usa esta herramienta cuando necesites información específica de estos documentos."
                     )
-                return [rag_tool]
+                rag_tools = [rag_tool]
+                # Resúmenes precalculados: responden sin buscar en Milvus
+                if self.document_catalog is not None:
+                    summary_tool = create_document_summary_tool(
+                        self.document_catalog,
+                        self.partition_key_field,
+                        lambda: self._get_unique_filenames(self.partition_key_field, collection_name),
+                    )
+                    if summary_tool:
+                        rag_tools.insert(0, summary_tool)
+                # Búsqueda multi-consulta en una sola llamada a Milvus
+                if os.getenv("RAG_MULTI_QUERY", "true").lower() == "true":
+                    multi_query_tool = self.milvus_conn.create_multi_query_tool(self.partition_key_field)
+                    if multi_query_tool:
+                        rag_tools.append(multi_query_tool)
+                return rag_tools
             else:
                 logger.warning("No se pudo crear la herramienta RAG")
                 return []
@@ -2,13 +2,47 @@
 Files package for file management and processing.
 """
 from .ocr import OCRProcessor
-from .utils import secure_filename
-from .file_manager import FileManager, manage_files
+from .utils import namespace_folder, secure_filename
+from .dedup import NearDuplicateFilter
+from .content_store import ContentStore
+from .language import get_user_language, normalize_language, set_user_language
+from .office_text import OfficeTextExtractor
+from .ocr_scheduler import OCRScheduler, collect_metrics as collect_ocr_metrics
+from .file_manager import FileManager, manage_files, manage_files_async
+from .pipeline import IngestionError, ingest_batch_async, ingest_file, ingest_file_async
+from .uploads import ArchiveError, UploadTooLargeError, extract_archive, save_upload
+from .resumable import ResumableUploads, UploadChecksumError, UploadOffsetError
+from .storage import StorageManager, StorageQuotaError
+from .summaries import DocumentSummarizer
 
 
 __all__ = [
+    "ArchiveError",
+    "ContentStore",
+    "DocumentSummarizer",
     "FileManager",
+    "IngestionError",
+    "NearDuplicateFilter",
     "OCRProcessor",
+    "OCRScheduler",
+    "OfficeTextExtractor",
+    "ResumableUploads",
+    "StorageManager",
+    "StorageQuotaError",
+    "extract_archive",
+    "ingest_batch_async",
+    "ingest_file",
+    "ingest_file_async",
     "manage_files",
+    "manage_files_async",
+    "namespace_folder",
+    "save_upload",
     "secure_filename",
+    "UploadChecksumError",
+    "UploadOffsetError",
+    "UploadTooLargeError",
+    "collect_ocr_metrics",
+    "get_user_language",
+    "normalize_language",
+    "set_user_language",
 ]
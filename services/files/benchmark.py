@@ -0,0 +1,626 @@
+"""
+Ingestion throughput benchmark on a generated corpus.
+
+Generates born-digital PDFs, scanned (image-only) PDFs, photographed pages as
+PNG and DOCX/PPTX files of several page counts, then runs each one through the
+same conversion, OCR and extraction stages as `ingest_file`. Indexing goes to an
+in-memory stand-in for Milvus with a stub embedding function, so the numbers
+reflect the local pipeline only:
+
+    python -m services.files.benchmark --pages 1,10,50 --repeat 3
+    OCR_MODE=force OCR_WORKERS=4 python -m services.files.benchmark --kinds scanned --json ocr.json
+
+Conversion and OCR settings are read from the environment as in production.
+Reported stage times overlap for streamed PDFs: extraction runs while earlier
+pages are being embedded and inserted.
+
+With --image-prep, phone-like photos (12+ MP JPEGs stored sideways with an EXIF
+orientation) are OCRed after each image normalization variant instead, and the
+time spent is reported against the word accuracy of tesseract on the known text:
+
+    python -m services.files.benchmark --image-prep --photos 5 --json prep.json
+"""
+import os
+import io
+import re
+import sys
+import json
+import time
+import random
+import shutil
+import hashlib
+import logging
+import zipfile
+import argparse
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+from difflib import SequenceMatcher
+from xml.sax.saxutils import escape
+from typing import Any, Dict, List, Optional
+
+import fitz
+from PIL import Image, ImageFilter
+from dotenv import load_dotenv
+from langchain_core.documents import Document
+
+from .ocr_scheduler import OCRScheduler
+from .language import DEFAULT_LANGUAGE
+from .image_prep import normalize_file
+from .streaming import StreamingIndexer, iter_chunks
+from .pipeline import IngestionError, _StageTracker, _extract_file, _source_name
+
+
+logger = logging.getLogger(__name__)
+
+KINDS = ["pdf", "scanned", "image", "docx", "pptx"]
+NAMESPACE = "benchmark"
+
+# Words the generated text is drawn from: Spanish and English, as in the real uploads
+_WORDS = (
+    "informe contrato factura cliente proveedor pago fecha importe servicio entrega "
+    "acuerdo cláusula anexo período revisión calidad proyecto presupuesto reunión "
+    "report invoice customer supplier payment amount service delivery agreement "
+    "clause annex period review quality project budget meeting schedule the of and "
+    "de la el en que los del las por con para una un se al"
+).split()
+
+_PAGE_RECT = fitz.Rect(0, 0, 595, 842)  # A4 in points
+_MARGIN = 56
+
+
+def _text(rng: random.Random, words: int) -> List[str]:
+    """Generate paragraphs of pseudo-random sentences totalling about `words` words."""
+    paragraphs, count = [], 0
+    while count < words:
+        sentences = []
+        for _ in range(rng.randint(3, 6)):
+            sentence = " ".join(rng.choice(_WORDS) for _ in range(rng.randint(6, 16)))
+            sentences.append(sentence.capitalize() + ".")
+        paragraph = " ".join(sentences)
+        paragraphs.append(paragraph)
+        count += len(paragraph.split())
+    return paragraphs
+
+
+def _text_pdf(rng: random.Random, pages: int) -> fitz.Document:
+    """Build a born-digital PDF with a heading and about 300 words per page."""
+    pdf = fitz.open()
+    for number in range(pages):
+        page = pdf.new_page(width=_PAGE_RECT.width, height=_PAGE_RECT.height)
+        body = "\n\n".join(_text(rng, 300))
+        page.insert_text((_MARGIN, _MARGIN), f"Section {number + 1}", fontsize=16)
+        body_rect = fitz.Rect(_MARGIN, _MARGIN + 24, _PAGE_RECT.width - _MARGIN, _PAGE_RECT.height - _MARGIN)
+        page.insert_textbox(body_rect, body, fontsize=10)
+    return pdf
+
+
+def _page_image(page: fitz.Page, dpi: int) -> Image.Image:
+    """Render a page as a grayscale image, as a scanner would."""
+    pixmap = page.get_pixmap(dpi=dpi, colorspace=fitz.csGRAY)
+    return Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+
+
+def generate_corpus(
+    directory: Path,
+    kinds: List[str],
+    page_counts: List[int],
+    seed: int = 0,
+    dpi: int = 200,
+) -> List[Dict[str, Any]]:
+    """
+    Generate the benchmark files.
+
+    Images are single pages: one PNG is generated per page count, each from its
+    own seed. PPTX packages only contain the parts the native extractor
+    reads (no masters or layouts).
+
+    Args:
+        directory (Path): Where the files are written.
+        kinds (List[str]): Which of KINDS to generate.
+        page_counts (List[int]): Page (section, slide) counts to generate for each kind.
+        seed (int): Seed of the text generator, so runs are comparable.
+        dpi (int): Resolution of the scanned pages and photos.
+
+    Returns:
+        List[Dict[str, Any]]: One {"kind", "pages", "path"} entry per file.
+    """
+    directory.mkdir(parents=True, exist_ok=True)
+    corpus = []
+    for kind in kinds:
+        for pages in page_counts:
+            rng = random.Random(f"{seed}-{kind}-{pages}")
+            path = directory / f"{kind}-{pages}.{_EXTENSIONS[kind]}"
+            _GENERATORS[kind](rng, pages, path, dpi)
+            corpus.append({"kind": kind, "pages": 1 if kind == "image" else pages, "path": str(path)})
+    return corpus
+
+
+def _write_pdf(rng: random.Random, pages: int, path: Path, dpi: int) -> None:
+    with _text_pdf(rng, pages) as pdf:
+        pdf.save(path, garbage=3, deflate=True)
+
+
+def _write_scanned(rng: random.Random, pages: int, path: Path, dpi: int) -> None:
+    with _text_pdf(rng, pages) as source, fitz.open() as scanned:
+        for page in source:
+            buffer = io.BytesIO()
+            _page_image(page, dpi).save(buffer, format="PNG")
+            target = scanned.new_page(width=page.rect.width, height=page.rect.height)
+            target.insert_image(target.rect, stream=buffer.getvalue())
+        scanned.save(path, garbage=3, deflate=True)
+
+
+def _write_image(rng: random.Random, pages: int, path: Path, dpi: int) -> None:
+    # A phone photo of a page: slightly rotated, blurred and on a darker background
+    with _text_pdf(rng, 1) as source:
+        image = _page_image(source[0], dpi)
+    image = image.rotate(rng.uniform(-2.5, 2.5), expand=True, fillcolor=96, resample=Image.BICUBIC)
+    image = image.filter(ImageFilter.GaussianBlur(0.8))
+    image.save(path, format="PNG")
+
+
+def _write_docx(rng: random.Random, pages: int, path: Path, dpi: int) -> None:
+    body = []
+    for number in range(pages):
+        body.append(
+            '<w:p><w:pPr><w:pStyle w:val="Heading1"/></w:pPr>'
+            f"<w:r><w:t>Section {number + 1}</w:t></w:r></w:p>"
+        )
+        for paragraph in _text(rng, 300):
+            body.append(f"<w:p><w:r><w:t>{escape(paragraph)}</w:t></w:r></w:p>")
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+        f"<w:body>{''.join(body)}</w:body></w:document>"
+    )
+    _write_package(path, {
+        "[Content_Types].xml": _content_types({
+            "/word/document.xml": "application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml",
+        }),
+        "_rels/.rels": _rels({"rId1": ("officeDocument", "word/document.xml")}),
+        "word/document.xml": document,
+        "docProps/core.xml": _core(),
+    })
+
+
+def _write_pptx(rng: random.Random, pages: int, path: Path, dpi: int) -> None:
+    parts = {}
+    slide_ids, slide_rels, overrides = [], {}, {}
+    for number in range(pages):
+        paragraphs = "".join(
+            f"<a:p><a:r><a:t>{escape(text)}</a:t></a:r></a:p>"
+            for text in [f"Slide {number + 1}", *_text(rng, 80)]
+        )
+        parts[f"ppt/slides/slide{number + 1}.xml"] = (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<p:sld xmlns:a="http://schemas.openxmlformats.org/drawingml/2006/main" '
+            'xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main">'
+            f"<p:cSld><p:spTree><p:sp><p:txBody>{paragraphs}</p:txBody></p:sp></p:spTree></p:cSld></p:sld>"
+        )
+        slide_ids.append(f'<p:sldId id="{256 + number}" r:id="rId{number + 1}"/>')
+        slide_rels[f"rId{number + 1}"] = ("slide", f"slides/slide{number + 1}.xml")
+        overrides[f"/ppt/slides/slide{number + 1}.xml"] = (
+            "application/vnd.openxmlformats-officedocument.presentationml.slide+xml"
+        )
+    overrides["/ppt/presentation.xml"] = (
+        "application/vnd.openxmlformats-officedocument.presentationml.presentation.main+xml"
+    )
+    parts.update({
+        "[Content_Types].xml": _content_types(overrides),
+        "_rels/.rels": _rels({"rId1": ("officeDocument", "ppt/presentation.xml")}),
+        "ppt/_rels/presentation.xml.rels": _rels(slide_rels),
+        "ppt/presentation.xml": (
+            '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+            '<p:presentation xmlns:p="http://schemas.openxmlformats.org/presentationml/2006/main" '
+            'xmlns:r="http://schemas.openxmlformats.org/officeDocument/2006/relationships">'
+            f"<p:sldIdLst>{''.join(slide_ids)}</p:sldIdLst></p:presentation>"
+        ),
+        "docProps/core.xml": _core(),
+    })
+    _write_package(path, parts)
+
+
+def _content_types(overrides: Dict[str, str]) -> str:
+    entries = "".join(f'<Override PartName="{name}" ContentType="{kind}"/>' for name, kind in overrides.items())
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="xml" ContentType="application/xml"/>'
+        f"{entries}</Types>"
+    )
+
+
+def _rels(targets: Dict[str, tuple]) -> str:
+    entries = "".join(
+        f'<Relationship Id="{rid}" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/{kind}" '
+        f'Target="{target}"/>'
+        for rid, (kind, target) in targets.items()
+    )
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        f'<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">{entries}</Relationships>'
+    )
+
+
+def _core() -> str:
+    return (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<cp:coreProperties xmlns:cp="http://schemas.openxmlformats.org/package/2006/metadata/core-properties" '
+        'xmlns:dc="http://purl.org/dc/elements/1.1/"><dc:creator>Benchmark</dc:creator></cp:coreProperties>'
+    )
+
+
+def _write_package(path: Path, parts: Dict[str, str]) -> None:
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_DEFLATED) as package:
+        for name, content in parts.items():
+            package.writestr(name, content)
+
+
+_EXTENSIONS = {"pdf": "pdf", "scanned": "pdf", "image": "png", "docx": "docx", "pptx": "pptx"}
+_GENERATORS = {
+    "pdf": _write_pdf,
+    "scanned": _write_scanned,
+    "image": _write_image,
+    "docx": _write_docx,
+    "pptx": _write_pptx,
+}
+
+
+# Image normalization variants compared by --image-prep; "original" is the photo as uploaded
+PREP_VARIANTS: Dict[str, Dict[str, Any]] = {
+    "original": {"target_dpi": None, "deskew": False, "binarize": False, "max_pixels": 10**9},
+    "dpi300": {"target_dpi": 300, "deskew": False, "binarize": False},
+    "dpi300-deskew": {"target_dpi": 300, "deskew": True, "binarize": False},
+    "dpi300-deskew-otsu": {"target_dpi": 300, "deskew": True, "binarize": True},
+    "dpi200-deskew": {"target_dpi": 200, "deskew": True, "binarize": False},
+}
+
+_TOKEN = re.compile(r"\w+")
+
+
+def _write_photo(rng: random.Random, path: Path, dpi: int) -> str:
+    """Write a phone-like JPEG photo of a page and return the text it shows."""
+    with _text_pdf(rng, 1) as source:
+        truth = source[0].get_text()
+        image = _page_image(source[0], dpi)
+    image = image.rotate(rng.uniform(-3, 3), expand=True, fillcolor=96, resample=Image.BICUBIC)
+    image = image.filter(ImageFilter.GaussianBlur(dpi / 250))
+    # Stored sideways with the orientation in EXIF, as phone cameras do
+    exif = Image.Exif()
+    exif[0x0112] = 6
+    image.rotate(90, expand=True).save(path, format="JPEG", quality=90, exif=exif)
+    return truth
+
+
+def word_accuracy(truth: str, text: str) -> float:
+    """Similarity of the word sequences of the expected and the OCRed text, from 0 to 1."""
+    expected = _TOKEN.findall(truth.lower())
+    found = _TOKEN.findall(text.lower())
+    return SequenceMatcher(None, expected, found, autojunk=False).ratio()
+
+
+def run_image_prep(photos: List[Dict[str, Any]], workdir: Path, language: str) -> List[Dict[str, Any]]:
+    """
+    OCR every photo after each normalization variant and measure time and accuracy.
+
+    Args:
+        photos (List[Dict[str, Any]]): {"path", "text"} entries from `_write_photo`.
+        workdir (Path): Where the normalized images are written.
+        language (str): The tesseract language(s).
+
+    Returns:
+        List[Dict[str, Any]]: One entry per photo and variant.
+    """
+    results = []
+    for photo in photos:
+        for name, options in PREP_VARIANTS.items():
+            prepared = workdir / f"{Path(photo['path']).stem}-{name}.png"
+            report = normalize_file(photo["path"], str(prepared), **options)
+            started = time.perf_counter()
+            result = subprocess.run(
+                ["tesseract", str(prepared), "stdout", "-l", language],
+                capture_output=True,
+                check=True,
+                text=True,
+            )
+            ocr_seconds = time.perf_counter() - started
+            results.append({
+                "photo": Path(photo["path"]).name,
+                "variant": name,
+                "original_pixels": report["original_pixels"],
+                "pixels": report["pixels"],
+                "deskew_degrees": report["deskew_degrees"],
+                "prep_seconds": report["seconds"],
+                "ocr_seconds": round(ocr_seconds, 3),
+                "seconds": round(report["seconds"] + ocr_seconds, 3),
+                "accuracy": round(word_accuracy(photo["text"], result.stdout), 4),
+            })
+    return results
+
+
+def summarize_image_prep(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Average the results per variant and compare them with the original photos.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Mean pixels, seconds and accuracy per variant, plus the
+        seconds saved per photo and the accuracy change against "original".
+    """
+    summary: Dict[str, Dict[str, Any]] = {}
+    for name in PREP_VARIANTS:
+        rows = [result for result in results if result["variant"] == name]
+        if not rows:
+            continue
+        summary[name] = {
+            field: round(sum(row[field] for row in rows) / len(rows), 4 if field == "accuracy" else 3)
+            for field in ("pixels", "prep_seconds", "ocr_seconds", "seconds", "accuracy")
+        }
+    baseline = summary.get("original")
+    for variant in summary.values():
+        if baseline:
+            variant["seconds_saved"] = round(baseline["seconds"] - variant["seconds"], 3)
+            variant["accuracy_delta"] = round(variant["accuracy"] - baseline["accuracy"], 4)
+    return summary
+
+
+def _print_image_prep(summary: Dict[str, Dict[str, Any]]) -> None:
+    header = f"{'variant':<20}{'MP':>7}{'prep s':>9}{'ocr s':>9}{'total s':>9}{'saved s':>9}{'accuracy':>10}{'delta':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, variant in summary.items():
+        print(
+            f"{name:<20}{variant['pixels'] / 1e6:>7.1f}{variant['prep_seconds']:>9.2f}{variant['ocr_seconds']:>9.2f}"
+            f"{variant['seconds']:>9.2f}{variant.get('seconds_saved', 0):>9.2f}"
+            f"{variant['accuracy']:>10.3f}{variant.get('accuracy_delta', 0):>+8.3f}"
+        )
+
+
+class MemoryIndex:
+    """
+    In-memory stand-in for `MilvusStorage` used by `StreamingIndexer`.
+
+    Embeddings are derived from a hash of the text, so they cost almost nothing;
+    `embed_latency` adds a fixed delay per batch to mimic a remote embedding API.
+    """
+
+    def __init__(self, dimension: int = 1536, embed_latency: float = 0.0) -> None:
+        """
+        Initialize the index.
+
+        Args:
+            dimension (int): Length of the stub vectors.
+            embed_latency (float): Seconds slept on every embedding call.
+        """
+        self.dimension = dimension
+        self.embed_latency = embed_latency
+        self.embeddings_model = self
+        self.rows: Dict[str, Any] = {}
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if self.embed_latency:
+            time.sleep(self.embed_latency)
+        vectors = []
+        for text in texts:
+            digest = hashlib.sha256(text.encode("utf-8")).digest()
+            repeated = digest * (self.dimension // len(digest) + 1)
+            vectors.append([byte / 255 for byte in repeated[:self.dimension]])
+        return vectors
+
+    def document_id(self, doc: Document, chunk: Optional[int] = None) -> str:
+        if chunk is None:
+            chunk = doc.metadata.get("chunk", 0)
+        metadata = {key: value for key, value in doc.metadata.items() if key != "chunk"}
+        if chunk:
+            metadata["chunk"] = chunk
+        return hashlib.sha256(json.dumps(metadata).encode("utf-8")).hexdigest()
+
+    def upsert_embeddings(self, vectorstore: Any, docs: List[Document], embeddings: List[List[float]], ids: List[str]):
+        for doc, vector, doc_id in zip(docs, embeddings, ids):
+            self.rows[doc_id] = (doc.page_content, vector)
+        return ids
+
+
+def _peak_rss_mb() -> Dict[str, float]:
+    """Peak resident memory of this process and of its largest finished child, in MiB."""
+    # ru_maxrss is in KiB on Linux and in bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "peak_rss_mb": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "peak_child_rss_mb": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1),
+    }
+
+
+def run_file(entry: Dict[str, Any], pdfs_dir: Path, index: MemoryIndex) -> Dict[str, Any]:
+    """
+    Ingest one generated file into the in-memory index and measure it.
+
+    Args:
+        entry (Dict[str, Any]): The corpus entry from `generate_corpus`.
+        pdfs_dir (Path): Where converted PDFs are written.
+        index (MemoryIndex): The stand-in vector store.
+
+    Returns:
+        Dict[str, Any]: The entry with its status, extracted pages, inserted rows, per-stage
+        seconds, total seconds, pages/sec and peak memory.
+    """
+    file_path = entry["path"]
+    tracker = _StageTracker(None)
+    started = time.perf_counter()
+    pages = 0
+
+    def _count(docs):
+        nonlocal pages
+        for doc in docs:
+            pages += 1
+            yield doc
+
+    status, error, rows = "done", None, 0
+    try:
+        _, docs, _ = _extract_file(tracker, NAMESPACE, file_path, str(pdfs_dir), _source_name(file_path), [])
+        tracker.start("index")
+        indexer = StreamingIndexer(index, None)
+        rows = indexer.run(iter_chunks(_count(docs)))
+        tracker.finish(
+            "index",
+            rows=rows,
+            embed_seconds=round(indexer.embed_seconds, 3),
+            insert_seconds=round(indexer.insert_seconds, 3),
+        )
+    except IngestionError as e:
+        status, error = "failed", f"{e.stage}: {e}"
+    elapsed = time.perf_counter() - started
+
+    return {
+        **entry,
+        "bytes": os.path.getsize(file_path),
+        "status": status,
+        "error": error,
+        "extracted_pages": pages,
+        "rows": rows,
+        "seconds": round(elapsed, 3),
+        "pages_per_second": round(pages / elapsed, 2) if elapsed else 0.0,
+        "stages": {stage: info.get("seconds") for stage, info in tracker.stages.items()},
+        **_peak_rss_mb(),
+    }
+
+
+def summarize(results: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """
+    Aggregate the results per kind.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: Files, failures, pages, seconds, pages/sec and the
+        seconds spent in each stage, per kind.
+    """
+    summary: Dict[str, Dict[str, Any]] = {}
+    for result in results:
+        kind = summary.setdefault(result["kind"], {"files": 0, "failed": 0, "pages": 0, "seconds": 0.0, "stages": {}})
+        kind["files"] += 1
+        kind["failed"] += result["status"] != "done"
+        kind["pages"] += result["extracted_pages"]
+        kind["seconds"] += result["seconds"]
+        for stage, seconds in result["stages"].items():
+            kind["stages"][stage] = kind["stages"].get(stage, 0.0) + (seconds or 0.0)
+    for kind in summary.values():
+        kind["pages_per_second"] = round(kind["pages"] / kind["seconds"], 2) if kind["seconds"] else 0.0
+        kind["seconds"] = round(kind["seconds"], 3)
+        kind["stages"] = {stage: round(seconds, 3) for stage, seconds in kind["stages"].items()}
+    return summary
+
+
+def _print_report(results: List[Dict[str, Any]], summary: Dict[str, Dict[str, Any]]) -> None:
+    stages = ["convert", "ocr", "extract", "index"]
+    header = f"{'file':<16}{'pages':>6}{'status':>8}{'total s':>9}{'pages/s':>9}" + "".join(f"{s:>9}" for s in stages)
+    print(header + f"{'rss MiB':>9}")
+    print("-" * (len(header) + 9))
+    for result in results:
+        times = "".join(
+            f"{result['stages'][s]:>9.2f}" if result["stages"].get(s) is not None else f"{'-':>9}" for s in stages
+        )
+        print(
+            f"{Path(result['path']).name:<16}{result['extracted_pages']:>6}{result['status']:>8}"
+            f"{result['seconds']:>9.2f}{result['pages_per_second']:>9.2f}{times}{result['peak_rss_mb']:>9.1f}"
+        )
+    print()
+    for name, kind in summary.items():
+        stage_times = ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in kind["stages"].items())
+        print(
+            f"{name:<8} {kind['files']} files, {kind['failed']} failed, {kind['pages']} pages in "
+            f"{kind['seconds']:.2f}s = {kind['pages_per_second']:.2f} pages/s ({stage_times})"
+        )
+    memory = _peak_rss_mb()
+    print(f"\nPeak RSS: {memory['peak_rss_mb']} MiB (largest child process: {memory['peak_child_rss_mb']} MiB)")
+
+
+def _main_image_prep(args: argparse.Namespace, workdir: Path) -> None:
+    corpus = workdir / "photos"
+    corpus.mkdir(parents=True, exist_ok=True)
+    photos = []
+    for number in range(args.photos):
+        path = corpus / f"photo-{number + 1}.jpg"
+        text = _write_photo(random.Random(f"{args.seed}-photo-{number}"), path, args.photo_dpi)
+        photos.append({"path": str(path), "text": text})
+    print(f"Generated {len(photos)} photos at {args.photo_dpi} dpi under {workdir}\n")
+
+    results = run_image_prep(photos, corpus, args.language)
+    summary = summarize_image_prep(results)
+    _print_image_prep(summary)
+    if args.json:
+        args.json.write_text(json.dumps({"summary": summary, "results": results}, indent=2))
+        print(f"Results written to {args.json}")
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """Command line entry point."""
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion pipeline on a generated corpus.")
+    parser.add_argument("--kinds", default=",".join(KINDS), help=f"Comma-separated kinds among {', '.join(KINDS)}")
+    parser.add_argument("--pages", default="1,10,50", help="Comma-separated page counts per file")
+    parser.add_argument("--repeat", type=int, default=1, help="Times each file is ingested")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the generated text")
+    parser.add_argument("--dpi", type=int, default=200, help="Resolution of scanned pages and photos")
+    parser.add_argument("--dimension", type=int, default=1536, help="Length of the stub embedding vectors")
+    parser.add_argument("--embed-latency", type=float, default=0.0, help="Seconds added to every embedding batch")
+    parser.add_argument("--workdir", type=Path, help="Keep the corpus and converted PDFs in this directory")
+    parser.add_argument("--json", type=Path, help="Write the detailed results to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the pipeline logs")
+    parser.add_argument(
+        "--image-prep", action="store_true", help="Compare image normalization variants instead (time vs accuracy)"
+    )
+    parser.add_argument("--photos", type=int, default=3, help="Photos generated for --image-prep")
+    parser.add_argument("--photo-dpi", type=int, default=400, help="Resolution of the --image-prep photos")
+    parser.add_argument("--language", default=DEFAULT_LANGUAGE, help="Tesseract language(s) for --image-prep")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(
+        level=logging.INFO if args.verbose else logging.WARNING,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    kinds = [kind.strip() for kind in args.kinds.split(",") if kind.strip()]
+    unknown = set(kinds) - set(KINDS)
+    if unknown:
+        parser.error(f"Unknown kinds: {', '.join(sorted(unknown))}")
+    page_counts = [int(count) for count in args.pages.split(",") if count.strip()]
+
+    workdir = args.workdir or Path(tempfile.mkdtemp(prefix="ingest-benchmark-"))
+    try:
+        if args.image_prep:
+            _main_image_prep(args, workdir)
+            return
+        started = time.perf_counter()
+        corpus = generate_corpus(workdir / "corpus", kinds, page_counts, seed=args.seed, dpi=args.dpi)
+        print(f"Generated {len(corpus)} files in {time.perf_counter() - started:.1f}s under {workdir}\n")
+
+        index = MemoryIndex(args.dimension, args.embed_latency)
+        results = []
+        for run in range(args.repeat):
+            pdfs_dir = workdir / f"pdfs-{run}"
+            pdfs_dir.mkdir(parents=True, exist_ok=True)
+            for entry in corpus:
+                results.append({"run": run, **run_file(entry, pdfs_dir, index)})
+
+        scheduler = OCRScheduler.current()
+        if scheduler is not None:
+            scheduler.shutdown()
+
+        summary = summarize(results)
+        _print_report(results, summary)
+        if args.json:
+            settings = {
+                name: value for name, value in os.environ.items()
+                if name.startswith(("OCR_", "INGEST_", "OFFICE_", "CONVERSION_"))
+            }
+            args.json.write_text(json.dumps(
+                {"settings": settings, "summary": summary, "results": results, **_peak_rss_mb()}, indent=2
+            ))
+            print(f"Results written to {args.json}")
+    finally:
+        if args.workdir is None:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
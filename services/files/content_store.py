@@ -0,0 +1,253 @@
+"""
+Content-addressed index of ingested files keyed by their SHA-256.
+"""
+import json
+import time
+import zlib
+import logging
+from typing import Any, Dict, List, Optional
+
+from redis import Redis
+from langchain_core.documents import Document
+
+from .extraction_cache import ExtractionCache, cache_key
+
+
+logger = logging.getLogger(__name__)
+
+
+def _decode(value: Any) -> Any:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class ContentStore:
+    """
+    Tracks which files each namespace has already ingested, by content hash.
+
+    - content:<namespace> maps a file hash to the source it was indexed as, so an
+      identical upload in the same namespace can reuse the existing vectors.
+    - The extraction cache keeps the extracted pages of a file for every namespace,
+      keyed by hash and extraction settings, so an upload already processed by
+      another user skips conversion, OCR and extraction.
+    - content:summaries maps a file hash to its summary and keywords (see
+      `services.files.summaries`), shared by every namespace.
+    """
+
+    def __init__(
+        self,
+        redis_conn: Redis,
+        key_prefix: str = "content",
+        cache: Optional[ExtractionCache] = None,
+    ) -> None:
+        """
+        Initialize the store.
+
+        Args:
+            redis_conn (Redis): The Redis connection.
+            key_prefix (str): Prefix for the Redis keys.
+            cache (Optional[ExtractionCache]): Where extracted pages are cached; None disables page reuse.
+        """
+        self.redis = redis_conn
+        self.key_prefix = key_prefix
+        self.cache = cache
+
+    def _namespace_key(self, namespace: str) -> str:
+        return f"{self.key_prefix}:{namespace}"
+
+    @property
+    def _summaries_key(self) -> str:
+        return f"{self.key_prefix}:summaries"
+
+    def lookup(self, namespace: str, sha256: str) -> Optional[Dict[str, Any]]:
+        """
+        Find a file with the same content already ingested in the namespace.
+
+        Args:
+            namespace (str): The namespace (user email).
+            sha256 (str): The hex SHA-256 of the uploaded file.
+
+        Returns:
+            Optional[Dict[str, Any]]: The catalog entry, or None if the content is new.
+        """
+        value = self.redis.hget(self._namespace_key(namespace), sha256)
+        return json.loads(_decode(value)) if value else None
+
+    def register(self, namespace: str, sha256: str, source: str, pages: int) -> None:
+        """
+        Record that a file was indexed in the namespace under the given source.
+
+        Args:
+            namespace (str): The namespace (user email).
+            sha256 (str): The hex SHA-256 of the file.
+            source (str): The source name the pages were indexed with.
+            pages (int): The number of pages of the file.
+        """
+        entry = self.lookup(namespace, sha256) or {"source": source, "aliases": [], "created_at": time.time()}
+        if source != entry["source"] and source not in entry["aliases"]:
+            entry["aliases"].append(source)
+        entry["pages"] = pages
+        self.redis.hset(self._namespace_key(namespace), sha256, json.dumps(entry))
+
+    def catalog(self, namespace: str) -> Dict[str, Dict[str, Any]]:
+        """
+        List every file hash ingested in the namespace.
+
+        Args:
+            namespace (str): The namespace (user email).
+
+        Returns:
+            Dict[str, Dict[str, Any]]: The catalog entries keyed by file hash.
+        """
+        return {
+            _decode(sha256): json.loads(_decode(value))
+            for sha256, value in self.redis.hgetall(self._namespace_key(namespace)).items()
+        }
+
+    def summary(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """
+        Return the summary of a file, or None if it was not summarized.
+
+        Args:
+            sha256 (str): The hex SHA-256 of the file.
+        """
+        value = self.redis.hget(self._summaries_key, sha256)
+        return json.loads(_decode(value)) if value else None
+
+    def save_summary(self, sha256: str, summary: Dict[str, Any]) -> None:
+        """
+        Store the summary of a file for every namespace.
+
+        Args:
+            sha256 (str): The hex SHA-256 of the file.
+            summary (Dict[str, Any]): The summary and keywords, as returned by `DocumentSummarizer.summarize`.
+        """
+        self.redis.hset(self._summaries_key, sha256, json.dumps({**summary, "created_at": time.time()}))
+
+    def summaries(self, namespace: str) -> List[Dict[str, Any]]:
+        """
+        List the documents of a namespace with their summaries.
+
+        Args:
+            namespace (str): The namespace (user email).
+
+        Returns:
+            List[Dict[str, Any]]: One entry per file with its source, aliases, pages, summary and
+            keywords (None and [] if it was not summarized), sorted by source.
+        """
+        catalog = self.catalog(namespace)
+        if not catalog:
+            return []
+        hashes = list(catalog)
+        values = self.redis.hmget(self._summaries_key, hashes)
+        documents = []
+        for sha256, value in zip(hashes, values):
+            entry = catalog[sha256]
+            summary = json.loads(_decode(value)) if value else {}
+            documents.append({
+                "source": entry["source"],
+                "aliases": entry.get("aliases", []),
+                "pages": entry.get("pages", 0),
+                "summary": summary.get("summary"),
+                "keywords": summary.get("keywords", []),
+            })
+        return sorted(documents, key=lambda document: document["source"])
+
+    def cache_pages(self, sha256: str, docs: List[Document], language: Optional[str] = None) -> None:
+        """
+        Cache the extracted pages of a file for every namespace.
+
+        Args:
+            sha256 (str): The hex SHA-256 of the file.
+            docs (List[Document]): The extracted pages, before dedup.
+            language (Optional[str]): The OCR language requested for the file, or None if detected.
+        """
+        writer = self.page_writer(sha256, language)
+        if writer is None:
+            return
+        for doc in docs:
+            writer.add(doc)
+        writer.close()
+
+    def page_writer(self, sha256: str, language: Optional[str] = None) -> Optional["PageCacheWriter"]:
+        """
+        Return a writer that caches the pages of a file as they are extracted.
+
+        Args:
+            sha256 (str): The hex SHA-256 of the file.
+            language (Optional[str]): The OCR language requested for the file, or None if detected.
+
+        Returns:
+            Optional[PageCacheWriter]: Compresses pages incrementally and stores them on `close`,
+            or None if the cache is disabled or already has the pages.
+        """
+        if self.cache is None:
+            return None
+        key = cache_key(sha256, language)
+        if self.cache.contains(key):
+            return None
+        return PageCacheWriter(self.cache, key)
+
+    def cached_pages(
+        self,
+        sha256: str,
+        namespace: str,
+        source: str,
+        language: Optional[str] = None,
+    ) -> List[Document]:
+        """
+        Rebuild the pages of a previously extracted file for a namespace.
+
+        Args:
+            sha256 (str): The hex SHA-256 of the file.
+            namespace (str): The namespace the pages will belong to.
+            source (str): The source name the pages will be indexed with.
+            language (Optional[str]): The OCR language requested for the file, or None if detected.
+
+        Returns:
+            List[Document]: The pages with the same metadata as `OCRProcessor.load_pdf`, or an empty list.
+        """
+        if self.cache is None:
+            return []
+        payload = self.cache.get(cache_key(sha256, language))
+        if not payload:
+            return []
+        pages = json.loads(zlib.decompress(payload).decode("utf-8"))
+        return [
+            Document(
+                page_content=page["text"],
+                metadata={
+                    "namespace": namespace,
+                    "source": source,
+                    "page": page["page"],
+                    "author": page["author"],
+                },
+            )
+            for page in pages
+        ]
+
+
+class PageCacheWriter:
+    """
+    Compresses pages one at a time into the payload read by `ContentStore.cached_pages`,
+    so only the compressed bytes are kept in memory while a file is streamed.
+    """
+
+    def __init__(self, cache: ExtractionCache, key: str) -> None:
+        self.cache = cache
+        self.key = key
+        self._compressor = zlib.compressobj()
+        self._parts = [self._compressor.compress(b"[")]
+        self._count = 0
+
+    def add(self, doc: Document) -> None:
+        """Append an extracted page."""
+        page = {"page": doc.metadata.get("page", 0), "author": doc.metadata.get("author", ""), "text": doc.page_content}
+        prefix = "," if self._count else ""
+        self._parts.append(self._compressor.compress((prefix + json.dumps(page)).encode("utf-8")))
+        self._count += 1
+
+    def close(self) -> None:
+        """Store the cached pages."""
+        self._parts.append(self._compressor.compress(b"]"))
+        self._parts.append(self._compressor.flush())
+        self.cache.put(self.key, b"".join(self._parts), self._count)
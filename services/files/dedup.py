@@ -0,0 +1,284 @@
+"""
+Near-duplicate detection for ingested pages using SimHash signatures.
+"""
+import re
+import hashlib
+import logging
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from redis import Redis
+from langchain_core.documents import Document
+
+
+logger = logging.getLogger(__name__)
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def simhash(text: str, shingle_size: int = 3) -> Optional[int]:
+    """
+    Compute a 64-bit SimHash signature over word shingles.
+
+    Args:
+        text (str): The text to fingerprint.
+        shingle_size (int): Number of consecutive words per shingle.
+
+    Returns:
+        Optional[int]: The signature, or None if the text is too short to fingerprint.
+    """
+    tokens = _TOKEN_RE.findall(text.lower())
+    if len(tokens) < shingle_size * 2:
+        return None
+
+    shingles = {" ".join(tokens[i:i + shingle_size]) for i in range(len(tokens) - shingle_size + 1)}
+    hashes = np.fromiter(
+        (int.from_bytes(hashlib.blake2b(s.encode("utf-8"), digest_size=8).digest(), "big") for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles),
+    )
+    bits = np.unpackbits(hashes.byteswap().view(np.uint8).reshape(-1, 8), axis=1)
+    weights = bits.sum(axis=0).astype(np.int64) * 2 - len(shingles)
+    signature = np.packbits(weights > 0)
+    return int.from_bytes(signature.tobytes(), "big")
+
+
+def hamming_distances(signature: int, others: np.ndarray) -> np.ndarray:
+    """
+    Compute the Hamming distance between a signature and an array of signatures.
+
+    Args:
+        signature (int): The 64-bit signature.
+        others (np.ndarray): Array of 64-bit signatures (dtype uint64).
+
+    Returns:
+        np.ndarray: The number of differing bits for each signature in `others`.
+    """
+    if others.size == 0:
+        return np.empty(0, dtype=np.int64)
+    xor = np.bitwise_xor(others, np.uint64(signature))
+    return np.unpackbits(xor.view(np.uint8).reshape(-1, 8), axis=1).sum(axis=1)
+
+
+class NearDuplicateFilter:
+    """
+    Skips pages that are near-duplicates of pages already indexed in the same namespace.
+
+    Signatures are kept in Redis, one hash per namespace keyed by "source:page".
+    Skipped pages are linked to the page they duplicate so the relation is not lost.
+    Signatures can outlive their rows (a dropped collection, a deleted source), so
+    with `source_exists` a page is only skipped if the source it duplicates is
+    still indexed; the signatures of a source that is gone are forgotten.
+    """
+
+    def __init__(
+        self,
+        redis_conn: Redis,
+        max_distance: int = 3,
+        key_prefix: str = "dedup",
+        source_exists: Optional[Callable[[str, str], bool]] = None,
+    ) -> None:
+        """
+        Initialize the filter.
+
+        Args:
+            redis_conn (Redis): The Redis connection used to store signatures.
+            max_distance (int): Maximum Hamming distance to consider two pages duplicates.
+            key_prefix (str): Prefix for the Redis keys.
+            source_exists (Optional[Callable[[str, str], bool]]): Called with (namespace, source) to
+                check that a matched source still has rows, e.g. `MilvusStorage.has_source`.
+        """
+        self.redis = redis_conn
+        self.max_distance = max_distance
+        self.key_prefix = key_prefix
+        self.source_exists = source_exists
+
+    def _signatures_key(self, namespace: str) -> str:
+        return f"{self.key_prefix}:{namespace}"
+
+    def _links_key(self, namespace: str) -> str:
+        return f"{self.key_prefix}:{namespace}:links"
+
+    @staticmethod
+    def _label(doc: Document) -> str:
+        return f"{doc.metadata.get('source', '')}:{doc.metadata.get('page', 0)}"
+
+    def _load_signatures(self, namespace: str, exclude_source: str) -> Tuple[List[str], List[int]]:
+        labels, signatures = [], []
+        for label, value in self.redis.hgetall(self._signatures_key(namespace)).items():
+            label = label.decode() if isinstance(label, bytes) else label
+            value = value.decode() if isinstance(value, bytes) else value
+            # Pages of the same source are being replaced, not duplicated
+            if label.rsplit(":", 1)[0] == exclude_source:
+                continue
+            labels.append(label)
+            signatures.append(int(value, 16))
+        return labels, signatures
+
+    def filter(self, docs: List[Document], namespace: str) -> Tuple[List[Document], Dict[str, int]]:
+        """
+        Remove near-duplicate pages before they are embedded and inserted.
+
+        Args:
+            docs (List[Document]): The pages of a single source file.
+            namespace (str): The namespace the pages belong to.
+
+        Returns:
+            Tuple[List[Document], Dict[str, int]]: The pages to keep and the dedup statistics.
+        """
+        stats: Dict[str, int] = {}
+        if not docs:
+            return docs, {"pages": 0, "duplicates": 0, "embeddings_saved": 0, "rows_saved": 0}
+        kept = list(self.iter_filter(docs, namespace, docs[0].metadata.get("source", ""), stats))
+        return kept, stats
+
+    def iter_filter(
+        self,
+        docs: Iterable[Document],
+        namespace: str,
+        source: str,
+        stats: Dict[str, int],
+        kept_signatures: Optional[Dict[str, str]] = None,
+    ) -> Iterator[Document]:
+        """
+        Lazily remove near-duplicate pages from a stream of pages.
+
+        The known signatures are loaded immediately, so Redis errors surface here and
+        not while the stream is consumed. `stats` is filled in as pages go by.
+
+        Args:
+            docs (Iterable[Document]): The pages of a single source file.
+            namespace (str): The namespace the pages belong to.
+            source (str): The source name of the pages.
+            stats (Dict[str, int]): Updated in place with the dedup statistics.
+            kept_signatures (Optional[Dict[str, str]]): Filled with the hex signatures of the kept
+                pages, to store with `remember_signatures` once they are inserted.
+
+        Returns:
+            Iterator[Document]: The pages to keep.
+        """
+        labels, known = self._load_signatures(namespace, exclude_source=source)
+        stats.update(pages=0, duplicates=0, embeddings_saved=0, rows_saved=0)
+        return self._iter_kept(
+            docs, namespace, source, labels, np.array(known, dtype=np.uint64), stats,
+            kept_signatures if kept_signatures is not None else {},
+        )
+
+    def _iter_kept(
+        self,
+        docs: Iterable[Document],
+        namespace: str,
+        source: str,
+        labels: List[str],
+        signatures: np.ndarray,
+        stats: Dict[str, int],
+        kept_signatures: Dict[str, str],
+    ) -> Iterator[Document]:
+        links: Dict[str, str] = {}
+        # Whether each matched source is still indexed, checked once per source
+        indexed: Dict[str, bool] = {source: True}
+        for doc in docs:
+            stats["pages"] += 1
+            signature = simhash(doc.page_content)
+            if signature is None:
+                yield doc
+                continue
+
+            distances = hamming_distances(signature, signatures)
+            while distances.size and distances.min() <= self.max_distance:
+                matched = labels[int(distances.argmin())].rsplit(":", 1)[0]
+                if matched not in indexed:
+                    indexed[matched] = self._is_indexed(namespace, matched)
+                if indexed[matched]:
+                    break
+                # The rows of the matched source are gone: drop its signatures and look again
+                keep = [i for i, label in enumerate(labels) if label.rsplit(":", 1)[0] != matched]
+                labels = [labels[i] for i in keep]
+                signatures = signatures[keep]
+                distances = distances[keep]
+            if distances.size and distances.min() <= self.max_distance:
+                links[self._label(doc)] = labels[int(distances.argmin())]
+                stats["duplicates"] += 1
+                stats["embeddings_saved"] += 1
+                stats["rows_saved"] += 1
+                continue
+
+            labels.append(self._label(doc))
+            signatures = np.append(signatures, np.uint64(signature))
+            kept_signatures[self._label(doc)] = f"{signature:016x}"
+            yield doc
+
+        if links:
+            self.redis.hset(self._links_key(namespace), mapping=links)
+        logger.info(
+            f"Dedup for '{source}' in '{namespace}': {stats['duplicates']}/{stats['pages']} near-duplicate pages skipped"
+        )
+
+    def _is_indexed(self, namespace: str, source: str) -> bool:
+        """Whether a source still has rows; its signatures are forgotten if not."""
+        if self.source_exists is None:
+            return True
+        try:
+            exists = self.source_exists(namespace, source)
+        except Exception as e:
+            logger.warning(f"Could not check whether '{source}' is still indexed: {e}")
+            return True
+        if not exists:
+            logger.info(f"Signatures of '{source}' in '{namespace}' are stale, forgetting them")
+            self.forget(namespace, source)
+        return exists
+
+    def forget(self, namespace: Optional[str] = None, source: Optional[str] = None) -> None:
+        """
+        Drop stored signatures whose rows were deleted.
+
+        Args:
+            namespace (Optional[str]): The namespace; None drops the signatures of every namespace.
+            source (Optional[str]): The source within the namespace; None drops the whole namespace.
+        """
+        if namespace is None:
+            keys = list(self.redis.scan_iter(f"{self.key_prefix}:*"))
+            if keys:
+                self.redis.delete(*keys)
+            return
+        if source is None:
+            self.redis.delete(self._signatures_key(namespace), self._links_key(namespace))
+            return
+        self.remember_signatures({}, namespace, source)
+
+    def remember(self, docs: List[Document], namespace: str) -> None:
+        """
+        Store the signatures of pages that were inserted into the vector store.
+
+        Args:
+            docs (List[Document]): The inserted pages of a single source file.
+            namespace (str): The namespace the pages belong to.
+        """
+        if not docs:
+            return
+
+        mapping = {}
+        for doc in docs:
+            signature = simhash(doc.page_content)
+            if signature is not None:
+                mapping[self._label(doc)] = f"{signature:016x}"
+        self.remember_signatures(mapping, namespace, docs[0].metadata.get("source", ""))
+
+    def remember_signatures(self, signatures: Dict[str, str], namespace: str, source: str) -> None:
+        """
+        Replace the stored signatures of a source with the given ones.
+
+        Args:
+            signatures (Dict[str, str]): Hex signatures keyed by "source:page", as collected by `iter_filter`.
+            namespace (str): The namespace the pages belong to.
+            source (str): The source name of the pages.
+        """
+        key = self._signatures_key(namespace)
+        stale = [
+            label for label in self.redis.hkeys(key)
+            if (label.decode() if isinstance(label, bytes) else label).rsplit(":", 1)[0] == source
+        ]
+        if stale:
+            self.redis.hdel(key, *stale)
+        if signatures:
+            self.redis.hset(key, mapping=signatures)
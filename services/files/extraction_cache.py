@@ -0,0 +1,266 @@
+"""
+Content-addressed cache of extracted pages on local disk.
+
+OCR is the most expensive ingestion step, and the same documents are often
+uploaded by several users. The pages extracted from a file are cached under its
+SHA-256 plus a fingerprint of every setting that changes the extracted text
+(OCR mode, language, image normalization...), so another upload of the same
+content skips conversion, OCR and extraction while still being embedded into its
+own namespace. Entries are evicted least-recently-used once the cache exceeds
+INGEST_CACHE_MAX_MB.
+
+With INGEST_CACHE_REDIS=true the size and last use of every entry are also kept
+in Redis, so processes sharing the cache directory (API and workers, possibly on
+different hosts over a shared volume) evict in one global LRU order without
+scanning the directory.
+"""
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from redis import Redis
+
+from . import ocr, image_prep, office_text
+from .language import DEFAULT_LANGUAGE, DETECT_LANGUAGE
+
+
+logger = logging.getLogger(__name__)
+
+CACHE_DIR = Path(os.getenv("INGEST_CACHE_DIR") or Path(os.getenv("BASE_DIR", "./uploads")) / "cache" / "extraction")
+# Size bound of the cache; 0 disables it
+CACHE_MAX_MB = int(os.getenv("INGEST_CACHE_MAX_MB", "2048"))
+# Keep the entry metadata in Redis for a global LRU across processes
+CACHE_REDIS = os.getenv("INGEST_CACHE_REDIS", "false").lower() == "true"
+# Bump when the extraction output changes in a way no setting captures
+CACHE_VERSION = 1
+# Eviction frees space down to this fraction of the bound, so it does not run on every write
+EVICT_TO = 0.9
+
+_cache: Optional["ExtractionCache"] = None
+_cache_lock = threading.Lock()
+
+
+def settings_fingerprint(language: Optional[str]) -> str:
+    """
+    Summarize the settings that change the text extracted from a file.
+
+    Args:
+        language (Optional[str]): The OCR language requested for the file, or None if detected.
+
+    Returns:
+        str: A short hex digest.
+    """
+    settings = {
+        "version": CACHE_VERSION,
+        "ocr_mode": os.getenv("OCR_MODE", "selective").lower(),
+        "min_text_chars": ocr.MIN_TEXT_CHARS,
+        "mixed_image_coverage": ocr.MIXED_IMAGE_COVERAGE,
+        "language": language or f"auto:{DEFAULT_LANGUAGE}:{DETECT_LANGUAGE}",
+        "image_direct": os.getenv("OCR_IMAGE_DIRECT", "true").lower(),
+        "image_prep": [image_prep.NORMALIZE, image_prep.TARGET_DPI, image_prep.DESKEW, image_prep.BINARIZE],
+        "office_native": os.getenv("OFFICE_NATIVE_EXTRACT", "true").lower(),
+        "office_section_chars": office_text.SECTION_MAX_CHARS,
+    }
+    return hashlib.sha256(json.dumps(settings, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+
+
+def cache_key(sha256: str, language: Optional[str]) -> str:
+    """Return the cache key of a file extracted with the current settings."""
+    return f"{sha256}-{settings_fingerprint(language)}"
+
+
+class ExtractionCache:
+    """
+    Size-bounded LRU cache of compressed page payloads, one file per entry.
+
+    Reads touch the entry's mtime, which is the LRU order when Redis is not used.
+    """
+
+    def __init__(
+        self,
+        directory: Path,
+        max_bytes: int,
+        redis_conn: Optional[Redis] = None,
+        key_prefix: str = "extraction:cache",
+    ) -> None:
+        """
+        Initialize the cache.
+
+        Args:
+            directory (Path): Where the entries are stored.
+            max_bytes (int): Size above which the least recently used entries are evicted.
+            redis_conn (Optional[Redis]): Keeps the entry metadata in Redis if given.
+            key_prefix (str): Prefix for the Redis keys.
+        """
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.redis = redis_conn
+        self.meta_key = f"{key_prefix}:meta"
+        self.lru_key = f"{key_prefix}:lru"
+        self.bytes_key = f"{key_prefix}:bytes"
+        # Approximate size of the cache as seen by this process (Redis keeps the global one); None until the first scan
+        self._size: Optional[int] = None
+        self._lock = threading.Lock()
+
+    def _path(self, key: str) -> Path:
+        return self.directory / key[:2] / f"{key}.pages"
+
+    def contains(self, key: str) -> bool:
+        """Whether the cache has an entry for the key."""
+        return self._path(key).exists()
+
+    def get(self, key: str) -> Optional[bytes]:
+        """
+        Read an entry and mark it as recently used.
+
+        Args:
+            key (str): The cache key.
+
+        Returns:
+            Optional[bytes]: The payload, or None on a miss.
+        """
+        path = self._path(key)
+        try:
+            payload = path.read_bytes()
+            os.utime(path)
+        except FileNotFoundError:
+            if self.redis is not None:
+                self._forget([key])
+            return None
+        if self.redis is not None:
+            try:
+                self.redis.zadd(self.lru_key, {key: time.time()})
+            except Exception as e:
+                logger.warning(f"Could not update the cache metadata of '{key}': {e}")
+        return payload
+
+    def put(self, key: str, payload: bytes, pages: int) -> None:
+        """
+        Store an entry, then evict old entries if the cache is over its bound.
+
+        Args:
+            key (str): The cache key.
+            payload (bytes): The compressed pages.
+            pages (int): The number of pages, kept in the metadata.
+        """
+        path = self._path(key)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Written next to its final path and renamed, so readers never see a partial entry
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(payload)
+            os.replace(tmp, path)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+
+        with self._lock:
+            if self.redis is not None:
+                meta = {"bytes": len(payload), "pages": pages, "created_at": time.time()}
+                pipe = self.redis.pipeline()
+                pipe.hset(self.meta_key, key, json.dumps(meta))
+                pipe.zadd(self.lru_key, {key: time.time()})
+                pipe.incrby(self.bytes_key, len(payload))
+                self._size = pipe.execute()[-1]
+            elif self._size is None:
+                self._size = sum(size for _, size, _ in self._entries())
+            else:
+                self._size += len(payload)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _entries(self) -> List[Tuple[str, int, float]]:
+        """Every entry as (key, bytes, last use), least recently used first."""
+        if self.redis is not None:
+            sizes = {
+                (k.decode() if isinstance(k, bytes) else k): json.loads(v)["bytes"]
+                for k, v in self.redis.hgetall(self.meta_key).items()
+            }
+            entries = []
+            for member, score in self.redis.zrange(self.lru_key, 0, -1, withscores=True):
+                key = member.decode() if isinstance(member, bytes) else member
+                if key in sizes:
+                    entries.append((key, sizes[key], score))
+            return entries
+
+        entries = []
+        for path in self.directory.glob("*/*.pages"):
+            try:
+                stat = path.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((path.stem, stat.st_size, stat.st_mtime))
+        entries.sort(key=lambda entry: entry[2])
+        return entries
+
+    def _evict(self) -> None:
+        """Delete the least recently used entries until the cache is below EVICT_TO of its bound."""
+        entries = self._entries()
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * EVICT_TO
+        evicted = []
+        for key, size, _ in entries:
+            if total <= target:
+                break
+            self._path(key).unlink(missing_ok=True)
+            evicted.append(key)
+            total -= size
+        if evicted:
+            if self.redis is not None:
+                self._forget(evicted)
+            logger.info(f"Evicted {len(evicted)} extraction cache entries, {total} bytes left")
+        if self.redis is not None:
+            # Overwritten entries were counted twice; the scan is authoritative
+            self.redis.set(self.bytes_key, total)
+        self._size = total
+
+    def _forget(self, keys: List[str]) -> None:
+        try:
+            pipe = self.redis.pipeline()
+            pipe.hdel(self.meta_key, *keys)
+            pipe.zrem(self.lru_key, *keys)
+            pipe.execute()
+        except Exception as e:
+            logger.warning(f"Could not remove extraction cache metadata: {e}")
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Return the number of entries and their total size.
+
+        Returns:
+            Dict[str, Any]: entries, bytes and max_bytes.
+        """
+        entries = self._entries()
+        return {
+            "entries": len(entries),
+            "bytes": sum(size for _, size, _ in entries),
+            "max_bytes": self.max_bytes,
+        }
+
+
+def get_extraction_cache(redis_conn: Optional[Redis] = None) -> Optional[ExtractionCache]:
+    """
+    Return the process-wide extraction cache, or None if disabled.
+
+    Args:
+        redis_conn (Optional[Redis]): Used for the shared metadata when INGEST_CACHE_REDIS=true.
+    """
+    global _cache
+    if CACHE_MAX_MB <= 0:
+        return None
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ExtractionCache(
+                    CACHE_DIR,
+                    CACHE_MAX_MB * 1024 * 1024,
+                    redis_conn if CACHE_REDIS else None,
+                )
+    return _cache
@@ -62,6 +62,28 @@ class FileManager:
             return None
         
         return self._strategy.execute(input_file, outdir)
+    
+    async def execute_strategy_async(self, input_file: str, outdir: str) -> Optional[str]:
+        """
+        Execute the current strategy without blocking the event loop.
+        
+        Args:
+            input_file (str): The path to the input file.
+            outdir (str): The path to the destination directory.
+            
+        Returns:
+            Optional[str]: The path to the output file if successful, None otherwise.
+        """
+        if self._strategy is None:
+            logger.error("No strategy set for FileManager")
+            return None
+        
+        # Validate input file exists
+        if not Path(input_file).exists():
+            logger.error(f"Input file '{input_file}' does not exist")
+            return None
+        
+        return await self._strategy.execute_async(input_file, outdir)
 
 
 # Strategy factory mapping file types to strategies
@@ -113,3 +135,42 @@ def manage_files(input_file: str, outdir: str) -> Optional[str]:
         logger.exception(f"Unexpected error processing file '{input_file}': {e}")
         
         return None
+
+
+async def manage_files_async(input_file: str, outdir: str) -> Optional[str]:
+    """
+    Awaitable variant of `manage_files`.
+    
+    Conversions run as asyncio subprocesses, so they overlap with other work on the
+    event loop instead of blocking it.
+    
+    Args:
+        input_file (str): The path to the source file.
+        outdir (str): The path to the destination directory.
+        
+    Returns:
+        Optional[str]: The path to the processed file if successful, None otherwise.
+    """
+    try:
+        if not Path(input_file).exists():
+            logger.error(f"Input file '{input_file}' does not exist")
+            return None
+        
+        mime_type, _ = mimetypes.guess_type(input_file)
+        strategy_class = STRATEGY_MAP.get(mime_type, STRATEGY_MAP["default"])
+        context = FileManager(strategy=strategy_class())
+        
+        logger.info(f"Processing file '{input_file}' with strategy '{strategy_class.__name__}' (async)")
+        result = await context.execute_strategy_async(input_file, outdir=outdir)
+        
+        if result:
+            logger.info(f"File processing completed successfully: '{result}'")
+        else:
+            logger.error(f"File processing failed for '{input_file}'")
+
+        return result
+    
+    except Exception as e:
+        logger.exception(f"Unexpected error processing file '{input_file}': {e}")
+        
+        return None
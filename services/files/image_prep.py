@@ -0,0 +1,210 @@
+"""
+Image normalization before OCR.
+
+Phone photos are often 12+ MP while tesseract's time grows with the pixel count
+and its accuracy peaks around 300 dpi. Images are rotated according to their
+EXIF orientation, downscaled so that a full page lands at the target DPI,
+converted to grayscale, deskewed and optionally binarized before OCR. The work
+runs in a small process pool so large photos do not hold the GIL of the caller.
+"""
+import os
+import time
+import atexit
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Optional
+
+from PIL import Image, ImageOps
+
+
+logger = logging.getLogger(__name__)
+
+# Normalize images before OCR; when disabled only EXIF rotation, the pixel cap and grayscale apply
+NORMALIZE = os.getenv("OCR_IMAGE_NORMALIZE", "true").lower() == "true"
+# Resolution a full page is scaled to
+TARGET_DPI = int(os.getenv("OCR_IMAGE_DPI", "300"))
+DESKEW = os.getenv("OCR_IMAGE_DESKEW", "true").lower() == "true"
+# Tesseract binarizes internally; an explicit Otsu pass mostly helps with flat lighting
+BINARIZE = os.getenv("OCR_IMAGE_BINARIZE", "false").lower() == "true"
+# Images above this many pixels are always downscaled
+IMAGE_MAX_PIXELS = int(os.getenv("OCR_IMAGE_MAX_PIXELS", "8000000"))
+# Worker processes normalizing images; 0 normalizes in the calling thread
+PREP_WORKERS = int(os.getenv("OCR_IMAGE_PREP_WORKERS", "2"))
+
+# Long side of an A4 page; photos are assumed to show one page
+PAGE_LONG_SIDE_INCHES = 11.7
+MAX_SKEW_DEGREES = 5.0
+# Long side of the thumbnail the skew is estimated on
+SKEW_SAMPLE_SIDE = 1000
+
+_executor: Optional[ProcessPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def otsu_threshold(histogram: List[int]) -> int:
+    """
+    Return the gray level that best separates dark and light pixels (Otsu's method).
+
+    Args:
+        histogram (List[int]): The 256-bin histogram of a grayscale image.
+
+    Returns:
+        int: Pixels above the threshold are background.
+    """
+    total = sum(histogram)
+    weighted_total = sum(level * count for level, count in enumerate(histogram))
+    background = weighted = 0
+    best_level, best_variance = 127, -1.0
+    for level, count in enumerate(histogram):
+        background += count
+        if background == 0:
+            continue
+        foreground = total - background
+        if foreground == 0:
+            break
+        weighted += level * count
+        mean_background = weighted / background
+        mean_foreground = (weighted_total - weighted) / foreground
+        variance = background * foreground * (mean_background - mean_foreground) ** 2
+        if variance > best_variance:
+            best_level, best_variance = level, variance
+    return best_level
+
+
+def _row_variance(image: Image.Image, angle: float) -> float:
+    """Variance of the row means after rotating: highest when text lines are horizontal."""
+    rotated = image.rotate(angle, resample=Image.BILINEAR, fillcolor=255)
+    rows = list(rotated.resize((1, rotated.height), Image.BOX).getdata())
+    mean = sum(rows) / len(rows)
+    return sum((row - mean) ** 2 for row in rows) / len(rows)
+
+
+def estimate_skew(image: Image.Image, max_degrees: float = MAX_SKEW_DEGREES) -> float:
+    """
+    Estimate the rotation that makes the text lines of a page horizontal.
+
+    A projection profile is computed on a thumbnail: 1 degree steps first, then
+    0.2 degree steps around the best one.
+
+    Args:
+        image (Image.Image): A grayscale image with dark text on a light background.
+        max_degrees (float): Largest skew considered, in either direction.
+
+    Returns:
+        float: The counter-clockwise rotation to apply, in degrees.
+    """
+    sample = image.copy()
+    sample.thumbnail((SKEW_SAMPLE_SIDE, SKEW_SAMPLE_SIDE))
+    steps = int(max_degrees)
+    best = max((float(a) for a in range(-steps, steps + 1)), key=lambda a: _row_variance(sample, a))
+    fine = [best + step / 5 for step in range(-4, 5) if abs(best + step / 5) <= max_degrees]
+    return max(fine, key=lambda a: _row_variance(sample, a))
+
+
+def normalize_file(
+    input_path: str,
+    output_path: str,
+    target_dpi: Optional[int] = TARGET_DPI,
+    deskew: bool = DESKEW,
+    binarize: bool = BINARIZE,
+    max_pixels: int = IMAGE_MAX_PIXELS,
+) -> Dict[str, Any]:
+    """
+    Normalize an image for OCR and save it as a PNG without EXIF data.
+
+    Args:
+        input_path (str): The path to the image.
+        output_path (str): The path to the normalized PNG.
+        target_dpi (Optional[int]): Resolution a full page is scaled down to; None keeps the size
+            unless the image exceeds `max_pixels`.
+        deskew (bool): Whether to straighten the text lines.
+        binarize (bool): Whether to reduce the image to black and white.
+        max_pixels (int): Pixel cap applied in every case.
+
+    Returns:
+        Dict[str, Any]: The original and final pixel counts, the rotation applied and the seconds spent.
+    """
+    started = time.perf_counter()
+    with Image.open(input_path) as image:
+        original_pixels = image.width * image.height
+        scale = min(1.0, (max_pixels / original_pixels) ** 0.5)
+        if target_dpi:
+            scale = min(scale, PAGE_LONG_SIDE_INCHES * target_dpi / max(image.width, image.height))
+        if scale < 1.0 and image.format == "JPEG":
+            # Decode the JPEG directly at a reduced scale (at least the requested size)
+            image.draft("L", (int(image.width * scale), int(image.height * scale)))
+        # The scale keeps its meaning after an EXIF rotation; the target size is computed afterwards
+        image = ImageOps.exif_transpose(image).convert("L")
+        if scale < 1.0:
+            width, height = image.size
+            factor = scale * (original_pixels / (width * height)) ** 0.5
+            size = (max(1, int(width * factor)), max(1, int(height * factor)))
+            if size != image.size:
+                image = image.resize(size, Image.LANCZOS)
+
+        angle = 0.0
+        if deskew:
+            angle = estimate_skew(image)
+            if abs(angle) >= 0.1:
+                image = image.rotate(angle, resample=Image.BICUBIC, expand=True, fillcolor=255)
+        if binarize:
+            threshold = otsu_threshold(image.histogram())
+            image = image.point([0 if level <= threshold else 255 for level in range(256)])
+
+        dpi = target_dpi or 300
+        image.save(output_path, format="PNG", dpi=(dpi, dpi))
+        pixels = image.width * image.height
+
+    return {
+        "original_pixels": original_pixels,
+        "pixels": pixels,
+        "deskew_degrees": round(angle, 2),
+        "binarized": binarize,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _get_executor() -> Optional[ProcessPoolExecutor]:
+    """Return the process-wide normalization pool, starting it on first use."""
+    global _executor
+    if PREP_WORKERS <= 0:
+        return None
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                # spawn: the pool may be created after other threads are running
+                _executor = ProcessPoolExecutor(
+                    max_workers=PREP_WORKERS,
+                    mp_context=multiprocessing.get_context("spawn"),
+                )
+                atexit.register(_executor.shutdown, wait=False, cancel_futures=True)
+    return _executor
+
+
+def prepare_image(input_path: str, output_path: str) -> Dict[str, Any]:
+    """
+    Normalize an image for OCR with the configured settings, in the worker pool.
+
+    With OCR_IMAGE_NORMALIZE=false only the EXIF rotation, the OCR_IMAGE_MAX_PIXELS
+    cap and the grayscale conversion apply.
+
+    Args:
+        input_path (str): The path to the image.
+        output_path (str): The path to the normalized PNG.
+
+    Returns:
+        Dict[str, Any]: The report of `normalize_file`.
+    """
+    options: Dict[str, Any] = {} if NORMALIZE else {"target_dpi": None, "deskew": False, "binarize": False}
+    executor = _get_executor()
+    if executor is None:
+        report = normalize_file(input_path, output_path, **options)
+    else:
+        report = executor.submit(normalize_file, input_path, output_path, **options).result()
+    logger.info(
+        f"Image '{input_path}' normalized from {report['original_pixels']} to {report['pixels']} pixels "
+        f"(deskew {report['deskew_degrees']} degrees) in {report['seconds']}s"
+    )
+    return report
@@ -0,0 +1,259 @@
+"""
+OCR language selection.
+
+Running tesseract with several models ("eng+spa") is noticeably slower than with
+one, and most documents only use one language. Before OCR, the language of a
+document is detected from its existing text layer or, failing that, from a quick
+OCR sample of one or two pages, and only the detected model is used. Users can
+pin a language for all their uploads, and each upload can request one.
+"""
+import io
+import os
+import re
+import logging
+import subprocess
+from typing import Iterable, List, Optional, Tuple
+
+import fitz
+from PIL import Image
+from redis import Redis
+
+
+logger = logging.getLogger(__name__)
+
+# Languages used when detection is disabled or inconclusive
+DEFAULT_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng+spa")
+DETECT_LANGUAGE = os.getenv("OCR_LANGUAGE_DETECT", "true").lower() == "true"
+# Languages a user or an upload may request
+ALLOWED_LANGUAGES = set(
+    os.getenv("OCR_ALLOWED_LANGUAGES", DEFAULT_LANGUAGE.replace("+", ",")).replace("+", ",").split(",")
+)
+# Pages OCRed to detect the language of a document without a text layer
+SAMPLE_PAGES = int(os.getenv("OCR_LANGUAGE_SAMPLE_PAGES", "2"))
+SAMPLE_DPI = 150
+SAMPLE_MAX_PIXELS = 2_000_000
+SAMPLE_TIMEOUT = 60
+# Characters of an existing text layer read to detect the language
+TEXT_SAMPLE_CHARS = 20_000
+# Stopwords needed before a decision is made
+MIN_STOPWORDS = 8
+# Share of the stopwords above which a document is considered single-language
+DOMINANCE = float(os.getenv("OCR_LANGUAGE_DOMINANCE", "0.8"))
+USER_LANGUAGE_PREFIX = "ocr:language"
+
+# Frequent words that do not exist (or are rare) in the other language
+_STOPWORDS = {
+    "eng": {
+        "the", "and", "of", "to", "in", "is", "that", "for", "it", "with", "was", "on", "are",
+        "be", "this", "by", "at", "from", "or", "an", "have", "not", "which", "will", "has",
+        "were", "their", "they", "been", "can", "would", "all", "its", "also", "more", "there",
+        "we", "our", "you", "your", "but", "if", "these", "than", "other", "such", "should", "any",
+    },
+    "spa": {
+        "de", "la", "que", "el", "en", "los", "del", "las", "por", "con", "una", "para", "es",
+        "se", "al", "lo", "como", "más", "mas", "su", "sus", "pero", "sobre", "este", "esta",
+        "entre", "cuando", "también", "tambien", "fue", "ha", "desde", "está", "todo", "hay",
+        "nos", "ser", "según", "segun", "donde", "puede", "muy", "sin", "ya", "otros", "cada",
+        "hasta", "durante", "dicho",
+    },
+}
+
+_WORD = re.compile(r"[^\W\d_]+")
+_LANGUAGE_CODE = re.compile(r"^[a-z]{3}(_[a-z]+)?$")
+
+
+def _candidates() -> List[str]:
+    """Languages of the default set that can be detected, in their default order."""
+    return [language for language in DEFAULT_LANGUAGE.split("+") if language in _STOPWORDS]
+
+
+def detect_text_language(text: str) -> Optional[str]:
+    """
+    Detect the language of a text by counting language-specific stopwords.
+
+    Args:
+        text (str): The text to analyse.
+
+    Returns:
+        Optional[str]: A single language ("spa"), several if none dominates ("eng+spa"),
+        or None if the text has too few stopwords to decide.
+    """
+    candidates = _candidates()
+    counts = dict.fromkeys(candidates, 0)
+    for word in _WORD.findall(text.lower()):
+        for language in candidates:
+            if word in _STOPWORDS[language]:
+                counts[language] += 1
+
+    total = sum(counts.values())
+    if total < MIN_STOPWORDS:
+        return None
+    best = max(candidates, key=counts.get)
+    if counts[best] / total >= DOMINANCE:
+        return best
+    return "+".join(language for language in candidates if counts[language] / total >= 1 - DOMINANCE)
+
+
+def _sample_text(image: Image.Image) -> str:
+    """OCR a downscaled image with a single model, just well enough to count stopwords."""
+    pixels = image.width * image.height
+    if pixels > SAMPLE_MAX_PIXELS:
+        scale = (SAMPLE_MAX_PIXELS / pixels) ** 0.5
+        image = image.resize((int(image.width * scale), int(image.height * scale)))
+    buffer = io.BytesIO()
+    image.convert("L").save(buffer, format="PNG")
+    # The first default language is enough: stopwords of the others survive a foreign model
+    sample_language = DEFAULT_LANGUAGE.split("+")[0]
+    result = subprocess.run(
+        ["tesseract", "stdin", "stdout", "-l", sample_language, "--psm", "3"],
+        input=buffer.getvalue(),
+        capture_output=True,
+        check=True,
+        timeout=SAMPLE_TIMEOUT,
+    )
+    return result.stdout.decode("utf-8", errors="replace")
+
+
+def _spread(pages: List[int], count: int) -> List[int]:
+    """Pick up to `count` pages spread over the document, avoiding the often sparse first page."""
+    if len(pages) <= count:
+        return pages
+    return [pages[len(pages) * (i + 1) // (count + 1)] for i in range(count)]
+
+
+def detect_pdf_language(input_pdf: str, ocr_pages: Iterable[int]) -> Optional[str]:
+    """
+    Detect the language of a PDF before OCR.
+
+    The text layer of the pages that will not be OCRed is read first; if it is not
+    enough, up to OCR_LANGUAGE_SAMPLE_PAGES of the pages to OCR are rendered at low
+    resolution and OCRed with a single model.
+
+    Args:
+        input_pdf (str): The path to the PDF file.
+        ocr_pages (Iterable[int]): The 0-based pages that will be OCRed.
+
+    Returns:
+        Optional[str]: The detected language(s), or None if undecided.
+    """
+    ocr_pages = sorted(ocr_pages)
+    skip = set(ocr_pages)
+    try:
+        with fitz.open(input_pdf) as pdf:
+            parts, chars = [], 0
+            for page in pdf:
+                if page.number in skip:
+                    continue
+                text = page.get_text()
+                parts.append(text)
+                chars += len(text)
+                if chars >= TEXT_SAMPLE_CHARS:
+                    break
+            detected = detect_text_language(" ".join(parts))
+            if detected:
+                return detected
+
+            parts = []
+            for index in _spread(ocr_pages, SAMPLE_PAGES):
+                pixmap = pdf[index].get_pixmap(dpi=SAMPLE_DPI, colorspace=fitz.csGRAY)
+                image = Image.frombytes("L", (pixmap.width, pixmap.height), pixmap.samples)
+                parts.append(_sample_text(image))
+        return detect_text_language(" ".join(parts))
+    except Exception as e:
+        logger.warning(f"Language detection failed for '{input_pdf}': {e}")
+        return None
+
+
+def detect_image_language(image: Image.Image) -> Optional[str]:
+    """
+    Detect the language of an image from a quick single-model OCR sample.
+
+    Returns:
+        Optional[str]: The detected language(s), or None if undecided.
+    """
+    try:
+        return detect_text_language(_sample_text(image))
+    except Exception as e:
+        logger.warning(f"Language detection failed for image: {e}")
+        return None
+
+
+def choose_pdf_language(input_pdf: str, ocr_pages: Iterable[int], language: Optional[str]) -> Tuple[str, str]:
+    """
+    Return the OCR language for a PDF and where it comes from.
+
+    Args:
+        input_pdf (str): The path to the PDF file.
+        ocr_pages (Iterable[int]): The 0-based pages that will be OCRed.
+        language (Optional[str]): The language requested for the file, if any.
+
+    Returns:
+        Tuple[str, str]: The language and its origin: "requested", "detected" or "default".
+    """
+    if language:
+        return language, "requested"
+    detected = detect_pdf_language(input_pdf, ocr_pages) if DETECT_LANGUAGE else None
+    return (detected, "detected") if detected else (DEFAULT_LANGUAGE, "default")
+
+
+def choose_image_language(image: Image.Image, language: Optional[str]) -> Tuple[str, str]:
+    """
+    Return the OCR language for an image and where it comes from.
+
+    Args:
+        image (Image.Image): The prepared image.
+        language (Optional[str]): The language requested for the file, if any.
+
+    Returns:
+        Tuple[str, str]: The language and its origin: "requested", "detected" or "default".
+    """
+    if language:
+        return language, "requested"
+    detected = detect_image_language(image) if DETECT_LANGUAGE else None
+    return (detected, "detected") if detected else (DEFAULT_LANGUAGE, "default")
+
+
+def normalize_language(language: str) -> str:
+    """
+    Validate a language request such as "spa" or "eng+spa".
+
+    Args:
+        language (str): Tesseract language codes joined with "+".
+
+    Returns:
+        str: The normalized language string.
+
+    Raises:
+        ValueError: If a code is malformed or not in OCR_ALLOWED_LANGUAGES.
+    """
+    codes = [code.strip().lower() for code in language.split("+") if code.strip()]
+    if not codes:
+        raise ValueError("No language given")
+    for code in codes:
+        if not _LANGUAGE_CODE.match(code) or code not in ALLOWED_LANGUAGES:
+            raise ValueError(f"Unsupported OCR language '{code}'")
+    return "+".join(dict.fromkeys(codes))
+
+
+def get_user_language(redis_conn: Redis, namespace: str) -> Optional[str]:
+    """Return the OCR language pinned by a user, if any."""
+    value = redis_conn.get(f"{USER_LANGUAGE_PREFIX}:{namespace}")
+    if value is None:
+        return None
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def set_user_language(redis_conn: Redis, namespace: str, language: Optional[str]) -> None:
+    """
+    Pin the OCR language of a user's uploads, or go back to detection.
+
+    Args:
+        redis_conn (Redis): The Redis connection.
+        namespace (str): The user namespace.
+        language (Optional[str]): A normalized language string, or None to clear it.
+    """
+    key = f"{USER_LANGUAGE_PREFIX}:{namespace}"
+    if language:
+        redis_conn.set(key, language)
+    else:
+        redis_conn.delete(key)
@@ -0,0 +1,103 @@
+"""
+Prometheus metrics for the ingestion pipeline.
+
+Every stage reported by the pipeline is observed here when it finishes, so the
+API (GET /metrics) and the ingestion workers (INGEST_METRICS_PORT) export the
+same series.
+"""
+from typing import Any, Dict
+
+from prometheus_client import Counter, Gauge, Histogram
+
+from .ocr_scheduler import OCRScheduler
+
+
+# Stages range from milliseconds (link, dedup) to minutes (OCR of large scans)
+_STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+STAGE_SECONDS = Histogram(
+    "zolkin_ingest_stage_seconds",
+    "Duration of each ingestion stage",
+    ["stage", "status"],
+    buckets=_STAGE_BUCKETS,
+)
+STAGE_PAGES = Counter(
+    "zolkin_ingest_stage_pages",
+    "Pages (rows for the index stage) handled by each ingestion stage",
+    ["stage"],
+)
+STAGE_BYTES = Counter(
+    "zolkin_ingest_stage_bytes",
+    "Bytes read and written by each ingestion stage",
+    ["stage", "direction"],
+)
+OCR_PAGES = Counter(
+    "zolkin_ingest_ocr_pages",
+    "Pages sent to OCR or skipped because they already had a text layer",
+    ["result"],
+)
+FILES = Counter(
+    "zolkin_ingest_files",
+    "Ingested files by outcome",
+    ["outcome"],
+)
+BATCH_SECONDS = Histogram(
+    "zolkin_ingest_batch_seconds",
+    "Duration of embedding or inserting one batch of chunks",
+    ["step"],
+)
+OCR_QUEUE_DEPTH = Gauge(
+    "zolkin_ocr_queue_depth",
+    "Pages waiting in the OCR scheduler of this process",
+)
+OCR_IN_FLIGHT = Gauge(
+    "zolkin_ocr_in_flight",
+    "Pages being OCRed by the scheduler of this process",
+)
+
+
+def _scheduler_metric(name: str) -> float:
+    scheduler = OCRScheduler.current()
+    return scheduler.metrics()[name] if scheduler is not None else 0
+
+
+OCR_QUEUE_DEPTH.set_function(lambda: _scheduler_metric("queue_depth"))
+OCR_IN_FLIGHT.set_function(lambda: _scheduler_metric("in_flight"))
+
+
+def observe_stage(stage: str, status: str, info: Dict[str, Any]) -> None:
+    """
+    Record a finished stage.
+
+    Args:
+        stage (str): The stage name.
+        status (str): The final status of the stage ("done", "failed", "skipped").
+        info (Dict[str, Any]): The stage report: seconds and optional pages, rows, bytes_in,
+            bytes_out, ocr_pages and skipped_pages.
+    """
+    if "seconds" in info:
+        STAGE_SECONDS.labels(stage, status).observe(info["seconds"])
+
+    pages = info.get("rows") if stage == "index" else info.get("pages")
+    if pages:
+        STAGE_PAGES.labels(stage).inc(pages)
+    if info.get("bytes_in"):
+        STAGE_BYTES.labels(stage, "in").inc(info["bytes_in"])
+    if info.get("bytes_out"):
+        STAGE_BYTES.labels(stage, "out").inc(info["bytes_out"])
+
+    if stage == "ocr":
+        if info.get("ocr_pages"):
+            OCR_PAGES.labels("processed").inc(info["ocr_pages"])
+        if info.get("skipped_pages"):
+            OCR_PAGES.labels("skipped").inc(info["skipped_pages"])
+
+
+def observe_file(outcome: str) -> None:
+    """
+    Record the outcome of an ingested file.
+
+    Args:
+        outcome (str): "done", "linked" or "failed".
+    """
+    FILES.labels(outcome).inc()
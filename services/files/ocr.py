@@ -1,11 +1,21 @@
 """
 Functionalities for Optical Character Recognition (OCR) and text extraction from PDF files.
 """
+import os
+import shutil
 import logging
+import tempfile
+import subprocess
 from pathlib import Path
-from typing import List, Optional
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
+import fitz
 import ocrmypdf
+from PIL import Image
+
+from .ocr_scheduler import OCR_OPTIMIZE, OCRScheduler
+from .language import choose_image_language, choose_pdf_language
+from .image_prep import prepare_image
 
 from langchain_core.documents import Document
 from langchain_community.document_loaders import PyMuPDFLoader
@@ -13,6 +23,21 @@ from langchain_community.document_loaders import PyMuPDFLoader
 
 logger = logging.getLogger(__name__)
 
+# Page classes produced by the pre-pass
+PAGE_TEXT = "text"
+PAGE_IMAGE = "image"
+PAGE_MIXED = "mixed"
+PAGE_EMPTY = "empty"
+
+# Minimum characters for a page to count as having a usable text layer
+MIN_TEXT_CHARS = int(os.getenv("OCR_MIN_TEXT_CHARS", "20"))
+# Fraction of the page covered by images above which a text page is considered mixed
+MIXED_IMAGE_COVERAGE = float(os.getenv("OCR_MIXED_IMAGE_COVERAGE", "0.5"))
+# Seconds before a tesseract run on a single image is killed
+OCR_TIMEOUT = float(os.getenv("OCR_TIMEOUT", "300"))
+# Also write the OCRed, searchable PDF; ingestion reads the OCR text from the sidecar either way
+SEARCHABLE_PDF = os.getenv("OCR_SEARCHABLE_PDF", "false").lower() == "true"
+
 
 class OCRProcessor:
     """
@@ -20,24 +45,124 @@ class OCRProcessor:
     """
     
     @staticmethod
-    def ocr_pdf(input_pdf: str, language: str = "eng+spa", output_pdf: Optional[str] = None) -> Optional[str]:
+    def classify_pages(input_pdf: str) -> List[str]:
+        """
+        Classify every page of a PDF by whether it needs OCR.
+        
+        A page is "text" if it already has a text layer, "image" if it only has images,
+        "mixed" if it has a text layer but is mostly covered by images (e.g. a scan with
+        a stamped header), and "empty" if it has neither.
+        
+        Args:
+            input_pdf (str): The path to the PDF file.
+            
+        Returns:
+            List[str]: The class of each page, in page order.
+        """
+        classes = []
+        with fitz.open(input_pdf) as pdf:
+            for page in pdf:
+                has_text = len(page.get_text("text").strip()) >= MIN_TEXT_CHARS
+                page_area = abs(page.rect) or 1.0
+                image_area = sum(abs(fitz.Rect(info["bbox"]) & page.rect) for info in page.get_image_info())
+                coverage = min(image_area / page_area, 1.0)
+                
+                if has_text and coverage >= MIXED_IMAGE_COVERAGE:
+                    classes.append(PAGE_MIXED)
+                elif has_text:
+                    classes.append(PAGE_TEXT)
+                elif coverage > 0:
+                    classes.append(PAGE_IMAGE)
+                else:
+                    classes.append(PAGE_EMPTY)
+        return classes
+    
+    @staticmethod
+    def ocr_pdf(input_pdf: str, language: Optional[str] = None, output_pdf: Optional[str] = None) -> Optional[str]:
         """
         Adds an OCR text layer to scanned PDF files, allowing them to be searched using OCRmyPDF.
         
+        Only the pages that need it are OCRed; see `ocr_pdf_with_report`.
+        
         Args:
             input_pdf (str): The path to the input PDF file.
-            language (str): The language(s) to use for OCR. Default is 'eng+spa' (English and Spanish).
+            language (Optional[str]): The language(s) to use for OCR, e.g. 'spa' or 'eng+spa'. If None,
+                the language is detected per document (see `services.files.language`).
             output_pdf (Optional[str]): The path to the output PDF file. If None, overwrites the input file.
             
         Returns:
             Optional[str]: The path to the processed PDF file if successful, None otherwise.
         """
+        output, _ = OCRProcessor.ocr_pdf_with_report(input_pdf, language=language, output_pdf=output_pdf)
+        return output
+    
+    @staticmethod
+    def _plan_pages(input_pdf: str, report: Dict[str, Any]) -> Dict[int, str]:
+        """
+        Decide which pages need OCR and the ocrmypdf mode of each, filling in the report.
+        
+        Born-digital pages are skipped, image-only pages use "skip_text" and mixed pages
+        "redo_ocr". With OCR_MODE=force every page uses "force_ocr".
+        
+        Returns:
+            Dict[int, str]: The 0-based pages to OCR and their ocrmypdf mode; empty if none.
+        """
+        classes = OCRProcessor.classify_pages(input_pdf)
+        if os.getenv("OCR_MODE", "selective").lower() == "force":
+            report.update(pages=len(classes), ocr_pages=len(classes), mode="force")
+            return {i: "force_ocr" for i in range(len(classes))}
+        
+        pending = [i for i, c in enumerate(classes) if c in (PAGE_IMAGE, PAGE_MIXED)]
+        report.update(pages=len(classes), ocr_pages=len(pending), skipped_pages=len(classes) - len(pending))
+        if pending:
+            # Mixed pages need their partial text layer redone; image pages only need OCR
+            mixed = any(classes[i] == PAGE_MIXED for i in pending)
+            report["mode"] = "redo_ocr" if mixed else "skip_text"
+        return {i: "redo_ocr" if classes[i] == PAGE_MIXED else "skip_text" for i in pending}
+    
+    @staticmethod
+    def _ocrmypdf_options(page_modes: Dict[int, str], mode: str) -> Dict[str, Any]:
+        """Return the ocrmypdf options that OCR the planned pages of a whole file in one run."""
+        if mode == "force":
+            return {"force_ocr": True}
+        return {mode: True, "pages": ",".join(str(i + 1) for i in sorted(page_modes))}
+    
+    @staticmethod
+    def ocr_pdf_with_report(
+        input_pdf: str,
+        language: Optional[str] = None,
+        output_pdf: Optional[str] = None,
+        namespace: str = "",
+    ) -> Tuple[Optional[str], Dict[str, Any]]:
+        """
+        Adds an OCR text layer only to the pages that lack one.
+        
+        Pages are classified with PyMuPDF first. Born-digital pages keep their text layer,
+        image-only pages are OCRed, and mixed pages have their text layer redone. With
+        OCR_MODE=force every page is rasterized and OCRed as before.
+        
+        The pages are OCRed through the process-wide `OCRScheduler`, which shares a fixed
+        pool of workers fairly between namespaces. With OCR_SCHEDULER=false ocrmypdf
+        processes the whole file in the calling process.
+        
+        Args:
+            input_pdf (str): The path to the input PDF file.
+            language (Optional[str]): The language(s) to use for OCR, e.g. 'spa' or 'eng+spa'. If None,
+                the language is detected per document (see `services.files.language`).
+            output_pdf (Optional[str]): The path to the output PDF file. If None, overwrites the input file.
+            namespace (str): The namespace the file belongs to, used for fair scheduling.
+            
+        Returns:
+            Tuple[Optional[str], Dict[str, Any]]: The path to the processed PDF file (None on error)
+            and a report with the number of pages OCRed and skipped.
+        """
+        report: Dict[str, Any] = {"pages": 0, "ocr_pages": 0, "skipped_pages": 0, "mode": "skip"}
         try:
             input_path = Path(input_pdf)
             # Validate input file
             if not input_path.exists():
                 logger.error(f"Input PDF file '{input_pdf}' does not exist")
-                return None
+                return None, report
                 
             # If no output path is specified, use the input path
             if output_pdf is None:
@@ -47,24 +172,265 @@ class OCRProcessor:
             output_path = Path(output_pdf)
             output_path.parent.mkdir(parents=True, exist_ok=True)
             
+            page_modes = OCRProcessor._plan_pages(str(input_path), report)
+            if not page_modes:
+                # Every page already has a text layer (or is blank): keep it as is
+                logger.info(f"Skipping OCR for '{input_pdf}': all {report['pages']} pages have a text layer")
+                if output_path != input_path:
+                    shutil.copyfile(input_path, output_path)
+                return str(output_path), report
+            
+            language, report["language_source"] = choose_pdf_language(str(input_path), page_modes, language)
+            report["language"] = language
+            scheduler = OCRScheduler.get_scheduler()
+            if scheduler is not None:
+                logger.info(
+                    f"Queueing {report['ocr_pages']}/{report['pages']} pages of '{input_pdf}' "
+                    f"for OCR with language '{language}' (mode: {report['mode']})"
+                )
+                scheduler.ocr_pages(str(input_path), str(output_path), page_modes, language, namespace)
+                logger.info(f"OCR successfully applied to '{input_pdf}', saved to '{output_pdf}'")
+                return str(output_path), report
+            
             # Use ocrmypdf as a Python module
-            logger.info(f"Applying OCR to '{input_pdf}' with language '{language}'")
+            logger.info(
+                f"Applying OCR to {report['ocr_pages']}/{report['pages']} pages of '{input_pdf}' "
+                f"with language '{language}' (mode: {report['mode']})"
+            )
             ocrmypdf.ocr(
                 input_file=str(input_path),
                 output_file=str(output_path),
                 language=language,
-                force_ocr=True,
-                output_type="pdf"
+                output_type="pdf",
+                optimize=OCR_OPTIMIZE,
+                **OCRProcessor._ocrmypdf_options(page_modes, report["mode"]),
             )
             logger.info(f"OCR successfully applied to '{input_pdf}', saved to '{output_pdf}'")
             
-            return str(output_path)
+            return str(output_path), report
         except ocrmypdf.exceptions.PriorOcrFoundError as e:
             logger.warning(f"Prior OCR found in '{input_pdf}': {str(e)}")
-            return str(output_path)  # Return the path anyway as the file is usable
+            return str(output_path), report  # Return the path anyway as the file is usable
         except Exception as e:
             logger.exception(f"Error applying OCR to '{input_pdf}': {e}")
-            return None
+            return None, report
+    
+    @staticmethod
+    def ocr_pdf_pages(
+        input_pdf: str,
+        namespace: str,
+        language: Optional[str] = None,
+        searchable_pdf: bool = SEARCHABLE_PDF,
+    ) -> Tuple[Optional[Iterator[Document]], Dict[str, Any]]:
+        """
+        OCR the pages of a PDF that need it and return every page as a Document.
+        
+        Pages are planned as in `ocr_pdf_with_report`, but the text of the OCRed pages is
+        taken from the ocrmypdf sidecar output instead of being parsed back out of a new
+        text layer. Pages that already had a text layer are read from the PDF as usual.
+        
+        The searchable PDF is only written when `searchable_pdf` is set (OCR_SEARCHABLE_PDF),
+        in which case it replaces the input file; otherwise the input PDF is left untouched.
+        
+        Args:
+            input_pdf (str): The path to the PDF file.
+            namespace (str): The namespace to use for the extracted text.
+            language (Optional[str]): The language(s) to use for OCR, e.g. 'spa' or 'eng+spa'. If None,
+                the language is detected per document (see `services.files.language`).
+            searchable_pdf (bool): Whether to also replace the input file with its searchable version.
+            
+        Returns:
+            Tuple[Optional[Iterator[Document]], Dict[str, Any]]: The pages, extracted lazily (None on
+            error), and a report with the number of pages OCRed and skipped.
+        """
+        report: Dict[str, Any] = {"pages": 0, "ocr_pages": 0, "skipped_pages": 0, "mode": "skip"}
+        try:
+            if not Path(input_pdf).exists():
+                logger.error(f"Input PDF file '{input_pdf}' does not exist")
+                return None, report
+            
+            page_modes = OCRProcessor._plan_pages(input_pdf, report)
+            report["searchable_pdf"] = bool(page_modes) and searchable_pdf
+            if not page_modes:
+                logger.info(f"Skipping OCR for '{input_pdf}': all {report['pages']} pages have a text layer")
+                return OCRProcessor.iter_pdf_pages(input_pdf, namespace), report
+            
+            language, report["language_source"] = choose_pdf_language(input_pdf, page_modes, language)
+            report["language"] = language
+            output_pdf = input_pdf if searchable_pdf else None
+            scheduler = OCRScheduler.get_scheduler()
+            logger.info(
+                f"OCRing {report['ocr_pages']}/{report['pages']} pages of '{input_pdf}' "
+                f"with language '{language}' (mode: {report['mode']}, searchable PDF: {report['searchable_pdf']})"
+            )
+            if scheduler is not None:
+                texts = scheduler.ocr_pages(input_pdf, output_pdf, page_modes, language, namespace)
+            else:
+                texts = OCRProcessor._ocr_sidecar(input_pdf, output_pdf, page_modes, language, report["mode"])
+            logger.info(f"OCR extracted the text of {len(texts)} pages of '{input_pdf}'")
+            # redo_ocr only recognizes the image parts of mixed pages: their text layer is kept too
+            mixed_pages = {i for i, mode in page_modes.items() if mode == "redo_ocr"}
+            pages = OCRProcessor.iter_pdf_pages(input_pdf, namespace, ocr_texts=texts, merge_pages=mixed_pages)
+            return pages, report
+        except Exception as e:
+            logger.exception(f"Error applying OCR to '{input_pdf}': {e}")
+            return None, report
+    
+    @staticmethod
+    def _ocr_sidecar(
+        input_pdf: str,
+        output_pdf: Optional[str],
+        page_modes: Dict[int, str],
+        language: str,
+        mode: str,
+    ) -> Dict[int, str]:
+        """
+        OCR the planned pages of a whole file in one ocrmypdf run and read its sidecar text.
+        
+        The sidecar holds one form-feed separated segment per page of the file; pages that
+        were not OCRed only have a placeholder and are left out.
+        
+        Returns:
+            Dict[int, str]: The recognized text of each OCRed page.
+        """
+        with tempfile.TemporaryDirectory(prefix="zolkin-ocr-") as tmpdir:
+            sidecar = Path(tmpdir) / "sidecar.txt"
+            ocrmypdf.ocr(
+                input_file=input_pdf,
+                output_file=output_pdf or os.devnull,
+                sidecar=str(sidecar),
+                language=language,
+                output_type="pdf" if output_pdf else "none",
+                optimize=OCR_OPTIMIZE,
+                **OCRProcessor._ocrmypdf_options(page_modes, mode),
+            )
+            segments = sidecar.read_text(encoding="utf-8").split("\f")
+        return {i: segments[i].strip() for i in sorted(page_modes) if i < len(segments)}
+    
+    @staticmethod
+    def ocr_image(
+        image_path: str,
+        namespace: str,
+        language: Optional[str] = None,
+        source: Optional[str] = None,
+    ) -> List[Document]:
+        """
+        Run tesseract directly on an image, without converting it to PDF first.
+        
+        The image is normalized first (EXIF rotation, target DPI, grayscale, deskew;
+        see `services.files.image_prep`) in the normalization worker pool.
+        
+        Args:
+            image_path (str): The path to the image file.
+            namespace (str): The namespace to use for the extracted text.
+            language (Optional[str]): The language(s) to use for OCR, e.g. 'spa' or 'eng+spa'. If None,
+                the language is detected per document (see `services.files.language`).
+            source (Optional[str]): The source name of the document. Defaults to the image stem with ".pdf",
+                matching the name the archival PDF gets.
+            
+        Returns:
+            List[Document]: A single Document with the same metadata as `load_pdf`, or an empty list on error.
+        """
+        input_path = Path(image_path)
+        source = source or f"{input_path.stem}.pdf"
+        try:
+            with tempfile.TemporaryDirectory(prefix="zolkin-ocr-") as tmpdir:
+                prepared = Path(tmpdir) / "page.png"
+                prepare_image(str(input_path), str(prepared))
+                with Image.open(prepared) as image:
+                    language, origin = choose_image_language(image, language)
+                
+                logger.info(f"Applying OCR directly to image '{image_path}' with language '{language}' ({origin})")
+                result = subprocess.run(
+                    ["tesseract", str(prepared), "stdout", "-l", language],
+                    check=True,
+                    capture_output=True,
+                    text=True,
+                    timeout=OCR_TIMEOUT,
+                )
+            
+            text = result.stdout.strip()
+            logger.info(f"OCR extracted {len(text)} characters from '{image_path}'")
+            return [
+                Document(
+                    page_content=text,
+                    metadata={
+                        "namespace": namespace,
+                        "source": source,
+                        "page": 0,
+                        "author": "",
+                    },
+                )
+            ]
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Tesseract failed on '{image_path}': {e.stderr}")
+            return []
+        except Exception as e:
+            logger.exception(f"Error applying OCR to image '{image_path}': {e}")
+            return []
+    
+    @staticmethod
+    def merge_page_text(text_layer: str, ocr_text: str) -> str:
+        """
+        Combine the text layer of a page with the text OCR recognized on it.
+        
+        OCR lines already present in the text layer (e.g. when the searchable PDF
+        replaced the input) are dropped, ignoring case and whitespace.
+        
+        Args:
+            text_layer (str): The text read from the page's text layer.
+            ocr_text (str): The text recognized by OCR.
+            
+        Returns:
+            str: The text layer followed by the new OCR lines.
+        """
+        def _key(line: str) -> str:
+            return " ".join(line.split()).lower()
+        
+        text_layer = text_layer.strip()
+        known = {_key(line) for line in text_layer.splitlines()}
+        extra = [line for line in ocr_text.splitlines() if line.strip() and _key(line) not in known]
+        return "\n".join([text_layer, *extra]).strip()
+    
+    @staticmethod
+    def iter_pdf_pages(
+        file_path: str,
+        namespace: str,
+        ocr_texts: Optional[Dict[int, str]] = None,
+        merge_pages: Iterable[int] = (),
+    ) -> Iterator[Document]:
+        """
+        Lazily extract the pages of a PDF file, one Document at a time.
+        
+        Args:
+            file_path (str): The path to the PDF file.
+            namespace (str): The namespace to use for the extracted text.
+            ocr_texts (Optional[Dict[int, str]]): Text recognized by OCR for some 0-based pages,
+                used instead of the text layer of those pages.
+            merge_pages (Iterable[int]): 0-based pages whose OCR text is added to their text
+                layer instead of replacing it (mixed pages, where OCR only read the images).
+            
+        Returns:
+            Iterator[Document]: The pages with the same metadata as `load_pdf`.
+        """
+        loader = PyMuPDFLoader(file_path)
+        source = Path(file_path).name
+        ocr_texts = ocr_texts or {}
+        merge_pages = set(merge_pages)
+        for doc in loader.lazy_load():
+            page = doc.metadata.get("page", 0)
+            if page in merge_pages and page in ocr_texts:
+                doc.page_content = OCRProcessor.merge_page_text(doc.page_content, ocr_texts[page])
+            elif page in ocr_texts:
+                doc.page_content = ocr_texts[page]
+            # Merge default metadata with document metadata and additional metadata
+            doc.metadata = {
+                "namespace": namespace,
+                "source": source,
+                "page": page,
+                "author": doc.metadata.get("author", ""),
+            }
+            yield doc
     
     @staticmethod
     def load_pdf(file_path: str, namespace: str) -> List[Optional[Document]]:
@@ -88,23 +454,8 @@ class OCRProcessor:
             
             logger.info(f"Loading PDF file '{file_path}' with namespace '{namespace}'")
             
-            # Load the PDF file
-            loader = PyMuPDFLoader(file_path)
-            source = input_path.name
-            
-            # Process each page
-            file_content = []
-            for doc in loader.lazy_load():
-                # Merge default metadata with document metadata and additional metadata
-                doc_metadata = {
-                    "namespace": namespace,
-                    "source": source,
-                    "page": doc.metadata.get("page", 0),
-                    "author": doc.metadata.get("author", ""),
-                }
-                # Update document metadata
-                doc.metadata = doc_metadata
-                file_content.append(doc)
+            # Load and process each page
+            file_content = list(OCRProcessor.iter_pdf_pages(file_path, namespace))
             
             logger.info(f"Successfully loaded {len(file_content)} pages from '{file_path}'")
             return file_content
@@ -0,0 +1,341 @@
+"""
+Process-wide OCR scheduler.
+
+Pages that need OCR are queued per namespace and dispatched round-robin to a
+fixed pool of worker processes sized to the available cores, so concurrent
+uploads share the CPU instead of each starting its own set of tesseract
+processes.
+"""
+import os
+import json
+import time
+import atexit
+import shutil
+import logging
+import threading
+import multiprocessing
+from pathlib import Path
+from dataclasses import dataclass
+from collections import OrderedDict, deque
+from concurrent.futures import CancelledError, Future, ProcessPoolExecutor, wait
+from typing import Any, Deque, Dict, List, Optional
+
+import fitz
+import ocrmypdf
+from redis import Redis
+
+
+logger = logging.getLogger(__name__)
+
+# Worker processes in the pool; 0 means one per available core
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", "0")) or (os.cpu_count() or 1)
+# Window over which the pages/sec rate is computed
+RATE_WINDOW_SECONDS = 60.0
+# ocrmypdf optimization level of the searchable PDFs (0 skips optimization, ocrmypdf's default is 1)
+OCR_OPTIMIZE = int(os.getenv("OCR_OPTIMIZE", "0"))
+METRICS_KEY_PREFIX = "ocr:metrics"
+
+
+def _init_worker() -> None:
+    # One tesseract thread per process: the pool already provides the parallelism
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+
+
+def _ocr_page(input_pdf: str, output_pdf: Optional[str], sidecar: str, language: str, mode: str) -> None:
+    """OCR a single-page PDF in a worker process, writing its text and optionally its searchable PDF."""
+    ocrmypdf.ocr(
+        input_file=input_pdf,
+        output_file=output_pdf or os.devnull,
+        sidecar=sidecar,
+        language=language,
+        output_type="pdf" if output_pdf else "none",
+        optimize=OCR_OPTIMIZE,
+        jobs=1,
+        progress_bar=False,
+        **{mode: True},
+    )
+
+
+@dataclass
+class _PageTask:
+    namespace: str
+    input_pdf: str
+    output_pdf: Optional[str]
+    sidecar: str
+    language: str
+    mode: str
+    future: Future
+
+
+class OCRScheduler:
+    """
+    Fixed pool of OCR worker processes fed by a page-level queue.
+
+    Each namespace has its own queue of pages; the dispatcher takes one page from
+    each namespace in turn, so a large upload cannot starve the others. At most
+    `workers` pages are handed to the pool at any time.
+    """
+
+    _instance: Optional["OCRScheduler"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(self, workers: int = OCR_WORKERS) -> None:
+        """
+        Initialize the scheduler and start its dispatcher.
+
+        Args:
+            workers (int): Number of OCR worker processes.
+        """
+        self.workers = workers
+        # spawn: the pool may be created after other threads are running
+        self._executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+        )
+        self._queues: "OrderedDict[str, Deque[_PageTask]]" = OrderedDict()
+        self._cond = threading.Condition()
+        self._in_flight = 0
+        self._completed: Deque[float] = deque()
+        self._pages_done = 0
+        self._pages_failed = 0
+        self._closed = False
+        self._dispatcher = threading.Thread(target=self._dispatch, name="ocr-scheduler", daemon=True)
+        self._dispatcher.start()
+        logger.info(f"OCR scheduler started with {workers} workers")
+
+    @classmethod
+    def get_scheduler(cls) -> Optional["OCRScheduler"]:
+        """
+        Return the process-wide scheduler, starting it on first use.
+
+        Returns:
+            Optional[OCRScheduler]: The scheduler, or None if disabled with OCR_SCHEDULER=false.
+        """
+        if os.getenv("OCR_SCHEDULER", "true").lower() != "true":
+            return None
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    cls._instance = cls()
+                    atexit.register(cls._instance.shutdown)
+        return cls._instance
+
+    @classmethod
+    def current(cls) -> Optional["OCRScheduler"]:
+        """Return the scheduler if it has been started in this process, without starting it."""
+        return cls._instance
+
+    def submit(
+        self,
+        namespace: str,
+        input_pdf: str,
+        output_pdf: Optional[str],
+        sidecar: str,
+        language: str,
+        mode: str,
+    ) -> Future:
+        """
+        Queue the OCR of a single-page PDF.
+
+        Args:
+            namespace (str): The namespace the page belongs to, used for fair scheduling.
+            input_pdf (str): The path to the single-page input PDF.
+            output_pdf (Optional[str]): The path to the OCRed output PDF, or None to only extract the text.
+            sidecar (str): The path to the recognized text.
+            language (str): The language(s) to use for OCR.
+            mode (str): The ocrmypdf option to enable: "skip_text", "redo_ocr" or "force_ocr".
+
+        Returns:
+            Future: Resolves to the sidecar path once the page is OCRed.
+        """
+        task = _PageTask(namespace, input_pdf, output_pdf, sidecar, language, mode, Future())
+        with self._cond:
+            self._queues.setdefault(namespace, deque()).append(task)
+            self._cond.notify_all()
+        return task.future
+
+    def _next_task(self) -> _PageTask:
+        """Pop the next page, rotating between namespaces. Must hold the lock."""
+        namespace, tasks = next(iter(self._queues.items()))
+        task = tasks.popleft()
+        if tasks:
+            self._queues.move_to_end(namespace)
+        else:
+            del self._queues[namespace]
+        return task
+
+    def _dispatch(self) -> None:
+        """Hand queued pages to the pool as workers become free."""
+        while True:
+            with self._cond:
+                while not self._closed and (not self._queues or self._in_flight >= self.workers):
+                    self._cond.wait()
+                if self._closed:
+                    return
+                task = self._next_task()
+                # Once running, the page can no longer be cancelled by its caller
+                if not task.future.set_running_or_notify_cancel():
+                    continue
+                self._in_flight += 1
+
+            try:
+                result = self._executor.submit(
+                    _ocr_page, task.input_pdf, task.output_pdf, task.sidecar, task.language, task.mode
+                )
+            except Exception as e:
+                self._finish(task, e)
+                continue
+            result.add_done_callback(
+                lambda f, task=task: self._finish(task, CancelledError() if f.cancelled() else f.exception())
+            )
+
+    def _finish(self, task: _PageTask, error: Optional[BaseException]) -> None:
+        """Record a finished page and resolve its future."""
+        with self._cond:
+            self._in_flight -= 1
+            if error is None:
+                self._pages_done += 1
+                self._completed.append(time.monotonic())
+            else:
+                self._pages_failed += 1
+            self._cond.notify_all()
+
+        if task.future.cancelled():
+            return
+        if error is None:
+            task.future.set_result(task.sidecar)
+        else:
+            task.future.set_exception(error)
+
+    def ocr_pages(
+        self,
+        input_pdf: str,
+        output_pdf: Optional[str],
+        pages: Dict[int, str],
+        language: str = "eng+spa",
+        namespace: str = "",
+    ) -> Dict[int, str]:
+        """
+        OCR some pages of a PDF through the shared pool.
+
+        Each page is split into its own PDF and queued. The recognized text of every
+        page is returned; if `output_pdf` is given, the OCRed pages also replace the
+        original ones in a searchable PDF. Blocks until every page is done.
+
+        Args:
+            input_pdf (str): The path to the input PDF file.
+            output_pdf (Optional[str]): The path to the searchable PDF (may be the input), or None to skip it.
+            pages (Dict[int, str]): The 0-based pages to OCR and the ocrmypdf mode of each.
+            language (str): The language(s) to use for OCR.
+            namespace (str): The namespace the file belongs to, used for fair scheduling.
+
+        Returns:
+            Dict[int, str]: The recognized text of each OCRed page.
+
+        Raises:
+            Exception: The error of the first page that failed.
+        """
+        anchor = Path(output_pdf or input_pdf)
+        workdir = anchor.parent / f".{anchor.name}.ocr"
+        workdir.mkdir(parents=True, exist_ok=True)
+        futures: List[Future] = []
+        try:
+            with fitz.open(input_pdf) as pdf:
+                for index, mode in sorted(pages.items()):
+                    page_pdf = workdir / f"page-{index}.pdf"
+                    with fitz.open() as single:
+                        single.insert_pdf(pdf, from_page=index, to_page=index)
+                        single.save(page_pdf)
+                    ocr_pdf = str(workdir / f"ocr-{index}.pdf") if output_pdf else None
+                    sidecar = str(workdir / f"ocr-{index}.txt")
+                    futures.append(self.submit(namespace, str(page_pdf), ocr_pdf, sidecar, language, mode))
+
+            for future in futures:
+                future.result()
+            texts = {
+                index: (workdir / f"ocr-{index}.txt").read_text(encoding="utf-8").strip()
+                for index in sorted(pages)
+            }
+            if output_pdf:
+                merged = workdir / "merged.pdf"
+                with fitz.open(input_pdf) as pdf:
+                    for index in sorted(pages):
+                        with fitz.open(workdir / f"ocr-{index}.pdf") as ocred:
+                            pdf.insert_pdf(ocred, start_at=index)
+                        pdf.delete_page(index + 1)
+                    pdf.save(merged, garbage=3, deflate=True)
+                os.replace(merged, output_pdf)
+            return texts
+        except BaseException:
+            # Queued pages are dropped, but pages already in a worker cannot be stopped:
+            # wait for them so their files are not deleted while being written
+            wait([future for future in futures if not future.cancel()])
+            raise
+        finally:
+            # A cleanup error must not hide the result or the original error
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    def metrics(self) -> Dict[str, Any]:
+        """
+        Return a snapshot of the scheduler state.
+
+        Returns:
+            Dict[str, Any]: Worker count, queue depth, pages in flight, totals and pages/sec
+            over the last minute.
+        """
+        with self._cond:
+            horizon = time.monotonic() - RATE_WINDOW_SECONDS
+            while self._completed and self._completed[0] < horizon:
+                self._completed.popleft()
+            return {
+                "workers": self.workers,
+                "queue_depth": sum(len(tasks) for tasks in self._queues.values()),
+                "namespaces_waiting": len(self._queues),
+                "in_flight": self._in_flight,
+                "pages_processed": self._pages_done,
+                "pages_failed": self._pages_failed,
+                "pages_per_second": round(len(self._completed) / RATE_WINDOW_SECONDS, 3),
+            }
+
+    def shutdown(self) -> None:
+        """Stop the dispatcher and the worker processes."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.info("OCR scheduler stopped")
+
+
+def publish_metrics(redis_conn: Redis, name: str, ttl_seconds: int = 30) -> None:
+    """
+    Publish the scheduler metrics of this process so the API can report them.
+
+    Args:
+        redis_conn (Redis): The Redis connection.
+        name (str): Unique name of this process (e.g. the worker consumer name).
+        ttl_seconds (int): Seconds after which the snapshot expires if not refreshed.
+    """
+    scheduler = OCRScheduler.current()
+    if scheduler is None:
+        return
+    redis_conn.set(f"{METRICS_KEY_PREFIX}:{name}", json.dumps(scheduler.metrics()), ex=ttl_seconds)
+
+
+def collect_metrics(redis_conn: Redis) -> Dict[str, Dict[str, Any]]:
+    """
+    Read the scheduler metrics published by every live process.
+
+    Args:
+        redis_conn (Redis): The Redis connection.
+
+    Returns:
+        Dict[str, Dict[str, Any]]: The latest snapshot of each process, keyed by name.
+    """
+    snapshots = {}
+    for key in redis_conn.scan_iter(match=f"{METRICS_KEY_PREFIX}:*"):
+        value = redis_conn.get(key)
+        if value:
+            key = key.decode() if isinstance(key, bytes) else key
+            snapshots[key[len(METRICS_KEY_PREFIX) + 1:]] = json.loads(value)
+    return snapshots
@@ -0,0 +1,292 @@
+"""
+Pool of long-lived headless LibreOffice listeners for document conversion.
+
+Each worker is an `unoserver` process with its own LibreOffice profile, so
+concurrent conversions neither pay the soffice cold start nor collide on a
+shared user installation.
+"""
+import os
+import time
+import queue
+import atexit
+import shutil
+import socket
+import logging
+import tempfile
+import threading
+import subprocess
+from pathlib import Path
+from typing import List, Optional
+
+
+logger = logging.getLogger(__name__)
+
+try:
+    from unoserver.client import UnoClient
+except ImportError:  # The `unoconvert` command line client is used instead
+    UnoClient = None
+
+
+class OfficeWorker:
+    """
+    A single `unoserver` listener bound to its own ports and profile directory.
+    """
+
+    def __init__(self, index: int, port: int, uno_port: int, profile_root: Path, command: str = "unoserver") -> None:
+        """
+        Initialize the worker.
+
+        Args:
+            index (int): Worker number, used in logs.
+            port (int): XML-RPC port of the unoserver listener.
+            uno_port (int): UNO port of the LibreOffice instance.
+            profile_root (Path): Directory under which the worker's profile is created.
+            command (str): The unoserver executable.
+        """
+        self.index = index
+        self.port = port
+        self.uno_port = uno_port
+        self.profile_dir = profile_root / f"worker-{index}"
+        self.command = command
+        self.conversions = 0
+        self._process: Optional[subprocess.Popen] = None
+
+    def start(self, startup_timeout: float = 60.0) -> None:
+        """
+        Start the listener and wait until it accepts connections.
+
+        Args:
+            startup_timeout (float): Seconds to wait for the listener to come up.
+
+        Raises:
+            RuntimeError: If the listener does not become healthy in time.
+        """
+        self.profile_dir.mkdir(parents=True, exist_ok=True)
+        self._process = subprocess.Popen(
+            [
+                self.command,
+                "--interface", "127.0.0.1",
+                "--port", str(self.port),
+                "--uno-port", str(self.uno_port),
+                "--user-installation", self.profile_dir.as_uri(),
+            ],
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        self.conversions = 0
+
+        deadline = time.monotonic() + startup_timeout
+        while time.monotonic() < deadline:
+            if self.healthy():
+                logger.info(f"LibreOffice worker {self.index} listening on port {self.port}")
+                return
+            if self._process.poll() is not None:
+                break
+            time.sleep(0.5)
+        self.stop()
+        raise RuntimeError(f"LibreOffice worker {self.index} failed to start")
+
+    def stop(self) -> None:
+        """Terminate the listener and its LibreOffice instance."""
+        if self._process and self._process.poll() is None:
+            self._process.terminate()
+            try:
+                self._process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+                self._process.wait()
+        self._process = None
+
+    def restart(self) -> None:
+        """Recycle the listener with a fresh process."""
+        logger.info(f"Recycling LibreOffice worker {self.index} after {self.conversions} conversions")
+        self.stop()
+        self.start()
+
+    def healthy(self) -> bool:
+        """Check that the process is alive and the listener accepts connections."""
+        if self._process is None or self._process.poll() is not None:
+            return False
+        try:
+            with socket.create_connection(("127.0.0.1", self.port), timeout=1):
+                return True
+        except OSError:
+            return False
+
+    def convert(self, input_file: str, output_pdf: str, timeout: float) -> None:
+        """
+        Convert a document to PDF through this listener.
+
+        Args:
+            input_file (str): The path to the input document.
+            output_pdf (str): The path to the output PDF.
+            timeout (float): Seconds before the conversion is abandoned.
+
+        Raises:
+            TimeoutError: If the conversion takes longer than `timeout`; the listener is stopped.
+        """
+        if UnoClient is not None:
+            # The XML-RPC call has no timeout of its own, so it runs in a thread the caller stops waiting for
+            client = UnoClient(server="127.0.0.1", port=str(self.port))
+            errors: List[BaseException] = []
+
+            def _convert() -> None:
+                try:
+                    client.convert(inpath=input_file, outpath=output_pdf, convert_to="pdf")
+                except BaseException as e:
+                    errors.append(e)
+
+            thread = threading.Thread(target=_convert, name=f"office-worker-{self.index}", daemon=True)
+            thread.start()
+            thread.join(timeout)
+            if thread.is_alive():
+                # Stopping LibreOffice makes the pending call fail and ends the thread
+                self.stop()
+                raise TimeoutError(f"LibreOffice worker {self.index} did not convert '{input_file}' in {timeout}s")
+            if errors:
+                raise errors[0]
+        else:
+            subprocess.run(
+                [
+                    "unoconvert",
+                    "--host", "127.0.0.1",
+                    "--port", str(self.port),
+                    "--convert-to", "pdf",
+                    input_file,
+                    output_pdf,
+                ],
+                check=True,
+                capture_output=True,
+                text=True,
+                timeout=timeout,
+            )
+        self.conversions += 1
+
+
+class OfficeWorkerPool:
+    """
+    Process-wide pool of LibreOffice workers with a wait queue.
+
+    Callers block (up to `queue_timeout`) until a worker is free, so the number
+    of concurrent conversions never exceeds the pool size.
+    """
+
+    _instance: Optional["OfficeWorkerPool"] = None
+    _instance_lock = threading.Lock()
+
+    def __init__(
+        self,
+        size: int,
+        base_port: int = 2003,
+        max_conversions: int = 200,
+        queue_timeout: float = 300.0,
+        command: str = "unoserver",
+    ) -> None:
+        """
+        Initialize and start the pool.
+
+        Args:
+            size (int): Number of LibreOffice workers.
+            base_port (int): First port used; each worker takes two consecutive ports.
+            max_conversions (int): Conversions after which a worker is recycled.
+            queue_timeout (float): Seconds a caller waits for a free worker.
+            command (str): The unoserver executable.
+        """
+        self.max_conversions = max_conversions
+        self.queue_timeout = queue_timeout
+        self._profile_root = Path(tempfile.mkdtemp(prefix="zolkin-office-"))
+        self._idle: "queue.Queue[OfficeWorker]" = queue.Queue()
+        self._workers: List[OfficeWorker] = []
+
+        for i in range(size):
+            worker = OfficeWorker(
+                index=i,
+                port=base_port + 2 * i,
+                uno_port=base_port + 2 * i + 1,
+                profile_root=self._profile_root,
+                command=command,
+            )
+            worker.start()
+            self._workers.append(worker)
+            self._idle.put(worker)
+        logger.info(f"LibreOffice pool started with {size} workers")
+
+    @classmethod
+    def get_pool(cls) -> Optional["OfficeWorkerPool"]:
+        """
+        Return the process-wide pool, starting it on first use.
+
+        The pool is enabled with OFFICE_POOL_SIZE > 0 and requires the unoserver
+        executable; otherwise None is returned and callers fall back to soffice.
+
+        Returns:
+            Optional[OfficeWorkerPool]: The pool, or None if disabled or unavailable.
+        """
+        size = int(os.getenv("OFFICE_POOL_SIZE", "0"))
+        command = os.getenv("OFFICE_POOL_COMMAND", "unoserver")
+        if size <= 0 or shutil.which(command) is None:
+            return None
+
+        if cls._instance is None:
+            with cls._instance_lock:
+                if cls._instance is None:
+                    try:
+                        cls._instance = cls(
+                            size=size,
+                            base_port=int(os.getenv("OFFICE_POOL_BASE_PORT", "2003")),
+                            max_conversions=int(os.getenv("OFFICE_POOL_MAX_CONVERSIONS", "200")),
+                            command=command,
+                        )
+                        atexit.register(cls._instance.shutdown)
+                    except Exception as e:
+                        logger.error(f"Could not start LibreOffice pool, falling back to soffice: {e}")
+                        return None
+        return cls._instance
+
+    def convert(self, input_file: str, output_pdf: str, timeout: float) -> None:
+        """
+        Convert a document to PDF on the next free worker.
+
+        Args:
+            input_file (str): The path to the input document.
+            output_pdf (str): The path to the output PDF.
+            timeout (float): Seconds before the conversion is abandoned.
+
+        Raises:
+            TimeoutError: If no worker becomes free within `queue_timeout`.
+        """
+        try:
+            worker = self._idle.get(timeout=self.queue_timeout)
+        except queue.Empty as e:
+            raise TimeoutError("No LibreOffice worker available") from e
+
+        try:
+            try:
+                if not worker.healthy():
+                    logger.warning(f"LibreOffice worker {worker.index} unhealthy, restarting")
+                    worker.restart()
+                worker.convert(input_file, output_pdf, timeout)
+            except Exception:
+                # A failed conversion may leave LibreOffice in a bad state
+                self._restart(worker)
+                raise
+            if worker.conversions >= self.max_conversions:
+                self._restart(worker)
+        finally:
+            # Always returned, even if it could not be restarted: the next caller retries the restart
+            self._idle.put(worker)
+
+    @staticmethod
+    def _restart(worker: OfficeWorker) -> None:
+        """Recycle a worker, logging instead of raising so the caller's own error is kept."""
+        try:
+            worker.restart()
+        except Exception as e:
+            logger.error(f"Could not restart LibreOffice worker {worker.index}: {e}")
+
+    def shutdown(self) -> None:
+        """Stop every worker and remove their profiles."""
+        for worker in self._workers:
+            worker.stop()
+        shutil.rmtree(self._profile_root, ignore_errors=True)
+        logger.info("LibreOffice pool stopped")
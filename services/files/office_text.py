@@ -0,0 +1,281 @@
+"""
+Native text extraction from OOXML office documents (DOCX and PPTX).
+
+Office documents are born-digital, so their text, tables and speaker notes are
+read straight from the zip package instead of converting them to PDF and OCRing
+the result. Zip members are parsed incrementally with `iterparse`.
+"""
+import os
+import re
+import logging
+import zipfile
+import posixpath
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import IO, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+
+logger = logging.getLogger(__name__)
+
+# Sections longer than this many characters are split into several Documents
+SECTION_MAX_CHARS = int(os.getenv("OFFICE_SECTION_MAX_CHARS", "4000"))
+
+_W = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+_A = "{http://schemas.openxmlformats.org/drawingml/2006/main}"
+_P = "{http://schemas.openxmlformats.org/presentationml/2006/main}"
+_R = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+_REL = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+_DC = "{http://purl.org/dc/elements/1.1/}"
+
+# Paragraph styles that start a new section in a DOCX (English and Spanish style ids)
+_HEADING_STYLE = re.compile(r"^(heading|t[ií]tulo|title)\s*[12]?$", re.IGNORECASE)
+
+
+def _author(package: zipfile.ZipFile) -> str:
+    """Return the creator recorded in the package core properties."""
+    try:
+        with package.open("docProps/core.xml") as core:
+            for _, elem in ET.iterparse(core):
+                if elem.tag == f"{_DC}creator":
+                    return (elem.text or "").strip()
+    except (KeyError, ET.ParseError):
+        pass
+    return ""
+
+
+def _read_blocks(stream: IO[bytes], ns: str) -> List[Tuple[str, bool]]:
+    """
+    Read the paragraphs and tables of an OOXML part in document order.
+
+    WordprocessingML and DrawingML share the same paragraph/table layout
+    (p, tbl, tr, tc and t elements), only the namespace changes. Tables are
+    flattened into one block with a row per line and " | " between cells.
+
+    Args:
+        stream (IO[bytes]): The XML part.
+        ns (str): The namespace of the paragraph and table elements.
+
+    Returns:
+        List[Tuple[str, bool]]: Each text block and whether it is a heading.
+    """
+    blocks: List[Tuple[str, bool]] = []
+    tables: List[List[str]] = []
+    rows: List[List[str]] = []
+    cells: List[List[str]] = []
+
+    for event, elem in ET.iterparse(stream, events=("start", "end")):
+        tag = elem.tag
+        if event == "start":
+            if tag == f"{ns}tbl":
+                tables.append([])
+            elif tag == f"{ns}tr":
+                rows.append([])
+            elif tag == f"{ns}tc":
+                cells.append([])
+            continue
+
+        if tag == f"{ns}p":
+            text = _paragraph_text(elem, ns)
+            if cells:
+                cells[-1].append(text)
+            elif text.strip():
+                blocks.append((text, _is_heading(elem)))
+            elem.clear()
+        elif tag == f"{ns}tc" and cells:
+            cell = " ".join(t.strip() for t in cells.pop() if t.strip())
+            if rows:
+                rows[-1].append(cell)
+        elif tag == f"{ns}tr" and rows:
+            row = rows.pop()
+            if tables and any(row):
+                tables[-1].append(" | ".join(row))
+        elif tag == f"{ns}tbl" and tables:
+            table = "\n".join(tables.pop())
+            if cells:
+                # Nested table: keep it inside the enclosing cell
+                cells[-1].append(table)
+            elif table:
+                blocks.append((table, False))
+            elem.clear()
+    return blocks
+
+
+def _paragraph_text(paragraph: ET.Element, ns: str) -> str:
+    """Join the text runs of a paragraph, keeping tabs and line breaks."""
+    parts = []
+    for node in paragraph.iter():
+        if node.tag == f"{ns}t":
+            parts.append(node.text or "")
+        elif node.tag == f"{ns}tab" and ns == _W:
+            parts.append("\t")
+        elif node.tag in (f"{ns}br", f"{ns}cr"):
+            parts.append("\n")
+    return "".join(parts)
+
+
+def _is_heading(paragraph: ET.Element) -> bool:
+    """Whether a DOCX paragraph uses a level 1-2 heading style or outline level."""
+    properties = paragraph.find(f"{_W}pPr")
+    if properties is None:
+        return False
+    style = properties.find(f"{_W}pStyle")
+    if style is not None and _HEADING_STYLE.match(style.get(f"{_W}val", "")):
+        return True
+    outline = properties.find(f"{_W}outlineLvl")
+    return outline is not None and outline.get(f"{_W}val") in ("0", "1")
+
+
+def _split(text: str, max_chars: int) -> List[str]:
+    """Split a long section at paragraph boundaries into parts of at most max_chars."""
+    if len(text) <= max_chars:
+        return [text]
+    parts, current = [], ""
+    for paragraph in text.split("\n\n"):
+        if current and len(current) + len(paragraph) + 2 > max_chars:
+            parts.append(current)
+            current = paragraph
+        else:
+            current = f"{current}\n\n{paragraph}" if current else paragraph
+    if current:
+        parts.append(current)
+    return parts
+
+
+def _relationships(package: zipfile.ZipFile, part: str) -> List[ET.Element]:
+    """Return the relationships of a package part."""
+    folder, name = posixpath.split(part)
+    try:
+        with package.open(posixpath.join(folder, "_rels", f"{name}.rels")) as rels:
+            return list(ET.parse(rels).getroot().iter(f"{_REL}Relationship"))
+    except KeyError:
+        return []
+
+
+def _resolve(part: str, target: str) -> str:
+    """Resolve a relationship target relative to the part that declares it."""
+    if target.startswith("/"):
+        return target.lstrip("/")
+    return posixpath.normpath(posixpath.join(posixpath.dirname(part), target))
+
+
+class OfficeTextExtractor:
+    """
+    Extracts the text of DOCX and PPTX files as Documents.
+
+    DOCX files produce one Document per section (a new section starts at each
+    level 1-2 heading) and PPTX files one Document per slide, including tables and
+    speaker notes. The metadata matches `OCRProcessor.load_pdf`, with "page" being
+    the section or slide index.
+    """
+
+    EXTENSIONS = {".docx", ".pptx"}
+
+    @classmethod
+    def supports(cls, file_path: str) -> bool:
+        """Whether the file is an OOXML document this extractor can read."""
+        return Path(file_path).suffix.lower() in cls.EXTENSIONS and zipfile.is_zipfile(file_path)
+
+    @classmethod
+    def extract(cls, file_path: str, namespace: str, source: Optional[str] = None) -> List[Document]:
+        """
+        Extract the text of a DOCX or PPTX file.
+
+        Args:
+            file_path (str): The path to the document.
+            namespace (str): The namespace to use for the extracted text.
+            source (Optional[str]): The source name of the document. Defaults to the file stem with ".pdf",
+                matching the name its preview PDF gets.
+
+        Returns:
+            List[Document]: The extracted sections or slides, or an empty list on error.
+        """
+        source = source or f"{Path(file_path).stem}.pdf"
+        try:
+            with zipfile.ZipFile(file_path) as package:
+                author = _author(package)
+                if Path(file_path).suffix.lower() == ".pptx":
+                    sections = cls._pptx_slides(package)
+                else:
+                    sections = cls._docx_sections(package)
+        except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+            logger.error(f"Error reading office document '{file_path}': {e}")
+            return []
+
+        documents = [
+            Document(
+                page_content=text,
+                metadata={
+                    "namespace": namespace,
+                    "source": source,
+                    "page": page,
+                    "author": author,
+                },
+            )
+            for page, text in sections
+        ]
+        logger.info(f"Extracted {len(documents)} sections from '{file_path}' without conversion")
+        return documents
+
+    @staticmethod
+    def _docx_sections(package: zipfile.ZipFile) -> List[Tuple[int, str]]:
+        """Split the document body into sections at each level 1-2 heading."""
+        with package.open("word/document.xml") as body:
+            blocks = _read_blocks(body, _W)
+
+        sections: List[List[str]] = [[]]
+        for text, heading in blocks:
+            if heading and sections[-1]:
+                sections.append([])
+            sections[-1].append(text)
+
+        parts = [part for section in sections if section for part in _split("\n\n".join(section), SECTION_MAX_CHARS)]
+        return list(enumerate(parts))
+
+    @staticmethod
+    def _pptx_slides(package: zipfile.ZipFile) -> List[Tuple[int, str]]:
+        """Extract the text, tables and notes of every slide, in presentation order."""
+        presentation = "ppt/presentation.xml"
+        targets = {
+            rel.get("Id"): _resolve(presentation, rel.get("Target", ""))
+            for rel in _relationships(package, presentation)
+        }
+        with package.open(presentation) as pres:
+            slide_ids = ET.parse(pres).getroot().iter(f"{_P}sldId")
+            slides = [targets[s.get(f"{_R}id")] for s in slide_ids if s.get(f"{_R}id") in targets]
+
+        result = []
+        for index, slide in enumerate(slides):
+            with package.open(slide) as part:
+                text = "\n".join(block for block, _ in _read_blocks(part, _A))
+
+            notes = ""
+            for rel in _relationships(package, slide):
+                if rel.get("Type", "").endswith("/notesSlide"):
+                    notes = OfficeTextExtractor._notes_text(package, _resolve(slide, rel.get("Target", "")))
+            if notes:
+                text = f"{text}\n\nNotes:\n{notes}" if text else f"Notes:\n{notes}"
+
+            if text.strip():
+                result.append((index, text))
+        return result
+
+    @staticmethod
+    def _notes_text(package: zipfile.ZipFile, part: str) -> str:
+        """Return the speaker notes of a slide, without the slide image and number placeholders."""
+        try:
+            with package.open(part) as notes:
+                root = ET.parse(notes).getroot()
+        except KeyError:
+            return ""
+        lines = []
+        for shape in root.iter(f"{_P}sp"):
+            placeholder = shape.find(f"{_P}nvSpPr/{_P}nvPr/{_P}ph")
+            if placeholder is not None and placeholder.get("type") not in (None, "body"):
+                continue
+            for paragraph in shape.iter(f"{_A}p"):
+                text = _paragraph_text(paragraph, _A)
+                if text.strip():
+                    lines.append(text)
+        return "\n".join(lines)
@@ -0,0 +1,944 @@
+"""
+Ingestion pipeline: converts an uploaded file, applies OCR, extracts its pages
+and indexes them in Milvus. Images and DOCX/PPTX files skip the PDF conversion.
+"""
+import os
+import time
+import asyncio
+import logging
+import queue
+import threading
+import mimetypes
+from pathlib import Path
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+from langchain_core.documents import Document
+
+from .ocr import OCRProcessor
+from .dedup import NearDuplicateFilter
+from .language import get_user_language
+from .metrics import observe_file, observe_stage
+from .office_text import OfficeTextExtractor
+from .streaming import StreamingIndexer, iter_chunks
+from .content_store import ContentStore
+from .storage import StorageManager
+from .summaries import SUMMARIES, PartSampler, get_summarizer
+from .extraction_cache import get_extraction_cache
+from .file_manager import manage_files, manage_files_async
+from ..connections import get_milvus_conn, get_redis_conn
+
+
+logger = logging.getLogger(__name__)
+
+# Ordered stages reported while a file is being ingested
+STAGES = ["link", "convert", "ocr", "extract", "dedup", "index", "summarize"]
+
+StageCallback = Callable[[str, str, Dict[str, Any]], None]
+FileCallback = Callable[[str, Dict[str, Any]], None]
+
+# Files of a batch converted, OCRed and extracted at the same time
+BATCH_CONCURRENCY = int(os.getenv("INGEST_BATCH_CONCURRENCY", "4"))
+
+_BATCH_DONE = object()
+
+
+class IngestionError(Exception):
+    """Raised when a stage of the ingestion pipeline fails."""
+
+    def __init__(self, stage: str, message: str) -> None:
+        super().__init__(message)
+        self.stage = stage
+
+
+class _StageTracker:
+    """
+    Times each stage, forwards its progress to an optional callback and records
+    it in the Prometheus metrics once it finishes.
+    """
+
+    def __init__(self, on_stage: Optional[StageCallback]) -> None:
+        self.on_stage = on_stage
+        self.stages: Dict[str, Dict[str, Any]] = {}
+        self._created = time.perf_counter()
+        self._started: Dict[str, float] = {}
+
+    def start(self, stage: str) -> None:
+        self._started[stage] = time.perf_counter()
+        self.stages[stage] = {"status": "running"}
+        if self.on_stage:
+            self.on_stage(stage, "running", self.stages[stage])
+
+    def progress(self, stage: str, **info: Any) -> None:
+        self.stages[stage] = {"status": "running", **info}
+        if self.on_stage:
+            self.on_stage(stage, "running", self.stages[stage])
+
+    def finish(self, stage: str, status: str = "done", **info: Any) -> None:
+        elapsed = time.perf_counter() - self._started.get(stage, time.perf_counter())
+        self.stages[stage] = {"status": status, "seconds": round(elapsed, 3), **info}
+        observe_stage(stage, status, self.stages[stage])
+        # A failed file has exactly one failed stage; later stages are closed as skipped
+        if status == "failed":
+            observe_file("failed")
+        if self.on_stage:
+            self.on_stage(stage, status, self.stages[stage])
+
+    def timings(self) -> Dict[str, float]:
+        """Return the seconds spent in each finished stage and since the file was received."""
+        timings = {stage: info["seconds"] for stage, info in self.stages.items() if "seconds" in info}
+        timings["total"] = round(time.perf_counter() - self._created, 3)
+        return timings
+
+
+def _file_size(path: str) -> int:
+    """Return the size of a file in bytes, or 0 if it cannot be read."""
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def _content_store() -> Optional[ContentStore]:
+    """Return the content-addressed store, or None if disabled or unreachable."""
+    if os.getenv("INGEST_CONTENT_DEDUP", "true").lower() != "true":
+        return None
+    try:
+        redis_conn = get_redis_conn()
+        return ContentStore(redis_conn, cache=get_extraction_cache(redis_conn))
+    except Exception as e:
+        logger.warning(f"Content store unavailable: {e}")
+        return None
+
+
+def _reuse_content(
+    tracker: _StageTracker,
+    store: Optional[ContentStore],
+    namespace: str,
+    source: str,
+    sha256: Optional[str],
+    language: Optional[str] = None,
+) -> Tuple[Optional[Dict[str, Any]], List[Document]]:
+    """
+    Reuse the work already done for an identical file.
+
+    If the namespace already indexed the same content, its vectors are linked under
+    the new source name. Otherwise the pages extracted for another namespace with
+    the same settings and OCR language are returned from the extraction cache, so
+    conversion, OCR and extraction can be skipped.
+
+    Returns:
+        Tuple[Optional[Dict[str, Any]], List[Document]]: The final result if the file was
+        linked, and the cached pages if any.
+    """
+    if store is None or not sha256:
+        return None, []
+
+    tracker.start("link")
+    try:
+        entry = store.lookup(namespace, sha256)
+        if entry:
+            milvus_conn = get_milvus_conn()
+            if source == entry["source"] or source in entry.get("aliases", []):
+                # Same content under a known name: nothing to do if its rows still exist
+                rows = entry.get("pages", 0) if milvus_conn.has_source(namespace, source) else 0
+            else:
+                milvus_storage = milvus_conn.use_collection()
+                if not milvus_storage:
+                    raise ValueError("Could not connect to Milvus")
+                rows = milvus_conn.copy_source(milvus_storage, namespace, entry["source"], source)
+            if rows:
+                store.register(namespace, sha256, source, entry.get("pages", rows))
+                tracker.finish("link", linked_from=entry["source"], rows=rows)
+                observe_file("linked")
+                logger.info(f"Identical content already indexed as '{entry['source']}', linked as '{source}'")
+                return {
+                    "pdf_file": source,
+                    "linked_from": entry["source"],
+                    "dedup": {"pages": rows, "duplicates": 0, "embeddings_saved": rows, "rows_saved": 0},
+                    "stages": tracker.stages,
+                    "timings": tracker.timings(),
+                }, []
+
+        docs = store.cached_pages(sha256, namespace, source, language)
+        tracker.finish("link", status="skipped", cached_pages=len(docs))
+        return None, docs
+    except Exception as e:
+        logger.warning(f"Content reuse skipped after error: {e}")
+        tracker.finish("link", status="skipped")
+        return None, []
+
+
+def _ocr_language(namespace: str, language: Optional[str]) -> Optional[str]:
+    """Return the OCR language requested for the upload, else the one pinned by the user, else None (detect)."""
+    if language:
+        return language
+    try:
+        return get_user_language(get_redis_conn(), namespace)
+    except Exception as e:
+        logger.warning(f"Could not read the OCR language of '{namespace}': {e}")
+        return None
+
+
+def _extract_pdf(
+    tracker: _StageTracker,
+    namespace: str,
+    pdf_file: str,
+    language: Optional[str] = None,
+) -> Iterator[Document]:
+    """
+    Apply OCR to the converted PDF and return its pages as they are extracted.
+
+    The text of OCRed pages comes straight from the OCR run; the searchable PDF is
+    only written back with OCR_SEARCHABLE_PDF=true.
+
+    Raises:
+        IngestionError: If OCR fails, or while iterating if no page can be extracted.
+    """
+    # Apply OCR
+    tracker.start("ocr")
+    bytes_in = _file_size(pdf_file)
+    pages, ocr_report = OCRProcessor.ocr_pdf_pages(pdf_file, namespace=namespace, language=language)
+    if pages is None:
+        tracker.finish("ocr", status="failed", bytes_in=bytes_in, **ocr_report)
+        raise IngestionError("ocr", "Error applying OCR to the PDF")
+    bytes_out = _file_size(pdf_file) if ocr_report.get("searchable_pdf") else 0
+    tracker.finish("ocr", bytes_in=bytes_in, bytes_out=bytes_out, **ocr_report)
+
+    # Extract the pages lazily; they are indexed while the rest are read
+    tracker.start("extract")
+    return _track_extraction(tracker, pages)
+
+
+def _track_extraction(tracker: _StageTracker, pages: Iterator[Document]) -> Iterator[Document]:
+    """Count the extracted pages and text bytes and close the extract stage once the stream ends."""
+    count = 0
+    bytes_out = 0
+    try:
+        for page in pages:
+            count += 1
+            bytes_out += len(page.page_content.encode("utf-8"))
+            yield page
+    except Exception as e:
+        tracker.finish("extract", status="failed", pages=count, bytes_out=bytes_out)
+        raise IngestionError("extract", f"Error loading the PDF content: {e}") from e
+    if not count:
+        tracker.finish("extract", status="failed")
+        raise IngestionError("extract", "Error loading the PDF content")
+    tracker.finish("extract", pages=count, bytes_out=bytes_out)
+
+
+def _is_image(file_path: str) -> bool:
+    """Whether the file is an image, judging by its extension."""
+    mime_type, _ = mimetypes.guess_type(file_path)
+    return bool(mime_type and mime_type.startswith("image"))
+
+
+def _is_direct_image(file_path: str) -> bool:
+    """Whether the file is an image that should be OCRed without a PDF round trip."""
+    if os.getenv("OCR_IMAGE_DIRECT", "true").lower() != "true":
+        return False
+    return _is_image(file_path)
+
+
+def _extract_image(
+    tracker: _StageTracker,
+    namespace: str,
+    file_path: str,
+    source: str,
+    language: Optional[str] = None,
+) -> List[Document]:
+    """
+    OCR an image directly with tesseract.
+
+    Raises:
+        IngestionError: If OCR fails or yields no document.
+    """
+    tracker.start("ocr")
+    file_content = OCRProcessor.ocr_image(file_path, namespace=namespace, language=language, source=source)
+    if not file_content:
+        tracker.finish("ocr", status="failed")
+        raise IngestionError("ocr", "Error applying OCR to the image")
+    tracker.finish(
+        "ocr",
+        pages=1,
+        ocr_pages=1,
+        skipped_pages=0,
+        mode="image",
+        bytes_in=_file_size(file_path),
+        bytes_out=len(file_content[0].page_content.encode("utf-8")),
+    )
+    return file_content
+
+
+def _is_native_office(file_path: str) -> bool:
+    """Whether the file is a DOCX/PPTX whose text can be read without conversion."""
+    if os.getenv("OFFICE_NATIVE_EXTRACT", "true").lower() != "true":
+        return False
+    return OfficeTextExtractor.supports(file_path)
+
+
+def _extract_office(tracker: _StageTracker, namespace: str, file_path: str, source: str) -> List[Document]:
+    """
+    Read the text of a DOCX/PPTX straight from its package.
+
+    An empty result (e.g. a deck made only of pictures) is reported as skipped so
+    the caller falls back to conversion and OCR.
+    """
+    tracker.start("extract")
+    file_content = OfficeTextExtractor.extract(file_path, namespace=namespace, source=source)
+    if not file_content:
+        tracker.finish("extract", status="skipped", mode="native")
+        return []
+    tracker.finish(
+        "extract",
+        pages=len(file_content),
+        mode="native",
+        bytes_in=_file_size(file_path),
+        bytes_out=sum(len(doc.page_content.encode("utf-8")) for doc in file_content),
+    )
+    return file_content
+
+
+def _archive_pdf_in_background(file_path: str, pdfs_dir: str) -> Optional["Future[Optional[str]]"]:
+    """
+    Convert an image to its archival PDF off the critical path.
+
+    Returns:
+        Optional[Future[Optional[str]]]: Resolves to the PDF path (None if the conversion
+        failed), or None if archival PDFs are disabled.
+    """
+    if os.getenv("INGEST_IMAGE_ARCHIVE_PDF", "true").lower() != "true":
+        return None
+    archive: "Future[Optional[str]]" = Future()
+
+    def _convert() -> None:
+        try:
+            archive.set_result(manage_files(file_path, pdfs_dir))
+        except Exception as e:
+            archive.set_exception(e)
+
+    threading.Thread(target=_convert, daemon=True).start()
+    return archive
+
+
+def _extract_without_pdf(
+    tracker: _StageTracker,
+    namespace: str,
+    file_path: str,
+    pdfs_dir: str,
+    source: str,
+    language: Optional[str] = None,
+) -> Tuple[List[Document], Optional["Future[Optional[str]]"]]:
+    """
+    Extract the pages of files that skip the PDF conversion.
+
+    Images are OCRed directly while their archival PDF is generated in the
+    background; the text of DOCX/PPTX files is read natively and their preview
+    PDF is only generated on demand.
+
+    Returns:
+        Tuple[List[Document], Optional[Future[Optional[str]]]]: The pages (empty if the
+        file must be converted) and the pending archival PDF of an image.
+    """
+    if _is_direct_image(file_path):
+        file_content = _extract_image(tracker, namespace, file_path, source, language)
+        return file_content, _archive_pdf_in_background(file_path, pdfs_dir)
+    if _is_native_office(file_path):
+        return _extract_office(tracker, namespace, file_path, source), None
+    return [], None
+
+
+def _check_converted(tracker: _StageTracker, file_path: str, pdf_file: Optional[str]) -> str:
+    """
+    Close the convert stage.
+
+    Raises:
+        IngestionError: If the file could not be converted to PDF.
+    """
+    if not pdf_file:
+        tracker.finish("convert", status="failed", bytes_in=_file_size(file_path))
+        raise IngestionError("convert", "Error processing the file to PDF")
+    tracker.finish("convert", bytes_in=_file_size(file_path), bytes_out=_file_size(pdf_file))
+    return pdf_file
+
+
+def _extract_converted(
+    tracker: _StageTracker,
+    namespace: str,
+    file_path: str,
+    pdf_file: str,
+    language: Optional[str] = None,
+) -> Iterable[Document]:
+    """
+    Extract the pages of a file converted to PDF.
+
+    An image is OCRed from its normalized version, not from the PDF: the PDF wraps
+    the original image and is only kept as its archival copy.
+    """
+    if _is_image(file_path):
+        return _extract_image(tracker, namespace, file_path, Path(pdf_file).name, language)
+    return _extract_pdf(tracker, namespace, pdf_file, language)
+
+
+class _FileStream:
+    """
+    Per-file state while its pages stream into the index: the shared page cache,
+    the near-duplicate filter and the final bookkeeping once its rows are inserted.
+    """
+
+    def __init__(
+        self,
+        tracker: _StageTracker,
+        store: Optional[ContentStore],
+        namespace: str,
+        source: str,
+        pages: Iterable[Document],
+        sha256: Optional[str],
+        language: Optional[str] = None,
+    ) -> None:
+        self.tracker = tracker
+        self.store = store
+        self.namespace = namespace
+        self.source = source
+        self.sha256 = sha256
+        self.page_count = 0
+        self.page_cache = store.page_writer(sha256, language) if store is not None and sha256 else None
+        self.dedup_filter: Optional[NearDuplicateFilter] = None
+        self.dedup_stats = {"pages": 0, "duplicates": 0, "embeddings_saved": 0, "rows_saved": 0}
+        self.kept_signatures: Dict[str, str] = {}
+        # Parts sampled for the summary, unless the content already has one
+        self.summary_parts: Optional[PartSampler] = None
+        if SUMMARIES and store is not None and sha256:
+            try:
+                if store.summary(sha256) is None:
+                    self.summary_parts = PartSampler()
+            except Exception as e:
+                logger.warning(f"Could not read the summary of '{source}': {e}")
+        self.pages: Iterable[Document] = self._cached(pages)
+
+        # Skip near-duplicate pages within the namespace before embedding them
+        tracker.start("dedup")
+        if os.getenv("INGEST_DEDUP", "true").lower() == "true":
+            try:
+                self.dedup_filter = NearDuplicateFilter(
+                    get_redis_conn(),
+                    max_distance=int(os.getenv("INGEST_DEDUP_MAX_DISTANCE", "3")),
+                    source_exists=get_milvus_conn().has_source,
+                )
+                self.pages = self.dedup_filter.iter_filter(
+                    self.pages, namespace, source, self.dedup_stats, self.kept_signatures
+                )
+            except Exception as e:
+                logger.warning(f"Dedup skipped after error: {e}")
+                self.dedup_filter = None
+
+    def _cached(self, pages: Iterable[Document]) -> Iterator[Document]:
+        for page in pages:
+            self.page_count += 1
+            if self.page_cache is not None:
+                self.page_cache.add(page)
+            if self.summary_parts is not None:
+                self.summary_parts.add(page.page_content)
+            yield page
+
+    def abort(self, status: str) -> None:
+        """Close the dedup and index stages after a failure."""
+        self.tracker.finish("dedup", status="skipped" if status == "skipped" else "done", **self.dedup_stats)
+        self.tracker.finish("index", status=status)
+
+    def complete(self, rows: int, **index_info: Any) -> Dict[str, Any]:
+        """Record the inserted file and return its result."""
+        self.tracker.finish("dedup", **self.dedup_stats)
+        self.tracker.finish("index", rows=rows, **index_info)
+        observe_file("done")
+
+        if self.dedup_filter:
+            try:
+                self.dedup_filter.remember_signatures(self.kept_signatures, self.namespace, self.source)
+            except Exception as e:
+                logger.warning(f"Could not store dedup signatures: {e}")
+
+        if self.store is not None and self.sha256:
+            try:
+                if self.page_cache is not None:
+                    self.page_cache.close()
+                self.store.register(self.namespace, self.sha256, self.source, self.page_count)
+            except Exception as e:
+                logger.warning(f"Could not register content hash: {e}")
+
+        return {
+            "pdf_file": self.source,
+            "dedup": self.dedup_stats,
+            "stages": self.tracker.stages,
+            "timings": self.tracker.timings(),
+        }
+
+    def summarize(self) -> None:
+        """
+        Summarize the indexed file with a map-reduce over its pages (INGEST_SUMMARIES=true).
+
+        The file is already searchable, so a failure is only logged and reported as skipped.
+        """
+        if self.summary_parts is None:
+            return
+        parts, self.summary_parts = self.summary_parts.parts(), None
+        self.tracker.start("summarize")
+        try:
+            summary = get_summarizer().summarize(self.source, parts)
+            if summary is None:
+                self.tracker.finish("summarize", status="skipped")
+                return
+            self.store.save_summary(self.sha256, summary)
+            self.tracker.finish("summarize", parts=summary["parts"], keywords=len(summary["keywords"]))
+        except Exception as e:
+            logger.warning(f"Could not summarize '{self.source}': {e}")
+            self.tracker.finish("summarize", status="skipped", error=str(e))
+
+
+def _connect_index() -> Tuple[Any, Any]:
+    """Return the Milvus storage and its connected vector store."""
+    milvus_conn = get_milvus_conn()
+    milvus_storage = milvus_conn.use_collection()
+    if not milvus_storage:
+        raise ValueError("Could not connect to Milvus")
+    return milvus_conn, milvus_storage
+
+
+def _delete_partial_rows(namespace: str, source: str, rows: int) -> None:
+    """
+    Delete the rows a file inserted before it failed, so it is not left half-searchable.
+
+    Nothing is deleted if the file inserted no rows: the rows of a previous upload
+    with the same name are then still complete.
+    """
+    if not rows:
+        return
+    try:
+        get_milvus_conn().delete_source(namespace, source)
+    except Exception as e:
+        logger.warning(f"Could not delete the partial rows of '{source}': {e}")
+
+
+def _index_documents(
+    tracker: _StageTracker,
+    store: Optional[ContentStore],
+    namespace: str,
+    source: str,
+    pages: Iterable[Document],
+    sha256: Optional[str],
+    language: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Dedup the extracted pages, embed them and insert them into Milvus.
+
+    Pages are streamed through dedup, chunking, embedding and insertion in bounded
+    batches, so the stages overlap and each batch is searchable once inserted.
+
+    Raises:
+        IngestionError: If extraction or indexing fails.
+    """
+    file_stream = _FileStream(tracker, store, namespace, source, pages, sha256, language)
+
+    # Embed and insert into Milvus as batches become available
+    tracker.start("index")
+    indexer: Optional[StreamingIndexer] = None
+    try:
+        milvus_conn, milvus_storage = _connect_index()
+
+        def _on_batch(docs: List[Document]) -> None:
+            tracker.progress("index", rows=indexer.rows)
+
+        indexer = StreamingIndexer(milvus_conn, milvus_storage, on_batch=_on_batch)
+        rows = indexer.run(iter_chunks(file_stream.pages))
+    except IngestionError:
+        file_stream.abort("skipped")
+        _delete_partial_rows(namespace, source, indexer.rows if indexer else 0)
+        raise
+    except Exception as e:
+        file_stream.abort("failed")
+        _delete_partial_rows(namespace, source, indexer.rows if indexer else 0)
+        raise IngestionError("index", f"Error updating the Milvus storage: {e}") from e
+    result = file_stream.complete(
+        rows,
+        embed_seconds=round(indexer.embed_seconds, 3),
+        insert_seconds=round(indexer.insert_seconds, 3),
+    )
+    file_stream.summarize()
+    result["timings"] = tracker.timings()
+    return result
+
+
+def _record_storage(
+    namespace: str,
+    sha256: Optional[str],
+    file_path: str,
+    pdfs_dir: str,
+    result: Dict[str, Any],
+    pdf: "Optional[Future[Optional[str]]]" = None,
+) -> None:
+    """
+    Record the files of an ingested document for the storage lifecycle (see `services.files.storage`).
+
+    The PDF is only recorded if it exists: DOCX/PPTX files read natively have none
+    until they are previewed. The archival PDF of an image, still being generated,
+    is recorded once `pdf` resolves.
+    """
+    if not sha256 or os.getenv("STORAGE_LIFECYCLE", "true").lower() != "true":
+        return
+    source = result["pdf_file"]
+
+    def _record(pdf_file: Optional[str]) -> None:
+        try:
+            StorageManager(get_redis_conn()).record(namespace, sha256, source, file_path, pdf_file)
+        except Exception as e:
+            logger.warning(f"Could not record the storage of '{file_path}': {e}")
+
+    def _record_archive(archive: "Future[Optional[str]]") -> None:
+        if archive.exception() is None and archive.result():
+            _record(archive.result())
+
+    pdf_file = Path(pdfs_dir) / source
+    _record(str(pdf_file) if pdf_file.exists() else None)
+    if pdf is not None:
+        pdf.add_done_callback(_record_archive)
+
+
+def _source_name(file_path: str) -> str:
+    """Return the source name the pages of an uploaded file are indexed with."""
+    return f"{Path(file_path).stem}.pdf"
+
+
+def _extract_file(
+    tracker: _StageTracker,
+    namespace: str,
+    file_path: str,
+    pdfs_dir: str,
+    source: str,
+    file_content: Iterable[Document],
+    language: Optional[str] = None,
+) -> Tuple[str, Iterable[Document], Optional["Future[Optional[str]]"]]:
+    """
+    Turn an uploaded file into pages, unless cached pages were already found.
+
+    Images are OCRed directly, DOCX/PPTX files are read natively and everything
+    else is converted to PDF, OCRed and extracted.
+
+    Returns:
+        Tuple[str, Iterable[Document], Optional[Future[Optional[str]]]]: The source name,
+        the pages and the pending archival PDF of an image.
+
+    Raises:
+        IngestionError: If conversion, OCR or extraction fails.
+    """
+    archive = None
+    if not file_content:
+        file_content, archive = _extract_without_pdf(tracker, namespace, file_path, pdfs_dir, source, language)
+
+    if not file_content:
+        tracker.start("convert")
+        logger.info(f"Processing file with FileManager: {file_path}")
+        pdf_file = _check_converted(tracker, file_path, manage_files(file_path, pdfs_dir))
+        return Path(pdf_file).name, _extract_converted(tracker, namespace, file_path, pdf_file, language), None
+
+    return source, file_content, archive
+
+
+def ingest_file(
+    namespace: str,
+    file_path: str,
+    pdfs_dir: str,
+    on_stage: Optional[StageCallback] = None,
+    sha256: Optional[str] = None,
+    language: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Run every ingestion stage for a single uploaded file.
+
+    Args:
+        namespace (str): The namespace (user email) the file belongs to.
+        file_path (str): The path to the uploaded file.
+        pdfs_dir (str): The directory where processed PDFs are stored.
+        on_stage (Optional[StageCallback]): Called with (stage, status, info) on every transition.
+        sha256 (Optional[str]): The hex SHA-256 of the file, used to reuse identical uploads.
+        language (Optional[str]): The OCR language(s) requested for the file. Defaults to the
+            language pinned by the user, else it is detected.
+
+    Returns:
+        Dict[str, Any]: The processed PDF name, dedup statistics, per-stage report and timings.
+
+    Raises:
+        IngestionError: If any stage fails.
+    """
+    tracker = _StageTracker(on_stage)
+    store = _content_store()
+    source = _source_name(file_path)
+
+    language = _ocr_language(namespace, language)
+    linked, file_content = _reuse_content(tracker, store, namespace, source, sha256, language)
+    if linked:
+        _record_storage(namespace, sha256, file_path, pdfs_dir, linked)
+        return linked
+
+    source, file_content, archive = _extract_file(
+        tracker, namespace, file_path, pdfs_dir, source, file_content, language
+    )
+    result = _index_documents(tracker, store, namespace, source, file_content, sha256, language)
+    _record_storage(namespace, sha256, file_path, pdfs_dir, result, archive)
+    return result
+
+
+async def _prepare_file_async(
+    tracker: _StageTracker,
+    store: Optional[ContentStore],
+    namespace: str,
+    file_path: str,
+    pdfs_dir: str,
+    sha256: Optional[str],
+    language: Optional[str] = None,
+) -> Tuple[Optional[Dict[str, Any]], str, Iterable[Document], Optional["Future[Optional[str]]"]]:
+    """
+    Run every stage before indexing: content reuse, conversion, OCR and extraction.
+
+    Awaitable counterpart of `_reuse_content` followed by `_extract_file`.
+    `language` must already be resolved with `_ocr_language`, since it is part of
+    the extraction cache key.
+
+    Returns:
+        Tuple[Optional[Dict[str, Any]], str, Iterable[Document], Optional[Future[Optional[str]]]]:
+        The final result if the file was linked to identical content, the source name,
+        its pages and the pending archival PDF of an image.
+
+    Raises:
+        IngestionError: If any stage fails.
+    """
+    source = _source_name(file_path)
+
+    linked, file_content = await asyncio.to_thread(
+        _reuse_content, tracker, store, namespace, source, sha256, language
+    )
+    if linked:
+        return linked, source, [], None
+
+    archive = None
+    if not file_content:
+        file_content, archive = await asyncio.to_thread(
+            _extract_without_pdf, tracker, namespace, file_path, pdfs_dir, source, language
+        )
+
+    if not file_content:
+        # The conversion runs as asyncio subprocesses instead of blocking a thread
+        tracker.start("convert")
+        logger.info(f"Processing file with FileManager: {file_path}")
+        pdf_file = _check_converted(tracker, file_path, await manage_files_async(file_path, pdfs_dir))
+        file_content = await asyncio.to_thread(_extract_converted, tracker, namespace, file_path, pdf_file, language)
+        return None, Path(pdf_file).name, file_content, None
+
+    return None, source, file_content, archive
+
+
+async def ingest_file_async(
+    namespace: str,
+    file_path: str,
+    pdfs_dir: str,
+    on_stage: Optional[StageCallback] = None,
+    sha256: Optional[str] = None,
+    language: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Awaitable variant of `ingest_file`.
+
+    The conversion runs as asyncio subprocesses and the remaining stages in a
+    worker thread, so several files can be ingested concurrently on one event loop.
+
+    Args:
+        namespace (str): The namespace (user email) the file belongs to.
+        file_path (str): The path to the uploaded file.
+        pdfs_dir (str): The directory where processed PDFs are stored.
+        on_stage (Optional[StageCallback]): Called with (stage, status, info) on every transition.
+        sha256 (Optional[str]): The hex SHA-256 of the file, used to reuse identical uploads.
+        language (Optional[str]): The OCR language(s) requested for the file. Defaults to the
+            language pinned by the user, else it is detected.
+
+    Returns:
+        Dict[str, Any]: The processed PDF name, dedup statistics, per-stage report and timings.
+
+    Raises:
+        IngestionError: If any stage fails.
+    """
+    tracker = _StageTracker(on_stage)
+    store = _content_store()
+
+    language = await asyncio.to_thread(_ocr_language, namespace, language)
+    linked, source, file_content, archive = await _prepare_file_async(
+        tracker, store, namespace, file_path, pdfs_dir, sha256, language
+    )
+    if linked:
+        await asyncio.to_thread(_record_storage, namespace, sha256, file_path, pdfs_dir, linked)
+        return linked
+
+    result = await asyncio.to_thread(
+        _index_documents, tracker, store, namespace, source, file_content, sha256, language
+    )
+    await asyncio.to_thread(_record_storage, namespace, sha256, file_path, pdfs_dir, result, archive)
+    return result
+
+
+async def ingest_batch_async(
+    namespace: str,
+    files: List[Dict[str, Any]],
+    pdfs_dir: str,
+    on_file: Optional[FileCallback] = None,
+    concurrency: int = BATCH_CONCURRENCY,
+    language: Optional[str] = None,
+) -> Dict[str, Any]:
+    """
+    Ingest several files at once, sharing embedding calls and Milvus inserts.
+
+    Up to `concurrency` files are converted, OCRed and extracted in parallel. As each
+    one is ready, its pages join a single stream feeding one `StreamingIndexer`, so
+    embedding batches and inserts span file boundaries. A failure in one file does
+    not stop the others; a failure inserting into Milvus fails the remaining files.
+
+    Args:
+        namespace (str): The namespace (user email) the files belong to.
+        files (List[Dict[str, Any]]): One {"file_path", "filename", "sha256"} entry per file, with an
+            optional "language". Files must have distinct stems, since the stem names the indexed source.
+        pdfs_dir (str): The directory where processed PDFs are stored.
+        on_file (Optional[FileCallback]): Called with (filename, state) whenever a file progresses.
+        concurrency (int): Maximum number of files prepared at once.
+        language (Optional[str]): The OCR language(s) of files that do not request their own.
+
+    Returns:
+        Dict[str, Any]: The state of every file, the aggregated counters and the time spent
+        embedding and inserting the shared batches.
+    """
+    started = time.perf_counter()
+    store = _content_store()
+    results: Dict[str, Dict[str, Any]] = {}
+    ready: "queue.Queue[Any]" = queue.Queue()
+    slots = asyncio.Semaphore(concurrency)
+    streams: Dict[str, Tuple[str, _FileStream]] = {}
+    rows_by_source: Dict[str, int] = {}
+    # Files that failed while streaming; rows of theirs may still be in the indexer's queues
+    failed_sources: Set[str] = set()
+    archives: Dict[str, Optional["Future[Optional[str]]"]] = {}
+
+    def _report(filename: str, state: Dict[str, Any]) -> None:
+        results[filename] = state
+        if on_file:
+            on_file(filename, state)
+
+    async def _prepare(item: Dict[str, Any]) -> None:
+        filename = item["filename"]
+        tracker = _StageTracker(lambda *_: _report(filename, {"status": "running", "stages": tracker.stages}))
+        try:
+            async with slots:
+                file_language = await asyncio.to_thread(_ocr_language, namespace, item.get("language") or language)
+                linked, source, pages, archives[filename] = await _prepare_file_async(
+                    tracker, store, namespace, item["file_path"], pdfs_dir, item.get("sha256"), file_language
+                )
+        except IngestionError as e:
+            logger.error(f"Batch file '{filename}' failed at stage '{e.stage}': {e}")
+            _report(filename, {"status": "failed", "error": str(e), "failed_stage": e.stage, "stages": tracker.stages})
+            return
+        except Exception as e:
+            logger.exception(f"Unexpected error preparing batch file '{filename}': {e}")
+            observe_file("failed")
+            _report(filename, {"status": "failed", "error": str(e), "stages": tracker.stages})
+            return
+
+        if linked:
+            _report(filename, {"status": "done", **linked})
+            return
+        file_stream = await asyncio.to_thread(
+            _FileStream, tracker, store, namespace, source, pages, item.get("sha256"), file_language
+        )
+        ready.put((filename, file_stream))
+
+    def _chunks() -> Iterator[Any]:
+        # Runs in the indexer thread: drains each prepared file in turn
+        while (entry := ready.get()) is not _BATCH_DONE:
+            filename, file_stream = entry
+            streams[file_stream.source] = (filename, file_stream)
+            file_stream.tracker.start("index")
+            try:
+                yield from iter_chunks(file_stream.pages)
+            except Exception as e:
+                stage = e.stage if isinstance(e, IngestionError) else "extract"
+                if not isinstance(e, IngestionError):
+                    observe_file("failed")
+                logger.error(f"Batch file '{filename}' failed at stage '{stage}': {e}")
+                file_stream.abort("skipped")
+                _report(filename, {"status": "failed", "error": str(e), "failed_stage": stage,
+                                   "stages": file_stream.tracker.stages})
+                del streams[file_stream.source]
+                failed_sources.add(file_stream.source)
+
+    def _on_batch(docs: List[Document]) -> None:
+        for doc in docs:
+            source = doc.metadata.get("source", "")
+            rows_by_source[source] = rows_by_source.get(source, 0) + 1
+        for source in {doc.metadata.get("source", "") for doc in docs}:
+            if source in streams:
+                streams[source][1].tracker.progress("index", rows=rows_by_source[source])
+
+    try:
+        milvus_conn, milvus_storage = await asyncio.to_thread(_connect_index)
+    except Exception as e:
+        raise IngestionError("index", f"Error updating the Milvus storage: {e}") from e
+
+    indexer = StreamingIndexer(milvus_conn, milvus_storage, on_batch=_on_batch)
+    indexing = asyncio.create_task(asyncio.to_thread(indexer.run, _chunks()))
+    try:
+        await asyncio.gather(*(_prepare(item) for item in files))
+    finally:
+        ready.put(_BATCH_DONE)
+
+    index_error: Optional[Exception] = None
+    try:
+        await indexing
+    except Exception as e:
+        logger.error(f"Batch indexing failed: {e}")
+        index_error = e
+
+    completed = []
+    for source, (filename, file_stream) in streams.items():
+        if index_error is None:
+            result = await asyncio.to_thread(file_stream.complete, rows_by_source.get(source, 0))
+            completed.append((filename, file_stream, result))
+        else:
+            file_stream.abort("failed")
+            failed_sources.add(source)
+            _report(filename, {"status": "failed", "error": str(index_error), "failed_stage": "index",
+                               "stages": file_stream.tracker.stages})
+    # Only now that the indexer has stopped can no more rows of the failed files arrive
+    for source in failed_sources:
+        await asyncio.to_thread(_delete_partial_rows, namespace, source, rows_by_source.get(source, 0))
+    # The files of the batch are summarized concurrently once all of them are searchable
+    await asyncio.gather(*(asyncio.to_thread(file_stream.summarize) for _, file_stream, _ in completed))
+    for filename, file_stream, result in completed:
+        _report(filename, {"status": "done", **result, "timings": file_stream.tracker.timings()})
+    for item in files:
+        state = results.get(item["filename"], {})
+        if state.get("status") == "done":
+            await asyncio.to_thread(
+                _record_storage, namespace, item.get("sha256"), item["file_path"], pdfs_dir, state,
+                archives.get(item["filename"]),
+            )
+        elif state.get("status") != "failed":
+            _report(item["filename"], {"status": "failed", "error": str(index_error or "Not indexed")})
+
+    done = sum(1 for state in results.values() if state["status"] == "done")
+    return {
+        "files": results,
+        "total": len(files),
+        "done": done,
+        "failed": len(files) - done,
+        "rows": indexer.rows,
+        "timings": {
+            "embed": round(indexer.embed_seconds, 3),
+            "insert": round(indexer.insert_seconds, 3),
+            "total": round(time.perf_counter() - started, 3),
+        },
+    }
@@ -0,0 +1,290 @@
+"""
+Resumable uploads: a file is sent as a series of offset-addressed chunks.
+
+The client creates an upload session with the final size (and optionally the
+SHA-256 of the whole file), then PATCHes chunks, each one starting at the offset
+the server has stored. After a dropped connection it reads the stored offset and
+continues from there instead of starting over. Bytes received before a
+disconnect are kept unless the chunk carried a checksum.
+
+Session state lives in Redis (upload:session:<id>) and the data in a ".part" file
+on disk, so any API process can receive the next chunk.
+"""
+import os
+import time
+import uuid
+import asyncio
+import hashlib
+import logging
+from pathlib import Path
+from typing import Any, AsyncIterator, Dict, Optional, Tuple
+
+from redis import Redis
+
+from .uploads import UPLOAD_CHUNK_SIZE, UploadTooLargeError
+
+
+logger = logging.getLogger(__name__)
+
+SESSION_KEY_PREFIX = "upload:session"
+# Sessions (and their partial files) without a new chunk for this long are dropped
+SESSION_TTL_SECONDS = int(os.getenv("UPLOAD_SESSION_TTL_HOURS", "24")) * 3600
+# Largest chunk accepted in one request
+MAX_CHUNK_BYTES = int(os.getenv("UPLOAD_MAX_CHUNK_MB", "32")) * 1024 * 1024
+# A chunk still being written after this long no longer blocks the session
+LOCK_TTL_SECONDS = 600
+
+
+class UploadOffsetError(Exception):
+    """Raised when a chunk does not start at the stored offset or another chunk is in progress."""
+
+    def __init__(self, message: str, offset: int) -> None:
+        super().__init__(message)
+        self.offset = offset
+
+
+class UploadChecksumError(Exception):
+    """Raised when a chunk or the assembled file does not match its SHA-256."""
+
+
+def _decode(value: Any) -> Any:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _file_sha256(path: Path, chunk_size: int = UPLOAD_CHUNK_SIZE) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(chunk_size):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResumableUploads:
+    """
+    Upload sessions shared by every API process.
+
+    Each session is a Redis hash holding the owner, the target file name, the
+    declared size and SHA-256 and the number of bytes stored so far.
+    """
+
+    def __init__(self, redis_conn: Redis, directory: Path) -> None:
+        """
+        Initialize the store.
+
+        Args:
+            redis_conn (Redis): The Redis connection.
+            directory (Path): Where the partial files are kept.
+        """
+        self.redis = redis_conn
+        self.directory = Path(directory)
+
+    @staticmethod
+    def session_key(upload_id: str) -> str:
+        """Return the Redis key of an upload session."""
+        return f"{SESSION_KEY_PREFIX}:{upload_id}"
+
+    def part_path(self, upload_id: str) -> Path:
+        """Return the path of the partial file of a session."""
+        return self.directory / f"{upload_id}.part"
+
+    def create(
+        self,
+        namespace: str,
+        filename: str,
+        size: int,
+        sha256: Optional[str] = None,
+        **options: Any,
+    ) -> Dict[str, Any]:
+        """
+        Open a new upload session.
+
+        Args:
+            namespace (str): The namespace (user email) uploading the file.
+            filename (str): The sanitized name the file is stored with once complete.
+            size (int): The size of the whole file in bytes.
+            sha256 (Optional[str]): The hex SHA-256 of the whole file, checked once complete.
+            **options: Extra fields kept with the session (e.g. the OCR language).
+
+        Returns:
+            Dict[str, Any]: The session.
+        """
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self._remove_stale_parts()
+
+        upload_id = uuid.uuid4().hex
+        self.part_path(upload_id).touch()
+        session = {
+            "upload_id": upload_id,
+            "namespace": namespace,
+            "filename": filename,
+            "size": size,
+            "sha256": (sha256 or "").lower(),
+            "offset": 0,
+            "created_at": time.time(),
+            **{k: v for k, v in options.items() if v is not None},
+        }
+        key = self.session_key(upload_id)
+        self.redis.hset(key, mapping=session)
+        self.redis.expire(key, SESSION_TTL_SECONDS)
+        logger.info(f"Resumable upload {upload_id} opened for '{filename}' ({size} bytes, {namespace})")
+        return session
+
+    def get(self, upload_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Read an upload session.
+
+        Args:
+            upload_id (str): The upload id.
+
+        Returns:
+            Optional[Dict[str, Any]]: The session, or None if it does not exist or expired.
+        """
+        raw = self.redis.hgetall(self.session_key(upload_id))
+        if not raw:
+            return None
+        session = {_decode(k): _decode(v) for k, v in raw.items()}
+        for field in ("size", "offset"):
+            session[field] = int(session[field])
+        return session
+
+    async def write_chunk(
+        self,
+        upload_id: str,
+        offset: int,
+        chunks: AsyncIterator[bytes],
+        checksum: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Append a chunk to the partial file.
+
+        Args:
+            upload_id (str): The upload id.
+            offset (int): Where the chunk starts; must equal the stored offset.
+            chunks (AsyncIterator[bytes]): The request body.
+            checksum (Optional[str]): The hex SHA-256 of the chunk. When given, a chunk that
+                does not match (or is cut short) is discarded entirely.
+
+        Returns:
+            Dict[str, Any]: The session with its new offset.
+
+        Raises:
+            KeyError: If the session does not exist.
+            UploadOffsetError: If the offset is wrong or another chunk is being written.
+            UploadChecksumError: If the chunk does not match `checksum`.
+            UploadTooLargeError: If the chunk goes past the declared size or MAX_CHUNK_BYTES.
+        """
+        lock_key = f"{self.session_key(upload_id)}:lock"
+        if not self.redis.set(lock_key, 1, nx=True, ex=LOCK_TTL_SECONDS):
+            session = self.get(upload_id)
+            raise UploadOffsetError("Another chunk is being written", session["offset"] if session else 0)
+        try:
+            session = self.get(upload_id)
+            if session is None:
+                raise KeyError(upload_id)
+            if offset != session["offset"]:
+                raise UploadOffsetError(f"Expected offset {session['offset']}, got {offset}", session["offset"])
+
+            written = await self._append(self.part_path(upload_id), session, offset, chunks, checksum)
+
+            session["offset"] = offset + written
+            key = self.session_key(upload_id)
+            self.redis.hset(key, mapping={"offset": session["offset"], "updated_at": time.time()})
+            self.redis.expire(key, SESSION_TTL_SECONDS)
+            return session
+        finally:
+            self.redis.delete(lock_key)
+
+    async def _append(
+        self,
+        path: Path,
+        session: Dict[str, Any],
+        offset: int,
+        chunks: AsyncIterator[bytes],
+        checksum: Optional[str],
+    ) -> int:
+        """Write the chunk at `offset` and return the bytes kept."""
+        digest = hashlib.sha256() if checksum else None
+        written = 0
+        file = await asyncio.to_thread(open, path, "r+b")
+        try:
+            # Drop anything past the stored offset, e.g. a write interrupted before the offset was saved
+            file.truncate(offset)
+            file.seek(offset)
+            try:
+                async for data in chunks:
+                    written += len(data)
+                    if offset + written > session["size"]:
+                        raise UploadTooLargeError(session["size"])
+                    if written > MAX_CHUNK_BYTES:
+                        raise UploadTooLargeError(MAX_CHUNK_BYTES)
+                    if digest is not None:
+                        digest.update(data)
+                    await asyncio.to_thread(file.write, data)
+            except UploadTooLargeError:
+                file.truncate(offset)
+                raise
+            except BaseException:
+                # Connection lost: keep what arrived unless the chunk has to be verified as a whole
+                file.flush()
+                kept = 0 if digest is not None else file.tell() - offset
+                file.truncate(offset + kept)
+                self.redis.hset(self.session_key(session["upload_id"]), "offset", offset + kept)
+                logger.info(f"Upload {session['upload_id']} interrupted at offset {offset + kept}")
+                raise
+
+            if digest is not None and digest.hexdigest() != checksum.lower():
+                file.truncate(offset)
+                raise UploadChecksumError("The chunk does not match its checksum")
+            await asyncio.to_thread(file.flush)
+            await asyncio.to_thread(os.fsync, file.fileno())
+        finally:
+            await asyncio.to_thread(file.close)
+        return written
+
+    def complete(self, upload_id: str, destination: Path) -> Tuple[int, str]:
+        """
+        Verify a fully received upload and move it into place.
+
+        Args:
+            upload_id (str): The upload id.
+            destination (Path): The final path of the file.
+
+        Returns:
+            Tuple[int, str]: The size in bytes and the hex SHA-256 digest of the file.
+
+        Raises:
+            KeyError: If the session does not exist.
+            UploadOffsetError: If bytes are still missing.
+            UploadChecksumError: If the file does not match the declared SHA-256; the upload is discarded.
+        """
+        session = self.get(upload_id)
+        if session is None:
+            raise KeyError(upload_id)
+        if session["offset"] != session["size"]:
+            raise UploadOffsetError(f"{session['size'] - session['offset']} bytes missing", session["offset"])
+
+        path = self.part_path(upload_id)
+        sha256 = _file_sha256(path)
+        if session["sha256"] and sha256 != session["sha256"]:
+            self.delete(upload_id)
+            raise UploadChecksumError("The uploaded file does not match its SHA-256")
+
+        os.replace(path, destination)
+        self.redis.delete(self.session_key(upload_id))
+        logger.info(f"Resumable upload {upload_id} stored at '{destination}' ({session['size']} bytes)")
+        return session["size"], sha256
+
+    def delete(self, upload_id: str) -> None:
+        """Abort an upload, removing its session and partial file."""
+        self.redis.delete(self.session_key(upload_id))
+        self.part_path(upload_id).unlink(missing_ok=True)
+
+    def _remove_stale_parts(self) -> None:
+        """Remove partial files whose session expired."""
+        cutoff = time.time() - SESSION_TTL_SECONDS
+        for path in self.directory.glob("*.part"):
+            try:
+                if path.stat().st_mtime < cutoff and not self.redis.exists(self.session_key(path.stem)):
+                    path.unlink()
+            except FileNotFoundError:
+                continue
@@ -0,0 +1,469 @@
+"""
+Lifecycle of the files kept on disk for each ingested document.
+
+Every ingested file is recorded under its SHA-256 with the namespaces and
+sources that reference it and the paths that hold it (the original upload and
+its PDF). Identical copies of a file are hardlinked, so content uploaded by
+several users or under several names takes disk space once. A periodic sweep
+then reclaims space from documents whose vectors are already in Milvus:
+
+- originals that have a PDF are deleted after STORAGE_EVICT_ORIGINALS_DAYS,
+  since previews and reindexing only read the PDF;
+- originals without a PDF (DOCX/PPTX read natively) are gzipped after
+  STORAGE_COMPRESS_ORIGINALS_DAYS and decompressed on demand for a preview;
+- files of content no namespace references any more are deleted.
+
+Per-namespace usage is reported from the same records and checked against
+STORAGE_QUOTA_MB before new uploads are accepted.
+"""
+import os
+import gzip
+import json
+import time
+import shutil
+import filecmp
+import logging
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from redis import Redis
+
+
+logger = logging.getLogger(__name__)
+
+# Disk space each namespace may use; 0 disables the quota
+QUOTA_BYTES = int(os.getenv("STORAGE_QUOTA_MB", "0")) * 1024 * 1024
+# Days after ingestion before an original with a PDF is deleted; negative keeps them
+EVICT_ORIGINALS_DAYS = float(os.getenv("STORAGE_EVICT_ORIGINALS_DAYS", "7"))
+# Days after ingestion before an original without a PDF is gzipped; negative keeps them as is
+COMPRESS_ORIGINALS_DAYS = float(os.getenv("STORAGE_COMPRESS_ORIGINALS_DAYS", "1"))
+# Seconds between two sweeps of the ingestion workers
+SWEEP_INTERVAL = float(os.getenv("STORAGE_SWEEP_INTERVAL", "3600"))
+
+KEY_PREFIX = "storage"
+COMPRESSED_SUFFIX = ".gz"
+
+
+class StorageQuotaError(Exception):
+    """Raised when an upload would take a namespace over its storage quota."""
+
+    def __init__(self, used: int, quota: int) -> None:
+        super().__init__(f"Storage quota exceeded: {used} of {quota} bytes used")
+        self.used = used
+        self.quota = quota
+
+
+def _decode(value: Any) -> Any:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+def _same_content(a: Path, b: Path) -> bool:
+    try:
+        return a.stat().st_size == b.stat().st_size and filecmp.cmp(a, b, shallow=False)
+    except OSError:
+        return False
+
+
+def _hardlink(existing: Path, duplicate: Path) -> bool:
+    """Replace `duplicate` with a hardlink to `existing`; both must hold the same bytes."""
+    if os.path.samefile(existing, duplicate):
+        return False
+    tmp = duplicate.with_name(f".{duplicate.name}.link")
+    try:
+        os.link(existing, tmp)
+        os.replace(tmp, duplicate)
+        return True
+    except OSError as e:
+        # Different filesystems or no hardlink support: keep both copies
+        tmp.unlink(missing_ok=True)
+        logger.debug(f"Could not hardlink '{duplicate}' to '{existing}': {e}")
+        return False
+
+
+class StorageManager:
+    """
+    Reference-counted records of the files behind each ingested document.
+
+    - storage:blob:<hash> holds, as JSON, the references ({namespace: [sources]}),
+      the files ({path: {"kind", "state"}}) and the ingestion time of a content hash.
+    - storage:blobs is the set of all recorded hashes.
+    - storage:namespace:<namespace> is the set of hashes a namespace references.
+    """
+
+    def __init__(self, redis_conn: Redis, key_prefix: str = KEY_PREFIX) -> None:
+        """
+        Initialize the manager.
+
+        Args:
+            redis_conn (Redis): The Redis connection.
+            key_prefix (str): Prefix for the Redis keys.
+        """
+        self.redis = redis_conn
+        self.key_prefix = key_prefix
+
+    def _blob_key(self, sha256: str) -> str:
+        return f"{self.key_prefix}:blob:{sha256}"
+
+    def _namespace_key(self, namespace: str) -> str:
+        return f"{self.key_prefix}:namespace:{namespace}"
+
+    @property
+    def _blobs_key(self) -> str:
+        return f"{self.key_prefix}:blobs"
+
+    @property
+    def _paths_key(self) -> str:
+        return f"{self.key_prefix}:paths"
+
+    def get_blob(self, sha256: str) -> Optional[Dict[str, Any]]:
+        """Return the record of a content hash, or None."""
+        value = self.redis.get(self._blob_key(sha256))
+        return json.loads(_decode(value)) if value else None
+
+    def _update_blob(self, sha256: str, update) -> Dict[str, Any]:
+        """Apply `update(blob)` to a record in an optimistic transaction and return the result."""
+        key = self._blob_key(sha256)
+        result: Dict[str, Any] = {}
+
+        def _transaction(pipe) -> None:
+            value = pipe.get(key)
+            blob = json.loads(_decode(value)) if value else {"refs": {}, "files": {}, "ingested_at": time.time()}
+            update(blob)
+            pipe.multi()
+            pipe.set(key, json.dumps(blob))
+            pipe.sadd(self._blobs_key, sha256)
+            result.update(blob)
+
+        self.redis.transaction(_transaction, key)
+        return result
+
+    def record(
+        self,
+        namespace: str,
+        sha256: str,
+        source: str,
+        original: Optional[str],
+        pdf: Optional[str],
+    ) -> None:
+        """
+        Record the files of a document once its vectors are in Milvus.
+
+        Copies with the same bytes as a file already recorded for the hash are
+        hardlinked to it. A path that previously held other content (a file
+        re-uploaded under the same name) is dropped from that content's record,
+        along with the reference of this namespace and source.
+
+        Args:
+            namespace (str): The namespace (user email) of the document.
+            sha256 (str): The hex SHA-256 of the uploaded file.
+            source (str): The source name the document was indexed with.
+            original (Optional[str]): The path of the uploaded file, if it is still on disk.
+            pdf (Optional[str]): The path of its PDF, which may still be being generated.
+        """
+        # PDFs uploaded as such were moved to the PDF directory, leaving no original behind
+        paths = {
+            str(Path(path).resolve()): kind
+            for path, kind in ((original, "original"), (pdf, "pdf"))
+            if path and (kind == "pdf" or Path(path).exists())
+        }
+        for path in paths:
+            previous = _decode(self.redis.hget(self._paths_key, path))
+            if previous and previous != sha256:
+                self._update_blob(previous, lambda blob, path=path: blob["files"].pop(path, None))
+        for previous in self._sources_elsewhere(namespace, source, sha256):
+            self.release(namespace, previous, source)
+
+        existing = self.get_blob(sha256) or {"files": {}}
+        for path, kind in paths.items():
+            if not Path(path).exists():
+                continue
+            for other, info in existing["files"].items():
+                if other != path and info["state"] == "stored" and _same_content(Path(other), Path(path)):
+                    if _hardlink(Path(other), Path(path)):
+                        logger.info(f"'{path}' hardlinked to identical '{other}'")
+                    break
+
+        def _add(blob: Dict[str, Any]) -> None:
+            # The eviction delays count from the latest ingestion of the content
+            blob["ingested_at"] = time.time()
+            sources = blob["refs"].setdefault(namespace, [])
+            if source not in sources:
+                sources.append(source)
+            for path, kind in paths.items():
+                blob["files"][path] = {"kind": kind, "state": "stored"}
+
+        self._update_blob(sha256, _add)
+        pipe = self.redis.pipeline()
+        pipe.sadd(self._namespace_key(namespace), sha256)
+        for path in paths:
+            pipe.hset(self._paths_key, path, sha256)
+        pipe.execute()
+
+    def locate(self, namespace: str, source: str) -> Optional[Tuple[str, Dict[str, Path]]]:
+        """
+        Find the files a namespace recorded under a source name.
+
+        Only paths that still hold the recorded content are returned, so a file
+        uploaded later under the same name by someone else is never handed out.
+
+        Args:
+            namespace (str): The namespace (user email).
+            source (str): The source name the document was indexed with.
+
+        Returns:
+            Optional[Tuple[str, Dict[str, Path]]]: The content hash and the stored file of
+            each kind ("original", "pdf"; a compressed original ends with ".gz"), or None
+            if the namespace recorded no such document.
+        """
+        for member in self.redis.smembers(self._namespace_key(namespace)):
+            sha256 = _decode(member)
+            blob = self.get_blob(sha256)
+            if not blob or source not in blob["refs"].get(namespace, []):
+                continue
+            files: Dict[str, Path] = {}
+            for path, info in blob["files"].items():
+                stored = self._stored_path(path, info)
+                if info["kind"] in files or stored is None or not stored.exists():
+                    continue
+                if _decode(self.redis.hget(self._paths_key, path)) == sha256:
+                    files[info["kind"]] = stored
+            return sha256, files
+        return None
+
+    def _sources_elsewhere(self, namespace: str, source: str, sha256: str) -> List[str]:
+        """Other hashes the namespace references under the same source (a re-upload with new content)."""
+        hashes = []
+        for member in self.redis.smembers(self._namespace_key(namespace)):
+            other = _decode(member)
+            if other == sha256:
+                continue
+            blob = self.get_blob(other)
+            if blob and source in blob["refs"].get(namespace, []):
+                hashes.append(other)
+        return hashes
+
+    def release(self, namespace: str, sha256: str, source: str) -> None:
+        """
+        Drop the reference of a namespace and source to a content hash.
+
+        The files are deleted by the next sweep once no reference is left.
+        """
+        def _remove(blob: Dict[str, Any]) -> None:
+            sources = [s for s in blob["refs"].get(namespace, []) if s != source]
+            if sources:
+                blob["refs"][namespace] = sources
+            else:
+                blob["refs"].pop(namespace, None)
+
+        blob = self._update_blob(sha256, _remove)
+        if namespace not in blob["refs"]:
+            self.redis.srem(self._namespace_key(namespace), sha256)
+
+    @staticmethod
+    def _stored_path(path: str, info: Dict[str, Any]) -> Optional[Path]:
+        if info["state"] == "compressed":
+            return Path(path + COMPRESSED_SUFFIX)
+        if info["state"] == "stored":
+            return Path(path)
+        return None
+
+    def _blob_usage(self, blob: Dict[str, Any]) -> Dict[str, int]:
+        """Bytes on disk of a record, counting hardlinked paths once."""
+        usage = {"bytes": 0, "original": 0, "pdf": 0}
+        seen: Set[Tuple[int, int]] = set()
+        for path, info in blob["files"].items():
+            stored = self._stored_path(path, info)
+            try:
+                stat = stored.stat() if stored else None
+            except OSError:
+                stat = None
+            if stat is None or (stat.st_dev, stat.st_ino) in seen:
+                continue
+            seen.add((stat.st_dev, stat.st_ino))
+            usage["bytes"] += stat.st_size
+            usage[info["kind"]] += stat.st_size
+        return usage
+
+    def usage(self, namespace: str) -> Dict[str, Any]:
+        """
+        Report the disk space used by a namespace.
+
+        Content shared with other namespaces is charged in full to each of them
+        and also reported as `shared_bytes`.
+
+        Args:
+            namespace (str): The namespace (user email).
+
+        Returns:
+            Dict[str, Any]: Documents, bytes (total, originals, PDFs, shared), originals
+            compressed and evicted, and the quota.
+        """
+        report = {
+            "namespace": namespace,
+            "documents": 0,
+            "bytes": 0,
+            "original_bytes": 0,
+            "pdf_bytes": 0,
+            "shared_bytes": 0,
+            "compressed_originals": 0,
+            "evicted_originals": 0,
+            "quota_bytes": QUOTA_BYTES or None,
+        }
+        for member in self.redis.smembers(self._namespace_key(namespace)):
+            blob = self.get_blob(_decode(member))
+            if not blob or namespace not in blob["refs"]:
+                continue
+            usage = self._blob_usage(blob)
+            report["documents"] += len(blob["refs"][namespace])
+            report["bytes"] += usage["bytes"]
+            report["original_bytes"] += usage["original"]
+            report["pdf_bytes"] += usage["pdf"]
+            if len(blob["refs"]) > 1:
+                report["shared_bytes"] += usage["bytes"]
+            for info in blob["files"].values():
+                if info["kind"] == "original" and info["state"] in ("compressed", "evicted"):
+                    report[f"{info['state']}_originals"] += 1
+        if QUOTA_BYTES:
+            report["quota_used"] = round(report["bytes"] / QUOTA_BYTES, 4)
+        return report
+
+    def check_quota(self, namespace: str, incoming: int = 0) -> None:
+        """
+        Reject an upload that would take a namespace over STORAGE_QUOTA_MB.
+
+        Args:
+            namespace (str): The namespace (user email).
+            incoming (int): Bytes about to be stored.
+
+        Raises:
+            StorageQuotaError: If the quota would be exceeded.
+        """
+        if not QUOTA_BYTES:
+            return
+        used = self.usage(namespace)["bytes"]
+        if used + incoming > QUOTA_BYTES:
+            raise StorageQuotaError(used + incoming, QUOTA_BYTES)
+
+    def sweep(self, now: Optional[float] = None) -> Dict[str, int]:
+        """
+        Evict or compress originals and delete unreferenced content.
+
+        Args:
+            now (Optional[float]): The current time, for tests and dry runs.
+
+        Returns:
+            Dict[str, int]: Originals evicted and compressed, records deleted and bytes freed.
+        """
+        now = now or time.time()
+        stats = {"evicted": 0, "compressed": 0, "deleted": 0, "bytes_freed": 0}
+        for member in self.redis.smembers(self._blobs_key):
+            sha256 = _decode(member)
+            try:
+                self._sweep_blob(sha256, now, stats)
+            except Exception as e:
+                logger.warning(f"Storage sweep skipped '{sha256}': {e}")
+        if any(stats.values()):
+            logger.info(f"Storage sweep: {stats}")
+        return stats
+
+    def _sweep_blob(self, sha256: str, now: float, stats: Dict[str, int]) -> None:
+        blob = self.get_blob(sha256)
+        if blob is None:
+            self.redis.srem(self._blobs_key, sha256)
+            return
+
+        if not blob["refs"]:
+            for path, info in blob["files"].items():
+                # The path may hold other content by now (a new upload with the same name)
+                if _decode(self.redis.hget(self._paths_key, path)) != sha256:
+                    continue
+                stored = self._stored_path(path, info)
+                if stored is not None and stored.exists():
+                    stats["bytes_freed"] += self._unlink_if_last(stored)
+                self.redis.hdel(self._paths_key, path)
+            pipe = self.redis.pipeline()
+            pipe.delete(self._blob_key(sha256))
+            pipe.srem(self._blobs_key, sha256)
+            pipe.execute()
+            stats["deleted"] += 1
+            return
+
+        age_days = (now - blob["ingested_at"]) / 86400
+        has_pdf = any(
+            info["kind"] == "pdf" and info["state"] == "stored" and Path(path).exists()
+            for path, info in blob["files"].items()
+        )
+        changes: Dict[str, str] = {}
+        for path, info in blob["files"].items():
+            if info["kind"] != "original" or info["state"] != "stored":
+                continue
+            original = Path(path)
+            if not original.exists():
+                changes[path] = "missing"
+            elif has_pdf and 0 <= EVICT_ORIGINALS_DAYS <= age_days:
+                stats["bytes_freed"] += self._unlink_if_last(original)
+                changes[path] = "evicted"
+                stats["evicted"] += 1
+            elif not has_pdf and 0 <= COMPRESS_ORIGINALS_DAYS <= age_days:
+                stats["bytes_freed"] += self._compress(original)
+                changes[path] = "compressed"
+                stats["compressed"] += 1
+
+        if changes:
+            def _apply(blob: Dict[str, Any]) -> None:
+                for path, state in changes.items():
+                    if path in blob["files"]:
+                        blob["files"][path]["state"] = state
+
+            self._update_blob(sha256, _apply)
+
+    @staticmethod
+    def _unlink_if_last(path: Path) -> int:
+        """Delete a path and return the bytes freed (none while other hardlinks remain)."""
+        stat = path.stat()
+        path.unlink()
+        return stat.st_size if stat.st_nlink == 1 else 0
+
+    @staticmethod
+    def _compress(path: Path) -> int:
+        """Gzip a file next to itself, remove the original and return the bytes saved."""
+        target = Path(str(path) + COMPRESSED_SUFFIX)
+        size = path.stat().st_size
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        try:
+            with open(path, "rb") as src, os.fdopen(fd, "wb") as raw, gzip.GzipFile(fileobj=raw, mode="wb") as dst:
+                shutil.copyfileobj(src, dst)
+            os.replace(tmp, target)
+        except BaseException:
+            Path(tmp).unlink(missing_ok=True)
+            raise
+        path.unlink()
+        return size - target.stat().st_size
+
+    @staticmethod
+    def restore(compressed: Path, directory: Path) -> Path:
+        """
+        Decompress a compressed original into `directory`, keeping its name.
+
+        Args:
+            compressed (Path): The ".gz" file.
+            directory (Path): Where the decompressed copy is written.
+
+        Returns:
+            Path: The decompressed copy.
+        """
+        target = Path(directory) / compressed.name[: -len(COMPRESSED_SUFFIX)]
+        with gzip.open(compressed, "rb") as src, open(target, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        return target
+
+    def try_sweep(self, lock_seconds: int = 300) -> Optional[Dict[str, int]]:
+        """Run a sweep unless another process is already running one."""
+        lock_key = f"{self.key_prefix}:sweep:lock"
+        if not self.redis.set(lock_key, 1, nx=True, ex=lock_seconds):
+            return None
+        try:
+            return self.sweep()
+        finally:
+            self.redis.delete(lock_key)
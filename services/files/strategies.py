@@ -3,17 +3,79 @@ This module contains the Strategy pattern implementation for file processing.
 """
 from __future__ import annotations
 
+import os
+import asyncio
 import logging
 import shutil
+import filecmp
+import tempfile
 import mimetypes
 import subprocess
 from pathlib import Path
-from typing import Optional
+from typing import List, Optional
 from abc import ABC, abstractmethod
 
+from .office_pool import OfficeWorkerPool
+
 
 logger = logging.getLogger(__name__)
 
+# Seconds before a conversion subprocess is killed
+CONVERSION_TIMEOUT = float(os.getenv("CONVERSION_TIMEOUT", "300"))
+# Maximum number of conversion subprocesses running at once in the async path
+CONVERSION_CONCURRENCY = int(os.getenv("CONVERSION_CONCURRENCY", "2"))
+
+_conversion_slots: Optional[asyncio.Semaphore] = None
+
+
+def _get_conversion_slots() -> asyncio.Semaphore:
+    """Return the process-wide semaphore bounding async conversions."""
+    global _conversion_slots
+    if _conversion_slots is None:
+        _conversion_slots = asyncio.Semaphore(CONVERSION_CONCURRENCY)
+    return _conversion_slots
+
+
+async def run_subprocess(args: List[str], timeout: float = CONVERSION_TIMEOUT) -> subprocess.CompletedProcess:
+    """
+    Run a command without blocking the event loop.
+    
+    The process is killed if it exceeds the timeout or if the awaiting task is cancelled.
+    
+    Args:
+        args (List[str]): The command and its arguments.
+        timeout (float): Seconds before the process is killed.
+        
+    Returns:
+        subprocess.CompletedProcess: The finished process with decoded output.
+        
+    Raises:
+        subprocess.CalledProcessError: If the command exits with a non-zero status.
+        subprocess.TimeoutExpired: If the command exceeds the timeout.
+        FileNotFoundError: If the executable does not exist.
+    """
+    process = await asyncio.create_subprocess_exec(
+        *args,
+        stdout=asyncio.subprocess.PIPE,
+        stderr=asyncio.subprocess.PIPE,
+    )
+    try:
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=timeout)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        raise subprocess.TimeoutExpired(args, timeout)
+    except asyncio.CancelledError:
+        process.kill()
+        await process.wait()
+        raise
+    
+    stdout_text = stdout.decode(errors="replace")
+    stderr_text = stderr.decode(errors="replace")
+    if process.returncode != 0:
+        raise subprocess.CalledProcessError(process.returncode, args, stdout_text, stderr_text)
+    return subprocess.CompletedProcess(args, process.returncode, stdout_text, stderr_text)
+
 
 class Strategy(ABC):
     """Strategy interface for file processing."""
@@ -30,6 +92,21 @@ class Strategy(ABC):
         Returns:
             Optional[str]: The path to the output file if successful, None otherwise.
         """
+    
+    async def execute_async(self, input_file: str, outdir: str) -> Optional[str]:
+        """
+        Execute the strategy without blocking the event loop.
+        
+        The default implementation runs `execute` in a worker thread.
+        
+        Args:
+            input_file (str): The path to the input file.
+            outdir (str): The path to the destination directory.
+            
+        Returns:
+            Optional[str]: The path to the output file if successful, None otherwise.
+        """
+        return await asyncio.to_thread(self.execute, input_file, outdir)
 
 
 class AcceptedFiles(Strategy):
@@ -53,8 +130,8 @@ class AcceptedFiles(Strategy):
             input_path = Path(input_file)
             destination = Path(outdir) / input_path.name
             
-            # Check if destination already exists
-            if destination.exists():
+            # Check if destination already exists; the same content is replaced instead of kept twice
+            if destination.exists() and not filecmp.cmp(input_path, destination, shallow=False):
                 logger.warning(f"File '{destination}' already exists. Adding suffix.")
                 destination = Path(outdir) / f"{input_path.stem}_copy{input_path.suffix}"
             
@@ -70,11 +147,78 @@ class ConversionStrategy(Strategy):
     """
     Conversion strategy.
     This strategy converts the file to PDF:
-      - Using ImageMagick if the file is an image.
-      - Using LibreOffice if the file is a document.
-    And saves the converted file to the destination directory.
+      - Using ImageMagick if the file is an image. The PDF keeps the original image,
+        only upright; OCR reads a normalized copy instead (see `services.files.image_prep`).
+      - Using LibreOffice if the file is a document, through the warm worker
+        pool when OFFICE_POOL_SIZE is set and a one-off soffice otherwise.
+    And moves the converted file to the destination directory, replacing a PDF
+    with the same content.
     """
     
+    @staticmethod
+    def _is_image(input_path: Path) -> bool:
+        mime_type, _ = mimetypes.guess_type(str(input_path))
+        return bool(mime_type and mime_type.startswith("image"))
+    
+    @staticmethod
+    def _workdir(outdir: str) -> tempfile.TemporaryDirectory:
+        """Return a temporary directory next to the destination, where the PDF is converted."""
+        Path(outdir).mkdir(parents=True, exist_ok=True)
+        return tempfile.TemporaryDirectory(prefix=".convert-", dir=outdir)
+    
+    @staticmethod
+    def _commands(input_path: Path, destination_pdf: Path, outdir: str) -> List[List[str]]:
+        """
+        Build the conversion commands for the file, in order of preference.
+        
+        Args:
+            input_path (Path): The path to the input file.
+            destination_pdf (Path): The path to the converted PDF.
+            outdir (str): The directory the converted PDF is written to.
+            
+        Returns:
+            List[List[str]]: Alternative commands; the next one is tried if an executable is missing.
+        """
+        if ConversionStrategy._is_image(input_path):
+            # 'magick' for newer ImageMagick versions, 'convert' for older ones or Debian
+            return [
+                ["magick", str(input_path), "-auto-orient", str(destination_pdf)],
+                ["convert", str(input_path), "-auto-orient", str(destination_pdf)],
+            ]
+        return [
+            [
+                "soffice",
+                "--headless",
+                "--convert-to",
+                "pdf",
+                "--outdir",
+                str(outdir),
+                str(input_path),
+            ]
+        ]
+    
+    @staticmethod
+    def _publish(input_file: str, converted_pdf: Path, outdir: str) -> Optional[str]:
+        """
+        Move the converted PDF into the destination directory and return its path.
+        
+        A PDF with the same content already there is replaced; a different one is kept
+        and the new PDF gets a suffix.
+        """
+        if not converted_pdf.exists():
+            logger.error(f"Conversion completed but file '{converted_pdf}' not found")
+            return None
+        
+        destination_pdf = Path(outdir) / converted_pdf.name
+        if destination_pdf.exists() and not filecmp.cmp(converted_pdf, destination_pdf, shallow=False):
+            logger.warning(f"File '{destination_pdf}' already exists. Adding suffix.")
+            destination_pdf = Path(outdir) / f"{converted_pdf.stem}_copy.pdf"
+        os.replace(converted_pdf, destination_pdf)
+            
+        logger.info(f"File '{input_file}' converted to PDF: '{destination_pdf}'")
+
+        return destination_pdf.as_posix()
+    
     def execute(self, input_file: str, outdir: str) -> Optional[str]:
         """
         Execute the strategy (ConversionStrategy).
@@ -87,68 +231,106 @@ class ConversionStrategy(Strategy):
             Optional[str]: The path to the converted PDF file if successful, None otherwise.
         """
         input_path = Path(input_file)
-        destination_pdf = Path(outdir) / f"{input_path.stem}.pdf"
-        
-        # Check if destination already exists
-        if destination_pdf.exists():
-            logger.warning(f"File '{destination_pdf}' already exists. Adding suffix.")
-            destination_pdf = Path(outdir) / f"{input_path.stem}_copy.pdf"
-        
-        mime_type, _ = mimetypes.guess_type(input_file)
+        pool = None if self._is_image(input_path) else OfficeWorkerPool.get_pool()
+        workdir = None
         
         try:
-            if mime_type and mime_type.startswith("image"):
-                logger.info(f"Converting image '{input_file}' to PDF using ImageMagick")
+            # soffice names its output after the input, so it converts into a directory of its own
+            workdir = self._workdir(outdir)
+            converted_pdf = Path(workdir.name) / f"{input_path.stem}.pdf"
+            if pool is not None:
+                logger.info(f"Converting document '{input_file}' to PDF using the LibreOffice pool")
+                pool.convert(str(input_path), str(converted_pdf), timeout=CONVERSION_TIMEOUT)
+                return self._publish(input_file, converted_pdf, outdir)
+            
+            commands = self._commands(input_path, converted_pdf, workdir.name)
+            logger.info(f"Converting '{input_file}' to PDF using '{commands[0][0]}'")
+            for i, command in enumerate(commands):
                 try:
-                    # First try with 'magick' command (newer ImageMagick versions)
                     result = subprocess.run(
-                        ["magick", str(input_path), str(destination_pdf)],
+                        command,
                         check=True,
                         capture_output=True,
                         text=True,
+                        timeout=CONVERSION_TIMEOUT,
                     )
+                    break
                 except FileNotFoundError:
-                    # Fall back to 'convert' command (older ImageMagick versions or Debian)
-                    logger.info("'magick' command not found, trying 'convert' instead")
-                    result = subprocess.run(
-                        ["convert", str(input_path), str(destination_pdf)],
-                        check=True,
-                        capture_output=True,
-                        text=True,
-                    )
-                logger.debug(f"ImageMagick output: {result.stdout}")
-            else:
-                logger.info(f"Converting document '{input_file}' to PDF using LibreOffice")
-                result = subprocess.run(
-                    [
-                        "soffice",
-                        "--headless",
-                        "--convert-to",
-                        "pdf",
-                        "--outdir",
-                        str(outdir),
-                        str(input_path),
-                    ],
-                    check=True,
-                    capture_output=True,
-                    text=True,
+                    if i == len(commands) - 1:
+                        raise
+                    logger.info(f"'{command[0]}' command not found, trying '{commands[i + 1][0]}' instead")
+            logger.debug(f"{command[0]} output: {result.stdout}")
+            
+            return self._publish(input_file, converted_pdf, outdir)
+        except subprocess.CalledProcessError as e:
+            error_msg = e.stderr if e.stderr else str(e)
+            logger.error(f"Error converting file '{input_file}' to PDF: {error_msg}")
+
+            return None
+        except Exception as e:
+            logger.error(f"Unexpected error converting file '{input_file}' to PDF: {e}")
+
+            return None
+        finally:
+            if workdir is not None:
+                workdir.cleanup()
+    
+    async def execute_async(self, input_file: str, outdir: str) -> Optional[str]:
+        """
+        Execute the strategy (ConversionStrategy) with asyncio subprocesses.
+        
+        Conversions are bounded by CONVERSION_CONCURRENCY, killed after CONVERSION_TIMEOUT
+        seconds and killed as well if the awaiting task is cancelled.
+        
+        Args:
+            input_file (str): The path to the input file.
+            outdir (str): The path to the destination directory.
+            
+        Returns:
+            Optional[str]: The path to the converted PDF file if successful, None otherwise.
+        """
+        input_path = Path(input_file)
+        workdir = None
+        
+        try:
+            workdir = self._workdir(outdir)
+            converted_pdf = Path(workdir.name) / f"{input_path.stem}.pdf"
+            pool = None if self._is_image(input_path) else OfficeWorkerPool.get_pool()
+            if pool is not None:
+                # The pool bounds its own concurrency and queues the callers
+                logger.info(f"Converting document '{input_file}' to PDF using the LibreOffice pool")
+                await asyncio.to_thread(
+                    pool.convert, str(input_path), str(converted_pdf), CONVERSION_TIMEOUT
                 )
-                logger.debug(f"LibreOffice output: {result.stdout}")
+                return self._publish(input_file, converted_pdf, outdir)
+            
+            async with _get_conversion_slots():
+                commands = self._commands(input_path, converted_pdf, workdir.name)
+                logger.info(f"Converting '{input_file}' to PDF using '{commands[0][0]}' (async)")
+                for i, command in enumerate(commands):
+                    try:
+                        result = await run_subprocess(command)
+                        break
+                    except FileNotFoundError:
+                        if i == len(commands) - 1:
+                            raise
+                        logger.info(f"'{command[0]}' command not found, trying '{commands[i + 1][0]}' instead")
+                logger.debug(f"{command[0]} output: {result.stdout}")
             
-            # Verify the file was created
-            if not destination_pdf.exists():
-                logger.error(f"Conversion completed but file '{destination_pdf}' not found")
-                return None
-                
-            logger.info(f"File '{input_file}' converted to PDF: '{destination_pdf}'")
-
-            return destination_pdf.as_posix()
+            return self._publish(input_file, converted_pdf, outdir)
         except subprocess.CalledProcessError as e:
             error_msg = e.stderr if e.stderr else str(e)
             logger.error(f"Error converting file '{input_file}' to PDF: {error_msg}")
 
+            return None
+        except subprocess.TimeoutExpired:
+            logger.error(f"Conversion of '{input_file}' timed out after {CONVERSION_TIMEOUT}s")
+
             return None
         except Exception as e:
             logger.error(f"Unexpected error converting file '{input_file}' to PDF: {e}")
 
             return None
+        finally:
+            if workdir is not None:
+                workdir.cleanup()
@@ -0,0 +1,218 @@
+"""
+Streaming indexing: pages flow through chunking, embedding and Milvus inserts in
+bounded batches instead of being collected into one list first.
+"""
+import os
+import queue
+import logging
+import time
+import threading
+from itertools import islice
+from typing import Any, Callable, Iterable, Iterator, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+from .metrics import BATCH_SECONDS
+
+
+logger = logging.getLogger(__name__)
+
+# Chunks embedded and inserted together
+BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "64"))
+# Batches buffered between extraction, embedding and insertion
+BUFFER_BATCHES = int(os.getenv("INGEST_BUFFER_BATCHES", "2"))
+# Pages longer than this are split into several chunks
+CHUNK_MAX_CHARS = int(os.getenv("INGEST_CHUNK_MAX_CHARS", "6000"))
+
+Chunk = Tuple[Document, int]
+
+_DONE = object()
+
+
+def split_text(text: str, max_chars: int) -> List[str]:
+    """
+    Split text into parts of at most `max_chars`, preferring paragraph, then line,
+    then word boundaries.
+
+    Args:
+        text (str): The text to split.
+        max_chars (int): Maximum characters per part.
+
+    Returns:
+        List[str]: The parts, or the text itself if it is short enough.
+    """
+    if len(text) <= max_chars:
+        return [text]
+    for separator in ("\n\n", "\n", " "):
+        pieces = text.split(separator)
+        if len(pieces) > 1:
+            break
+    else:
+        return [text[i:i + max_chars] for i in range(0, len(text), max_chars)]
+
+    parts: List[str] = []
+    current = ""
+    for piece in pieces:
+        candidate = f"{current}{separator}{piece}" if current else piece
+        if len(candidate) <= max_chars:
+            current = candidate
+            continue
+        if current:
+            parts.append(current)
+        if len(piece) > max_chars:
+            nested = split_text(piece, max_chars)
+            parts.extend(nested[:-1])
+            current = nested[-1]
+        else:
+            current = piece
+    if current:
+        parts.append(current)
+    return parts
+
+
+def iter_chunks(pages: Iterable[Document], max_chars: int = CHUNK_MAX_CHARS) -> Iterator[Chunk]:
+    """
+    Split pages into chunks, keeping the page metadata.
+
+    The index of each chunk within its page is also stored as the `chunk`
+    metadata field, so the row IDs can be rebuilt from the stored metadata alone
+    (e.g. when a source is copied or re-indexed).
+
+    Args:
+        pages (Iterable[Document]): The pages to split.
+        max_chars (int): Maximum characters per chunk.
+
+    Returns:
+        Iterator[Chunk]: Each chunk with its index within the page.
+    """
+    for page in pages:
+        for index, part in enumerate(split_text(page.page_content, max_chars)):
+            yield Document(page_content=part, metadata={**page.metadata, "chunk": index}), index
+
+
+def batched(items: Iterable[Any], size: int) -> Iterator[List[Any]]:
+    """Group an iterable into lists of at most `size` items."""
+    iterator = iter(items)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class StreamingIndexer:
+    """
+    Embeds and inserts chunks while they are still being extracted.
+
+    Three stages overlap: the calling thread extracts and batches chunks, one thread
+    embeds each batch and another inserts it into Milvus. Bounded queues between the
+    stages keep memory flat, and every batch is searchable as soon as it is inserted.
+    """
+
+    def __init__(
+        self,
+        milvus_conn: Any,
+        vectorstore: Any,
+        batch_size: int = BATCH_SIZE,
+        buffer_batches: int = BUFFER_BATCHES,
+        on_batch: Optional[Callable[[List[Document]], None]] = None,
+    ) -> None:
+        """
+        Initialize the indexer.
+
+        Args:
+            milvus_conn (MilvusStorage): The storage providing the embeddings model and the inserts.
+            vectorstore (Milvus): The connected vector store.
+            batch_size (int): Chunks embedded and inserted together.
+            buffer_batches (int): Batches buffered between stages.
+            on_batch (Optional[Callable[[List[Document]], None]]): Called with each inserted batch.
+        """
+        self.milvus_conn = milvus_conn
+        self.vectorstore = vectorstore
+        self.batch_size = batch_size
+        self.buffer_batches = buffer_batches
+        self.on_batch = on_batch
+        self.rows = 0
+        # Seconds spent in the embedding and insert calls, summed over all batches
+        self.embed_seconds = 0.0
+        self.insert_seconds = 0.0
+
+    def run(self, chunks: Iterable[Chunk]) -> int:
+        """
+        Index a stream of chunks.
+
+        Args:
+            chunks (Iterable[Chunk]): The chunks and their index within the page.
+
+        Returns:
+            int: The number of rows inserted.
+
+        Raises:
+            Exception: The first error raised by any stage; the remaining batches are discarded.
+        """
+        to_embed: "queue.Queue[Any]" = queue.Queue(self.buffer_batches)
+        to_insert: "queue.Queue[Any]" = queue.Queue(self.buffer_batches)
+        errors: List[BaseException] = []
+        failed = threading.Event()
+
+        def fail(error: BaseException) -> None:
+            errors.append(error)
+            failed.set()
+
+        def embed() -> None:
+            # Keeps draining after a failure so the producer never blocks
+            while (batch := to_embed.get()) is not _DONE:
+                if failed.is_set():
+                    continue
+                try:
+                    started = time.perf_counter()
+                    vectors = self.milvus_conn.embeddings_model.embed_documents(
+                        [doc.page_content for doc, _ in batch]
+                    )
+                    elapsed = time.perf_counter() - started
+                    self.embed_seconds += elapsed
+                    BATCH_SECONDS.labels("embed").observe(elapsed)
+                    to_insert.put((batch, vectors))
+                except Exception as e:
+                    fail(e)
+            to_insert.put(_DONE)
+
+        def insert() -> None:
+            while (item := to_insert.get()) is not _DONE:
+                if failed.is_set():
+                    continue
+                batch, vectors = item
+                docs = [doc for doc, _ in batch]
+                try:
+                    ids = [self.milvus_conn.document_id(doc, chunk) for doc, chunk in batch]
+                    started = time.perf_counter()
+                    if self.milvus_conn.upsert_embeddings(self.vectorstore, docs, vectors, ids) is None:
+                        raise ValueError("Error inserting a batch into Milvus")
+                    elapsed = time.perf_counter() - started
+                    self.insert_seconds += elapsed
+                    BATCH_SECONDS.labels("insert").observe(elapsed)
+                    self.rows += len(docs)
+                    if self.on_batch:
+                        self.on_batch(docs)
+                except Exception as e:
+                    fail(e)
+
+        workers = [
+            threading.Thread(target=embed, name="ingest-embed", daemon=True),
+            threading.Thread(target=insert, name="ingest-insert", daemon=True),
+        ]
+        for worker in workers:
+            worker.start()
+
+        try:
+            for batch in batched(chunks, self.batch_size):
+                if failed.is_set():
+                    break
+                to_embed.put(batch)
+        except Exception as e:
+            fail(e)
+        finally:
+            to_embed.put(_DONE)
+            for worker in workers:
+                worker.join()
+
+        if errors:
+            raise errors[0]
+        return self.rows
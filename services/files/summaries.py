@@ -0,0 +1,219 @@
+"""
+Per-document summaries and keywords computed at ingest time.
+
+Questions about what a document contains, or which documents mention a topic,
+otherwise take several vector searches that pull whole pages into the agent's
+context. With INGEST_SUMMARIES=true the ingestion job summarizes every new
+document with a map-reduce over its pages: consecutive pages are grouped into
+parts of at most INGEST_SUMMARY_PART_CHARS as they stream in, each part is
+summarized on its own (map) and the partial summaries are merged into one short
+summary and keyword list (reduce). Documents with more than
+INGEST_SUMMARY_MAX_PARTS parts are summarized from parts spread evenly over the
+document, and only those parts are held in memory.
+
+Summaries are stored per content hash in the content catalog, so an identical
+upload in any namespace reuses them.
+"""
+import os
+import json
+import time
+import logging
+from typing import Any, Dict, Iterable, List, Optional
+
+from langchain_openai import ChatOpenAI
+
+
+logger = logging.getLogger(__name__)
+
+SUMMARIES = os.getenv("INGEST_SUMMARIES", "false").lower() == "true"
+# Model used for the summaries; defaults to the agent model
+SUMMARY_MODEL = os.getenv("INGEST_SUMMARY_MODEL") or os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+# Characters of text summarized in one map call
+PART_CHARS = int(os.getenv("INGEST_SUMMARY_PART_CHARS", "12000"))
+# Map calls per document at most
+MAX_PARTS = int(os.getenv("INGEST_SUMMARY_MAX_PARTS", "16"))
+# Map calls of one document in flight at once
+SUMMARY_CONCURRENCY = int(os.getenv("INGEST_SUMMARY_CONCURRENCY", "4"))
+SUMMARY_MAX_WORDS = 120
+MAX_KEYWORDS = 12
+
+MAP_PROMPT = (
+    "You are indexing the document '{source}'. Below is part {part} of {parts}.\n"
+    "Summarize this part in at most 5 sentences and list up to {keywords} keywords "
+    "(names, topics, dates, codes) a user could search for. Write in the language of the text.\n"
+    'Answer only with JSON: {{"summary": "...", "keywords": ["..."]}}\n\n'
+    "{text}"
+)
+REDUCE_PROMPT = (
+    "You are indexing the document '{source}'. Below are the summaries of its parts, in order.\n"
+    "Write one summary of the whole document in at most {words} words, saying what kind of "
+    "document it is and what it covers, and choose the {keywords} most useful keywords. "
+    "Write in the language of the summaries.\n"
+    'Answer only with JSON: {{"summary": "...", "keywords": ["..."]}}\n\n'
+    "{text}"
+)
+
+
+class PartSampler:
+    """
+    Groups page texts into parts for the map step as the pages stream in.
+
+    Only the parts that can still be sampled are kept: once more than twice
+    `max_parts` are held, every other one is dropped and only every second
+    later part is kept, so memory stays bounded however long the document is.
+    """
+
+    def __init__(self, part_chars: int = PART_CHARS, max_parts: int = MAX_PARTS) -> None:
+        """
+        Initialize the sampler.
+
+        Args:
+            part_chars (int): Largest part; longer pages are truncated to it.
+            max_parts (int): Parts returned at most, spread evenly over the document.
+        """
+        self.part_chars = part_chars
+        self.max_parts = max_parts
+        self._kept: List[str] = []
+        self._stride = 1
+        self._closed = 0
+        self._current = ""
+        self._current_chars = 0
+
+    def _keeps_current(self) -> bool:
+        return self._closed % self._stride == 0
+
+    def add(self, text: str) -> None:
+        """Add the text of the next page."""
+        text = text.strip()[:self.part_chars]
+        if not text:
+            return
+        if self._current_chars and self._current_chars + len(text) + 2 > self.part_chars:
+            self._close()
+        if self._keeps_current():
+            self._current = f"{self._current}\n\n{text}" if self._current else text
+        self._current_chars += len(text) + 2 if self._current_chars else len(text)
+
+    def _close(self) -> None:
+        if self._keeps_current():
+            self._kept.append(self._current)
+            if len(self._kept) > 2 * self.max_parts:
+                self._kept = self._kept[::2]
+                self._stride *= 2
+        self._closed += 1
+        self._current = ""
+        self._current_chars = 0
+
+    def parts(self) -> List[str]:
+        """
+        Return the parts to summarize.
+
+        Returns:
+            List[str]: At most `max_parts` parts, in document order.
+        """
+        parts = list(self._kept)
+        if self._current_chars and self._keeps_current():
+            parts.append(self._current)
+        if len(parts) > self.max_parts:
+            step = len(parts) / self.max_parts
+            parts = [parts[int(i * step)] for i in range(self.max_parts)]
+        return parts
+
+
+def split_parts(texts: Iterable[str], part_chars: int = PART_CHARS, max_parts: int = MAX_PARTS) -> List[str]:
+    """
+    Group page texts into parts for the map step.
+
+    Args:
+        texts (Iterable[str]): The text of each page, in order.
+        part_chars (int): Largest part; longer pages are truncated to it.
+        max_parts (int): Parts kept at most, spread evenly over the document.
+
+    Returns:
+        List[str]: The parts.
+    """
+    sampler = PartSampler(part_chars, max_parts)
+    for text in texts:
+        sampler.add(text)
+    return sampler.parts()
+
+
+def _parse(content: str) -> Dict[str, Any]:
+    """Read the JSON answer of the model, tolerating text around it."""
+    start, end = content.find("{"), content.rfind("}")
+    try:
+        data = json.loads(content[start:end + 1])
+    except ValueError:
+        return {"summary": content.strip(), "keywords": []}
+    keywords = [str(k).strip() for k in data.get("keywords") or [] if str(k).strip()]
+    return {"summary": str(data.get("summary") or "").strip(), "keywords": keywords}
+
+
+class DocumentSummarizer:
+    """
+    Map-reduce summarizer of extracted pages.
+    """
+
+    def __init__(self, model: Optional[Any] = None) -> None:
+        """
+        Initialize the summarizer.
+
+        Args:
+            model (Optional[Any]): A LangChain chat model; defaults to ChatOpenAI with SUMMARY_MODEL.
+        """
+        self.model = model or ChatOpenAI(
+            model=SUMMARY_MODEL,
+            api_key=os.getenv("OPENAI_API_KEY"),
+            temperature=0,
+        )
+
+    def summarize(self, source: str, parts: List[str]) -> Optional[Dict[str, Any]]:
+        """
+        Summarize a document.
+
+        Args:
+            source (str): The source name of the document, given to the model as context.
+            parts (List[str]): The parts of the document, from `split_parts` or `PartSampler.parts`.
+
+        Returns:
+            Optional[Dict[str, Any]]: The summary, keywords, number of parts and seconds spent,
+            or None if the document has no text.
+        """
+        started = time.perf_counter()
+        if not parts:
+            return None
+
+        prompts = [
+            MAP_PROMPT.format(source=source, part=i + 1, parts=len(parts), keywords=MAX_KEYWORDS, text=part)
+            for i, part in enumerate(parts)
+        ]
+        responses = self.model.batch(prompts, config={"max_concurrency": SUMMARY_CONCURRENCY})
+        partial = [_parse(response.content) for response in responses]
+
+        if len(partial) == 1:
+            result = partial[0]
+        else:
+            text = "\n\n".join(
+                f"Part {i + 1}: {p['summary']}\nKeywords: {', '.join(p['keywords'])}"
+                for i, p in enumerate(partial)
+            )
+            prompt = REDUCE_PROMPT.format(source=source, words=SUMMARY_MAX_WORDS, keywords=MAX_KEYWORDS, text=text)
+            result = _parse(self.model.invoke(prompt).content)
+
+        return {
+            "summary": result["summary"],
+            "keywords": result["keywords"][:MAX_KEYWORDS],
+            "parts": len(parts),
+            "model": SUMMARY_MODEL,
+            "seconds": round(time.perf_counter() - started, 3),
+        }
+
+
+_summarizer: Optional[DocumentSummarizer] = None
+
+
+def get_summarizer() -> DocumentSummarizer:
+    """Return the process-wide summarizer."""
+    global _summarizer
+    if _summarizer is None:
+        _summarizer = DocumentSummarizer()
+    return _summarizer
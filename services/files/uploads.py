@@ -0,0 +1,159 @@
+"""
+Streaming storage of uploaded files with on-the-fly hashing and size limits.
+"""
+import os
+import stat
+import asyncio
+import hashlib
+import logging
+import zipfile
+from pathlib import Path
+from typing import Iterable, List, Tuple
+
+from fastapi import UploadFile
+
+from .utils import secure_filename
+
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the upload and written to disk per iteration
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured maximum size."""
+
+    def __init__(self, max_bytes: int) -> None:
+        super().__init__(f"Upload exceeds the maximum size of {max_bytes} bytes")
+        self.max_bytes = max_bytes
+
+
+class ArchiveError(Exception):
+    """Raised when an uploaded archive is invalid or has too many files."""
+
+
+async def save_upload(
+    upload: UploadFile,
+    destination: Path,
+    max_bytes: int,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> Tuple[int, str]:
+    """
+    Stream an uploaded file to disk in fixed-size chunks.
+
+    The SHA-256 is computed while streaming and the upload is rejected as soon as it
+    exceeds `max_bytes`. Data is written to a temporary ".part" file that is renamed
+    into place only once complete, so a failed upload never leaves a truncated file.
+
+    Args:
+        upload (UploadFile): The uploaded file.
+        destination (Path): The final path of the file.
+        max_bytes (int): The maximum accepted size in bytes.
+        chunk_size (int): Bytes read and written per iteration.
+
+    Returns:
+        Tuple[int, str]: The size in bytes and the hex SHA-256 digest of the file.
+
+    Raises:
+        UploadTooLargeError: If the upload exceeds `max_bytes`.
+    """
+    sha256 = hashlib.sha256()
+    size = 0
+    partial = destination.with_name(destination.name + ".part")
+
+    file = await asyncio.to_thread(open, partial, "wb")
+    try:
+        while chunk := await upload.read(chunk_size):
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(max_bytes)
+            sha256.update(chunk)
+            await asyncio.to_thread(file.write, chunk)
+    except BaseException:
+        await asyncio.to_thread(file.close)
+        partial.unlink(missing_ok=True)
+        raise
+    await asyncio.to_thread(file.close)
+
+    os.replace(partial, destination)
+    logger.info(f"Upload stored at '{destination}' ({size} bytes, sha256 {sha256.hexdigest()[:12]})")
+    return size, sha256.hexdigest()
+
+
+def extract_archive(
+    archive: Path,
+    destination: Path,
+    allowed_extensions: Iterable[str],
+    max_bytes: int,
+    max_files: int,
+    chunk_size: int = UPLOAD_CHUNK_SIZE,
+) -> List[Tuple[Path, int, str]]:
+    """
+    Unpack the supported files of a zip archive into a flat directory.
+
+    Member paths are reduced to a sanitized base name, so no entry can be written
+    outside `destination` (zip slip). Directories, symlinks, hidden files and
+    unsupported extensions are skipped. The uncompressed bytes actually read are
+    counted, so archives that lie about their sizes (zip bombs) are cut off too.
+
+    Args:
+        archive (Path): The zip file.
+        destination (Path): The directory where the files are written.
+        allowed_extensions (Iterable[str]): Accepted extensions, without the dot.
+        max_bytes (int): Maximum total uncompressed size in bytes.
+        max_files (int): Maximum number of files extracted.
+        chunk_size (int): Bytes read and written per iteration.
+
+    Returns:
+        List[Tuple[Path, int, str]]: The path, size and hex SHA-256 of each extracted file.
+
+    Raises:
+        ArchiveError: If the archive is not a valid zip or has more than `max_files` files.
+        UploadTooLargeError: If the uncompressed content exceeds `max_bytes`.
+    """
+    allowed = {ext.lower() for ext in allowed_extensions}
+    destination.mkdir(parents=True, exist_ok=True)
+    extracted: List[Tuple[Path, int, str]] = []
+    total = 0
+
+    try:
+        package = zipfile.ZipFile(archive)
+    except zipfile.BadZipFile as e:
+        raise ArchiveError("The archive is not a valid zip file") from e
+
+    with package:
+        for info in package.infolist():
+            base_name = Path(info.filename.replace("\\", "/")).name
+            is_symlink = stat.S_ISLNK(info.external_attr >> 16)
+            if info.is_dir() or is_symlink or not base_name or base_name.startswith(".") or "__MACOSX" in info.filename:
+                continue
+            name = secure_filename(base_name)
+            if "." not in name or name.rsplit(".", 1)[1].lower() not in allowed:
+                logger.info(f"Skipping unsupported archive member '{info.filename}'")
+                continue
+            if len(extracted) >= max_files:
+                raise ArchiveError(f"The archive has more than {max_files} supported files")
+
+            target = destination / name
+            counter = 1
+            while target.exists():
+                target = destination / f"{Path(name).stem}_{counter}{Path(name).suffix}"
+                counter += 1
+
+            sha256 = hashlib.sha256()
+            size = 0
+            with package.open(info) as source, open(target, "wb") as output:
+                while chunk := source.read(chunk_size):
+                    size += len(chunk)
+                    total += len(chunk)
+                    if total > max_bytes:
+                        output.close()
+                        target.unlink(missing_ok=True)
+                        raise UploadTooLargeError(max_bytes)
+                    sha256.update(chunk)
+                    output.write(chunk)
+            extracted.append((target, size, sha256.hexdigest()))
+
+    logger.info(f"Extracted {len(extracted)} files ({total} bytes) from '{archive}'")
+    return extracted
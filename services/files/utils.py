@@ -3,7 +3,9 @@ Utility functions for file processing and management.
 """
 import os
 import re
+import hashlib
 import unicodedata
+from pathlib import Path
 
 
 def secure_filename(filename: str) -> str:
@@ -36,3 +38,20 @@ def secure_filename(filename: str) -> str:
             filename = f"_{filename}"
 
         return filename
+
+
+def namespace_folder(root: Path, namespace: str) -> Path:
+    """
+    Return the directory under `root` that holds the files of a namespace.
+
+    The directory is named after a hash of the namespace, so files of different
+    users never share a path even when they have the same name.
+
+    Args:
+        root (Path): The shared directory (e.g. the originals or PDFs folder).
+        namespace (str): The namespace (user email).
+
+    Returns:
+        Path: The namespace's directory; it is not created.
+    """
+    return Path(root) / hashlib.sha256(namespace.encode("utf-8")).hexdigest()[:32]
@@ -0,0 +1,9 @@
+"""
+Jobs package for background ingestion.
+"""
+from .queue import IngestionQueue
+
+
+__all__ = [
+    "IngestionQueue",
+]
@@ -0,0 +1,231 @@
+"""
+Redis-backed ingestion job queue built on Redis Streams with consumer groups.
+"""
+import json
+import time
+import uuid
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+
+from redis import Redis
+from redis.exceptions import ResponseError
+
+
+logger = logging.getLogger(__name__)
+
+STREAM_KEY = "ingest:jobs"
+GROUP_NAME = "ingest-workers"
+JOB_KEY_PREFIX = "ingest:job"
+# Channel where the namespace of every finished job is published, so the API refreshes its agent
+DONE_CHANNEL = "ingest:done"
+# Finished jobs are kept for a week so clients can still read their status
+JOB_TTL_SECONDS = 7 * 24 * 3600
+
+
+def _decode(value: Any) -> Any:
+    return value.decode() if isinstance(value, bytes) else value
+
+
+class IngestionQueue:
+    """
+    Queue of ingestion jobs shared by the API and the ingestion workers.
+
+    Each job is a Redis hash (ingest:job:<id>) holding its status and per-stage
+    progress; the stream only carries job ids to the consumer group.
+    """
+
+    def __init__(self, redis_conn: Redis) -> None:
+        """
+        Initialize the queue.
+
+        Args:
+            redis_conn (Redis): The Redis connection.
+        """
+        self.redis = redis_conn
+
+    @staticmethod
+    def job_key(job_id: str) -> str:
+        """Return the Redis key of a job."""
+        return f"{JOB_KEY_PREFIX}:{job_id}"
+
+    @staticmethod
+    def files_key(job_id: str) -> str:
+        """Return the Redis key holding the per-file progress of a batch job."""
+        return f"{JOB_KEY_PREFIX}:{job_id}:files"
+
+    def ensure_group(self) -> None:
+        """Create the stream and consumer group if they do not exist."""
+        try:
+            self.redis.xgroup_create(STREAM_KEY, GROUP_NAME, id="0", mkstream=True)
+            logger.info(f"Consumer group '{GROUP_NAME}' created on '{STREAM_KEY}'")
+        except ResponseError as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+
+    def enqueue(self, namespace: str, file_path: str, pdfs_dir: str, filename: str, **options: Any) -> str:
+        """
+        Register a new ingestion job and push it to the stream.
+
+        Args:
+            namespace (str): The namespace (user email) the file belongs to.
+            file_path (str): The path to the uploaded file.
+            pdfs_dir (str): The directory where processed PDFs are stored.
+            filename (str): The stored file name, reported back to the client.
+            **options: Extra job options forwarded to the worker.
+
+        Returns:
+            str: The job id.
+        """
+        job_id = uuid.uuid4().hex
+        self.redis.hset(
+            self.job_key(job_id),
+            mapping={
+                "job_id": job_id,
+                "status": "queued",
+                "stage": "queued",
+                "namespace": namespace,
+                "file_path": file_path,
+                "pdfs_dir": pdfs_dir,
+                "filename": filename,
+                "options": json.dumps(options),
+                "stages": json.dumps({}),
+                "created_at": time.time(),
+            },
+        )
+        self.redis.xadd(STREAM_KEY, {"job_id": job_id})
+        logger.info(f"Ingestion job {job_id} queued for '{filename}' ({namespace})")
+        return job_id
+
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Read a job and its per-stage progress.
+
+        Args:
+            job_id (str): The job id.
+
+        Returns:
+            Optional[Dict[str, Any]]: The job, or None if it does not exist.
+        """
+        raw = self.redis.hgetall(self.job_key(job_id))
+        if not raw:
+            return None
+        job = {_decode(k): _decode(v) for k, v in raw.items()}
+        for field in ("stages", "options", "result"):
+            if field in job:
+                job[field] = json.loads(job[field])
+        files = self.redis.hgetall(self.files_key(job_id))
+        if files:
+            job["files"] = {_decode(k): json.loads(_decode(v)) for k, v in files.items()}
+        return job
+
+    def update_job(self, job_id: str, **fields: Any) -> None:
+        """Update top-level fields of a job."""
+        mapping = {k: json.dumps(v) if isinstance(v, (dict, list)) else v for k, v in fields.items()}
+        self.redis.hset(self.job_key(job_id), mapping=mapping)
+
+    def update_stage(self, job_id: str, stage: str, info: Dict[str, Any]) -> None:
+        """
+        Record the progress of a single stage.
+
+        Args:
+            job_id (str): The job id.
+            stage (str): The stage name.
+            info (Dict[str, Any]): The stage status, timing and counters.
+        """
+        key = self.job_key(job_id)
+        stages = json.loads(_decode(self.redis.hget(key, "stages")) or "{}")
+        stages[stage] = info
+        self.redis.hset(key, mapping={"stage": stage, "stages": json.dumps(stages)})
+
+    def update_file(self, job_id: str, filename: str, state: Dict[str, Any]) -> None:
+        """
+        Record the progress of one file of a batch job.
+
+        Each file is a field of its own hash, so concurrent files never overwrite each other.
+
+        Args:
+            job_id (str): The job id.
+            filename (str): The stored file name.
+            state (Dict[str, Any]): The file status, stages and result.
+        """
+        self.redis.hset(self.files_key(job_id), filename, json.dumps(state))
+
+    def finish_job(self, job_id: str, status: str, **fields: Any) -> None:
+        """
+        Mark a job as finished and schedule its expiration.
+
+        A job that indexed files announces its namespace on DONE_CHANNEL.
+        """
+        self.update_job(job_id, status=status, finished_at=time.time(), **fields)
+        self.redis.expire(self.job_key(job_id), JOB_TTL_SECONDS)
+        self.redis.expire(self.files_key(job_id), JOB_TTL_SECONDS)
+        if status == "done":
+            namespace = _decode(self.redis.hget(self.job_key(job_id), "namespace"))
+            if namespace:
+                self.redis.publish(DONE_CHANNEL, namespace)
+
+    def subscribe_done(self) -> Any:
+        """
+        Subscribe to the namespaces of finished jobs.
+
+        Returns:
+            Any: A Redis PubSub subscribed to DONE_CHANNEL; each message data is a namespace.
+        """
+        pubsub = self.redis.pubsub(ignore_subscribe_messages=True)
+        pubsub.subscribe(DONE_CHANNEL)
+        return pubsub
+
+    def read(self, consumer: str, count: int = 1, block_ms: int = 5000) -> List[Tuple[str, str]]:
+        """
+        Read new job ids for a consumer of the group.
+
+        Args:
+            consumer (str): The consumer name.
+            count (int): Maximum number of jobs to read.
+            block_ms (int): Milliseconds to block waiting for jobs.
+
+        Returns:
+            List[Tuple[str, str]]: Pairs of (stream entry id, job id).
+        """
+        response = self.redis.xreadgroup(GROUP_NAME, consumer, {STREAM_KEY: ">"}, count=count, block=block_ms)
+        entries = []
+        for _, messages in response or []:
+            for entry_id, data in messages:
+                entries.append((_decode(entry_id), _decode(data.get(b"job_id", data.get("job_id")))))
+        return entries
+
+    def claim_stale(self, consumer: str, min_idle_ms: int, count: int = 10) -> List[Tuple[str, str]]:
+        """
+        Claim jobs left pending by workers that died mid-job.
+
+        Args:
+            consumer (str): The consumer that takes over the jobs.
+            min_idle_ms (int): Minimum idle time before a pending job is reclaimed.
+            count (int): Maximum number of jobs to claim.
+
+        Returns:
+            List[Tuple[str, str]]: Pairs of (stream entry id, job id).
+        """
+        response = self.redis.xautoclaim(STREAM_KEY, GROUP_NAME, consumer, min_idle_ms, "0-0", count=count)
+        messages = response[1] if response else []
+        return [
+            (_decode(entry_id), _decode(data.get(b"job_id", data.get("job_id"))))
+            for entry_id, data in messages
+            if data
+        ]
+
+    def touch(self, consumer: str, entry_ids: List[str]) -> None:
+        """
+        Reset the idle time of jobs a live consumer is still processing, so they are not reclaimed.
+
+        Args:
+            consumer (str): The consumer processing the jobs.
+            entry_ids (List[str]): The stream entry ids of the jobs.
+        """
+        if entry_ids:
+            self.redis.xclaim(STREAM_KEY, GROUP_NAME, consumer, 0, entry_ids, justid=True)
+
+    def ack(self, entry_id: str) -> None:
+        """Acknowledge and remove a processed stream entry."""
+        self.redis.xack(STREAM_KEY, GROUP_NAME, entry_id)
+        self.redis.xdel(STREAM_KEY, entry_id)
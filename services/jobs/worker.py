@@ -0,0 +1,221 @@
+"""
+Ingestion worker: consumes jobs from the Redis stream and runs the ingestion
+pipeline out of the API process.
+
+    python -m services.jobs.worker
+"""
+import os
+import time
+import socket
+import asyncio
+import logging
+from typing import Any, Dict, List, Tuple
+
+from dotenv import load_dotenv
+from prometheus_client import start_http_server
+
+from .queue import IngestionQueue
+from ..connections import get_redis_conn
+from ..files import IngestionError, StorageManager, ingest_batch_async, ingest_file_async
+from ..files.storage import SWEEP_INTERVAL
+from ..files.ocr_scheduler import publish_metrics
+
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionWorker:
+    """
+    Runs up to `concurrency` ingestion jobs at a time for one consumer of the group.
+    """
+
+    def __init__(self, queue: IngestionQueue, consumer: str, concurrency: int = 2, claim_idle_ms: int = 600_000) -> None:
+        """
+        Initialize the worker.
+
+        Args:
+            queue (IngestionQueue): The job queue.
+            consumer (str): Unique consumer name within the group.
+            concurrency (int): Maximum number of jobs processed at once.
+            claim_idle_ms (int): Idle time after which a pending job of a dead worker is reclaimed.
+        """
+        self.queue = queue
+        self.consumer = consumer
+        self.concurrency = concurrency
+        self.claim_idle_ms = claim_idle_ms
+        self._slots = asyncio.Semaphore(concurrency)
+        # Jobs in progress, by stream entry id; kept claimed while they run
+        self._running: Dict[str, str] = {}
+        self._last_claim = 0.0
+        self.metrics_interval = float(os.getenv("OCR_METRICS_INTERVAL", "5"))
+
+    async def process(self, entry_id: str, job_id: str) -> None:
+        """
+        Process a single job and acknowledge it.
+
+        Args:
+            entry_id (str): The stream entry id.
+            job_id (str): The job id.
+        """
+        try:
+            job = await asyncio.to_thread(self.queue.get_job, job_id)
+            if job is None:
+                logger.warning(f"Job {job_id} not found, skipping")
+                return
+
+            logger.info(f"Processing job {job_id} for '{job['filename']}'")
+            await asyncio.to_thread(self.queue.update_job, job_id, status="running")
+
+            def _on_stage(stage: str, status: str, info: Dict[str, Any]) -> None:
+                self.queue.update_stage(job_id, stage, info)
+
+            if job["options"].get("files"):
+                await self.process_batch(job_id, job)
+                return
+
+            try:
+                result = await ingest_file_async(
+                    namespace=job["namespace"],
+                    file_path=job["file_path"],
+                    pdfs_dir=job["pdfs_dir"],
+                    on_stage=_on_stage,
+                    sha256=job["options"].get("sha256"),
+                    language=job["options"].get("language"),
+                )
+                await asyncio.to_thread(self.queue.finish_job, job_id, "done", result=result)
+                logger.info(f"Job {job_id} completed")
+            except IngestionError as e:
+                logger.error(f"Job {job_id} failed at stage '{e.stage}': {e}")
+                await asyncio.to_thread(self.queue.finish_job, job_id, "failed", error=str(e), failed_stage=e.stage)
+            except Exception as e:
+                logger.exception(f"Unexpected error in job {job_id}: {e}")
+                await asyncio.to_thread(self.queue.finish_job, job_id, "failed", error=str(e))
+        finally:
+            await asyncio.to_thread(self.queue.ack, entry_id)
+            self._running.pop(entry_id, None)
+            self._slots.release()
+
+    async def process_batch(self, job_id: str, job: Dict[str, Any]) -> None:
+        """
+        Process a batch job: every file shares the embedding and insert batches.
+
+        Args:
+            job_id (str): The job id.
+            job (Dict[str, Any]): The job, with its files in the options.
+        """
+        def _on_file(filename: str, state: Dict[str, Any]) -> None:
+            self.queue.update_file(job_id, filename, state)
+
+        try:
+            summary = await ingest_batch_async(
+                namespace=job["namespace"],
+                files=job["options"]["files"],
+                pdfs_dir=job["pdfs_dir"],
+                on_file=_on_file,
+                language=job["options"].get("language"),
+            )
+            status = "done" if summary["done"] else "failed"
+            # Per-file states are already in the files hash
+            result = {key: value for key, value in summary.items() if key != "files"}
+            await asyncio.to_thread(self.queue.finish_job, job_id, status, result=result)
+            logger.info(f"Batch job {job_id} completed: {summary['done']}/{summary['total']} files")
+        except IngestionError as e:
+            logger.error(f"Batch job {job_id} failed at stage '{e.stage}': {e}")
+            await asyncio.to_thread(self.queue.finish_job, job_id, "failed", error=str(e), failed_stage=e.stage)
+        except Exception as e:
+            logger.exception(f"Unexpected error in batch job {job_id}: {e}")
+            await asyncio.to_thread(self.queue.finish_job, job_id, "failed", error=str(e))
+
+    async def report_metrics(self) -> None:
+        """Publish the OCR scheduler metrics of this worker until cancelled."""
+        while True:
+            try:
+                await asyncio.to_thread(
+                    publish_metrics, self.queue.redis, self.consumer, int(self.metrics_interval * 6)
+                )
+            except Exception as e:
+                logger.warning(f"Could not publish OCR metrics: {e}")
+            await asyncio.sleep(self.metrics_interval)
+
+    async def sweep_storage(self) -> None:
+        """Compress or evict ingested originals and delete unreferenced files every SWEEP_INTERVAL seconds."""
+        storage = StorageManager(self.queue.redis)
+        while True:
+            await asyncio.sleep(SWEEP_INTERVAL)
+            try:
+                await asyncio.to_thread(storage.try_sweep)
+            except Exception as e:
+                logger.warning(f"Storage sweep failed: {e}")
+
+    async def keep_claimed(self) -> None:
+        """Reset the idle time of the running jobs so other workers do not reclaim them until cancelled."""
+        while True:
+            await asyncio.sleep(self.claim_idle_ms / 3000)
+            try:
+                await asyncio.to_thread(self.queue.touch, self.consumer, list(self._running))
+            except Exception as e:
+                logger.warning(f"Could not refresh the running jobs: {e}")
+
+    async def claim_stale(self) -> List[Tuple[str, str]]:
+        """Claim the jobs of workers that died mid-job."""
+        self._last_claim = time.monotonic()
+        try:
+            claimed = await asyncio.to_thread(self.queue.claim_stale, self.consumer, self.claim_idle_ms, self.concurrency)
+        except Exception as e:
+            logger.warning(f"Could not reclaim stale jobs: {e}")
+            return []
+        if claimed:
+            logger.info(f"Reclaimed {len(claimed)} jobs left by dead workers")
+        return claimed
+
+    async def run(self) -> None:
+        """Consume jobs until cancelled."""
+        await asyncio.to_thread(self.queue.ensure_group)
+        logger.info(f"Ingestion worker '{self.consumer}' started with concurrency {self.concurrency}")
+
+        tasks = {asyncio.create_task(self.report_metrics()), asyncio.create_task(self.keep_claimed())}
+        if SWEEP_INTERVAL > 0:
+            tasks.add(asyncio.create_task(self.sweep_storage()))
+        pending = await self.claim_stale()
+        while True:
+            # Only read a new job once a slot is free so other workers can take it
+            await self._slots.acquire()
+            # Dead workers' jobs are reclaimed when the stream is idle, and at least every claim_idle_ms
+            if not pending and time.monotonic() - self._last_claim >= self.claim_idle_ms / 1000:
+                pending = await self.claim_stale()
+            if not pending:
+                pending = await asyncio.to_thread(self.queue.read, self.consumer, count=1)
+            if not pending:
+                pending = await self.claim_stale()
+            if not pending:
+                self._slots.release()
+                continue
+            entry_id, job_id = pending.pop(0)
+            self._running[entry_id] = job_id
+            task = asyncio.create_task(self.process(entry_id, job_id))
+            tasks.add(task)
+            task.add_done_callback(tasks.discard)
+
+
+def main() -> None:
+    """Command line entry point."""
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    worker = IngestionWorker(
+        queue=IngestionQueue(get_redis_conn()),
+        consumer=os.getenv("INGEST_WORKER_NAME", f"{socket.gethostname()}-{os.getpid()}"),
+        concurrency=int(os.getenv("INGEST_WORKER_CONCURRENCY", "2")),
+    )
+    # Expose the ingestion metrics of this worker for Prometheus to scrape
+    metrics_port = int(os.getenv("INGEST_METRICS_PORT", "9102"))
+    if metrics_port:
+        start_http_server(metrics_port)
+        logger.info(f"Ingestion metrics exposed on port {metrics_port}")
+    asyncio.run(worker.run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,450 @@
+"""
+Offline bulk re-index / re-embed of the RAG collection.
+
+Rebuilds every namespace's vectors into a shadow collection and atomically
+points the serving alias (MILVUS_COLLECTION) at it once it is complete:
+
+    python -m services.reindex --workers 8
+    python -m services.reindex --resume --checkpoint reindex.ckpt
+
+Documents are re-extracted from the namespace's folder under BASE_DIR/pdfs (or
+BASE_DIR/pdfs itself for files uploaded before per-user folders) when the PDF is
+still on disk, otherwise the text exported from the current collection is re-embedded.
+Serving processes must keep MILVUS_DROP_OLD=false (the default) so that logins
+and ingestions do not drop the collection behind the alias.
+
+Uploads and deletions keep reaching the serving collection while the shadow one
+is built. Before the swap, catch-up passes compare the serving collection with
+the checkpoint and re-index the sources added or changed (by row count) since
+they were exported, and remove the deleted ones. Writes made after the last pass are not
+copied, so freeze uploads and deletions for the final pass and the swap.
+"""
+import os
+import json
+import time
+import logging
+import argparse
+import threading
+from pathlib import Path
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+from pymilvus import Collection, MilvusClient, connections
+from langchain_core.documents import Document
+from langchain_openai import OpenAIEmbeddings
+
+from .agent import MilvusStorage
+from .files import OCRProcessor, namespace_folder
+from .files.ocr import PAGE_TEXT
+from .files.streaming import iter_chunks
+
+
+logger = logging.getLogger(__name__)
+
+EXPORT_FIELDS = ["namespace", "source", "page", "author", "text"]
+# Exported too when the collection has it (collections created after it was added)
+CHUNK_FIELD = "chunk"
+SYSTEM_NAMESPACES = {"dummy"}
+# Catch-up passes at most before swapping a collection that is still being written to
+CATCH_UP_PASSES = 3
+
+SourceKey = Tuple[str, str]
+
+
+class Checkpoint:
+    """
+    Append-only record of the (namespace, source) pairs already re-indexed.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """
+        Initialize the checkpoint.
+
+        Args:
+            path (Path): File where progress is recorded, one JSON object per line.
+        """
+        self.path = path
+        self._lock = threading.Lock()
+
+    def load(self) -> Tuple[Optional[str], Dict[SourceKey, Optional[int]]]:
+        """
+        Load the shadow collection name and the completed sources.
+
+        Returns:
+            Tuple[Optional[str], Dict[SourceKey, Optional[int]]]: The target collection and the
+            done sources, each with the number of serving rows it was built from (None if the
+            checkpoint predates that count).
+        """
+        target, done = None, {}
+        if not self.path.exists():
+            return target, done
+        with open(self.path, "r", encoding="utf-8") as file:
+            for line in file:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if "target" in entry:
+                    target = entry["target"]
+                elif entry.get("removed"):
+                    done.pop((entry["namespace"], entry["source"]), None)
+                else:
+                    done[(entry["namespace"], entry["source"])] = entry.get("exported")
+        return target, done
+
+    def start(self, target: str) -> None:
+        """Start a new checkpoint for the given shadow collection."""
+        with open(self.path, "w", encoding="utf-8") as file:
+            file.write(json.dumps({"target": target}) + "\n")
+
+    def mark_done(self, key: SourceKey, rows: int, exported: int) -> None:
+        """Record a completed (namespace, source) pair and the serving rows it was built from."""
+        self._append({"namespace": key[0], "source": key[1], "rows": rows, "exported": exported})
+
+    def mark_removed(self, key: SourceKey) -> None:
+        """Record a source deleted from the serving collection after it was re-indexed."""
+        self._append({"namespace": key[0], "source": key[1], "removed": True})
+
+    def _append(self, entry: Dict[str, object]) -> None:
+        with self._lock, open(self.path, "a", encoding="utf-8") as file:
+            file.write(json.dumps(entry) + "\n")
+            file.flush()
+            os.fsync(file.fileno())
+
+
+def _source_filter(keys: Iterable[SourceKey]) -> str:
+    """Build a Milvus filter matching the rows of the given sources."""
+    return " or ".join(f"(namespace == '{namespace}' and source == '{source}')" for namespace, source in keys)
+
+
+def _iter_rows(
+    collection_name: str,
+    milvus_url: str,
+    fields: List[str],
+    expr: str,
+    batch_size: int = 1000,
+) -> Iterator[Dict[str, object]]:
+    """
+    Iterate over the rows of a collection.
+
+    The `chunk` field is added to `fields` when the collection has it.
+    """
+    connections.connect("reindex", uri=milvus_url)
+    try:
+        collection = Collection(collection_name, using="reindex")
+        collection.load()
+        fields = list(fields)
+        if any(field.name == CHUNK_FIELD for field in collection.schema.fields):
+            fields.append(CHUNK_FIELD)
+        iterator = collection.query_iterator(batch_size=batch_size, expr=expr, output_fields=fields)
+        while True:
+            rows = iterator.next()
+            if not rows:
+                iterator.close()
+                break
+            yield from rows
+    finally:
+        connections.disconnect("reindex")
+
+
+def export_collection(
+    collection_name: str,
+    milvus_url: str,
+    batch_size: int = 1000,
+    keys: Optional[Iterable[SourceKey]] = None,
+) -> Dict[SourceKey, List[Document]]:
+    """
+    Export the current collection grouped by (namespace, source).
+
+    Args:
+        collection_name (str): Serving collection or alias to export.
+        milvus_url (str): The Milvus URI.
+        batch_size (int): Rows fetched per iterator batch.
+        keys (Optional[Iterable[SourceKey]]): Only export these sources.
+
+    Returns:
+        Dict[SourceKey, List[Document]]: The exported pages of each source.
+    """
+    expr = _source_filter(keys) if keys is not None else 'namespace != "dummy"'
+    grouped: Dict[SourceKey, List[Document]] = defaultdict(list)
+    for row in _iter_rows(collection_name, milvus_url, EXPORT_FIELDS, expr, batch_size):
+        metadata = {
+            field: value
+            for field, value in row.items()
+            if field != "text" and (field in EXPORT_FIELDS or field == CHUNK_FIELD)
+        }
+        grouped[(row["namespace"], row["source"])].append(
+            Document(page_content=row.get("text", ""), metadata=metadata)
+        )
+    logger.info(f"Exportadas {sum(len(d) for d in grouped.values())} filas de {len(grouped)} archivos")
+    return grouped
+
+
+def count_sources(collection_name: str, milvus_url: str, batch_size: int = 1000) -> Dict[SourceKey, int]:
+    """
+    Count the rows of each (namespace, source) in a collection, without reading their text.
+
+    Args:
+        collection_name (str): Serving collection or alias.
+        milvus_url (str): The Milvus URI.
+        batch_size (int): Rows fetched per iterator batch.
+
+    Returns:
+        Dict[SourceKey, int]: The number of rows of each source.
+    """
+    counts: Dict[SourceKey, int] = defaultdict(int)
+    for row in _iter_rows(collection_name, milvus_url, ["namespace", "source"], 'namespace != "dummy"', batch_size):
+        counts[(row["namespace"], row["source"])] += 1
+    return counts
+
+
+def merge_pages(exported: List[Document]) -> List[Document]:
+    """
+    Join the exported chunks of each page back into one page.
+
+    Rows of collections without the `chunk` field keep their export order.
+
+    Args:
+        exported (List[Document]): Rows exported from the serving collection.
+
+    Returns:
+        List[Document]: One document per page, in page order.
+    """
+    pages: Dict[int, List[Document]] = defaultdict(list)
+    for doc in exported:
+        pages[doc.metadata.get("page", 0)].append(doc)
+    merged = []
+    for page, chunks in sorted(pages.items()):
+        chunks.sort(key=lambda doc: doc.metadata.get(CHUNK_FIELD) or 0)
+        metadata = {key: value for key, value in chunks[0].metadata.items() if key != CHUNK_FIELD}
+        merged.append(Document(page_content="\n\n".join(doc.page_content for doc in chunks), metadata=metadata))
+    return merged
+
+
+def load_source(key: SourceKey, exported: List[Document], pdfs_dir: Path) -> List[Document]:
+    """
+    Re-extract a source from disk, falling back to the exported text.
+
+    Only pages with a text layer of their own are taken from the PDF. Pages that
+    needed OCR keep their exported text, which holds the OCR output: the PDF on
+    disk has no text layer for them unless OCR_SEARCHABLE_PDF was enabled.
+
+    The pages are split the way ingestion splits them (`iter_chunks`), so every
+    chunk carries its index in the metadata and gets its own ID.
+
+    Args:
+        key (SourceKey): The (namespace, source) pair.
+        exported (List[Document]): Rows exported from the serving collection.
+        pdfs_dir (Path): Directory with the processed PDFs.
+
+    Returns:
+        List[Document]: The chunks to embed.
+    """
+    namespace, source = key
+    pdf_path = namespace_folder(pdfs_dir, namespace) / source
+    if not pdf_path.exists():
+        pdf_path = pdfs_dir / source
+    exported_pages = merge_pages(exported)
+    pages: List[Document] = []
+    if pdf_path.exists():
+        pages = OCRProcessor.load_pdf(str(pdf_path), namespace=namespace)
+    if pages:
+        by_page = {doc.metadata.get("page", 0): doc for doc in exported_pages}
+        classes = OCRProcessor.classify_pages(str(pdf_path))
+        pages = [
+            doc if page_class == PAGE_TEXT else by_page.get(doc.metadata.get("page", 0), doc)
+            for doc, page_class in zip(pages, classes)
+        ]
+    else:
+        pages = exported_pages
+    return [doc for doc, _ in iter_chunks(pages)]
+
+
+def is_pending(key: SourceKey, rows: int, done: Dict[SourceKey, Optional[int]]) -> bool:
+    """Whether a source with `rows` serving rows is missing from the checkpoint or changed since."""
+    if key[0] in SYSTEM_NAMESPACES:
+        return False
+    return key not in done or done[key] not in (None, rows)
+
+
+def iter_pending(
+    grouped: Dict[SourceKey, List[Document]], done: Dict[SourceKey, Optional[int]]
+) -> Iterator[Tuple[SourceKey, List[Document]]]:
+    """Yield the sources not yet recorded in the checkpoint, or changed since."""
+    for key, docs in grouped.items():
+        if is_pending(key, len(docs), done):
+            yield key, docs
+
+
+def swap_alias(client: MilvusClient, alias: str, target: str, drop_legacy: bool) -> None:
+    """
+    Point the serving alias at the shadow collection.
+
+    Args:
+        client (MilvusClient): The Milvus client.
+        alias (str): The serving name (MILVUS_COLLECTION).
+        target (str): The fully built shadow collection.
+        drop_legacy (bool): Drop a real collection that still uses the alias name.
+    """
+    try:
+        previous = client.describe_alias(alias).get("collection_name")
+    except Exception:
+        previous = None
+
+    if previous:
+        client.alter_alias(target, alias)
+        logger.info(f"Alias '{alias}' movido de '{previous}' a '{target}'")
+        return
+
+    if client.has_collection(alias):
+        if not drop_legacy:
+            raise RuntimeError(
+                f"'{alias}' es una colección, no un alias. Vuelve a ejecutar con --drop-legacy "
+                f"para reemplazarla por un alias hacia '{target}'."
+            )
+        client.drop_collection(alias)
+        logger.warning(f"Colección legada '{alias}' eliminada")
+
+    client.create_alias(target, alias)
+    logger.info(f"Alias '{alias}' creado hacia '{target}'")
+
+
+def reindex(
+    alias: str,
+    pdfs_dir: Path,
+    checkpoint: Checkpoint,
+    workers: int = 4,
+    resume: bool = False,
+    embeddings_model: Optional[str] = None,
+    drop_legacy: bool = False,
+) -> str:
+    """
+    Rebuild the collection behind `alias` and swap the alias when done.
+
+    Args:
+        alias (str): The serving collection name.
+        pdfs_dir (Path): Directory with the processed PDFs.
+        checkpoint (Checkpoint): Progress record used to resume.
+        workers (int): Number of parallel extract/embed/insert workers.
+        resume (bool): Continue the shadow collection recorded in the checkpoint.
+        embeddings_model (Optional[str]): Embeddings model to use instead of EMBEDDINGS_MODEL.
+        drop_legacy (bool): Replace a real collection named `alias` by the alias.
+
+    Returns:
+        str: The name of the new collection now served through the alias.
+    """
+    milvus_url = os.getenv("MILVUS_URL", "http://localhost:19530")
+    target, done = checkpoint.load() if resume else (None, {})
+    if target is None:
+        target = f"{alias}_{time.strftime('%Y%m%d%H%M%S')}"
+        checkpoint.start(target)
+        done = {}
+    logger.info(f"Re-indexando '{alias}' en la colección sombra '{target}' ({len(done)} archivos ya hechos)")
+
+    shadow = MilvusStorage(collection_name=target)
+    if embeddings_model:
+        shadow.embeddings_model = OpenAIEmbeddings(model=embeddings_model, api_key=os.getenv("OPENAI_API_KEY"))
+    vectorstore = shadow.use_collection(drop_old=not done)
+    if vectorstore is None:
+        raise RuntimeError(f"No se pudo inicializar la colección sombra '{target}'")
+
+    def _process(key: SourceKey, exported: List[Document]) -> int:
+        if key in done:
+            # Changed since it was re-indexed: drop its previous rows first
+            shadow.delete_source(*key)
+        docs = load_source(key, exported, pdfs_dir)
+        ids = shadow.upsert_files(vectorstore, docs)
+        if ids is None and docs:
+            raise RuntimeError(f"Error insertando '{key[1]}' de '{key[0]}'")
+        checkpoint.mark_done(key, len(docs), len(exported))
+        return len(docs)
+
+    def _run(pending: Iterable[Tuple[SourceKey, List[Document]]]) -> int:
+        failures = 0
+        rows = 0
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = {executor.submit(_process, key, docs): key for key, docs in pending}
+            for future in as_completed(futures):
+                key = futures[future]
+                try:
+                    rows += future.result()
+                except Exception as e:
+                    failures += 1
+                    logger.error(f"Fallo re-indexando '{key[1]}' de '{key[0]}': {e}")
+        if failures:
+            raise RuntimeError(f"{failures} archivos fallaron; vuelve a ejecutar con --resume")
+        return rows
+
+    rows = _run(iter_pending(export_collection(alias, milvus_url), done))
+    logger.info(f"Re-indexadas {rows} filas en '{target}'")
+
+    # Catch up with the uploads and deletions that reached the serving collection meanwhile
+    for _ in range(CATCH_UP_PASSES):
+        _, done = checkpoint.load()
+        current = count_sources(alias, milvus_url)
+        removed = [key for key in done if key not in current]
+        changed = [key for key, count in current.items() if is_pending(key, count, done)]
+        if not removed and not changed:
+            break
+        for key in removed:
+            shadow.delete_source(*key)
+            checkpoint.mark_removed(key)
+        if changed:
+            _run(export_collection(alias, milvus_url, keys=changed).items())
+        logger.info(f"Pasada de actualización: {len(changed)} archivos nuevos o cambiados, {len(removed)} eliminados")
+    else:
+        logger.warning(
+            f"'{alias}' sigue recibiendo cambios tras {CATCH_UP_PASSES} pasadas de actualización; "
+            f"los posteriores a la última se perderán"
+        )
+    logger.warning(
+        f"Los cambios en '{alias}' posteriores a la última pasada no se copian a '{target}'; "
+        f"las subidas y borrados deben estar detenidos hasta el cambio de alias"
+    )
+
+    client = MilvusClient(uri=milvus_url)
+    try:
+        swap_alias(client, alias, target, drop_legacy)
+    finally:
+        client.close()
+    return target
+
+
+def main() -> None:
+    """Command line entry point."""
+    load_dotenv()
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+    )
+    parser = argparse.ArgumentParser(
+        description="Re-index the Zolkin RAG collection offline.",
+        epilog=(
+            "Uploads and deletions made while the shadow collection is built are picked up by "
+            f"up to {CATCH_UP_PASSES} catch-up passes before the alias swap. Freeze uploads and "
+            "deletions for the final pass and the swap: later writes are not copied."
+        ),
+    )
+    parser.add_argument("--alias", default=os.getenv("MILVUS_COLLECTION", "zolkin_collection"))
+    parser.add_argument("--pdfs-dir", default=str(Path(os.getenv("BASE_DIR", "./uploads")) / "pdfs"))
+    parser.add_argument("--checkpoint", default="reindex.ckpt")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--resume", action="store_true")
+    parser.add_argument("--embeddings-model", default=None)
+    parser.add_argument("--drop-legacy", action="store_true")
+    args = parser.parse_args()
+
+    reindex(
+        alias=args.alias,
+        pdfs_dir=Path(args.pdfs_dir),
+        checkpoint=Checkpoint(Path(args.checkpoint)),
+        workers=args.workers,
+        resume=args.resume,
+        embeddings_model=args.embeddings_model,
+        drop_legacy=args.drop_legacy,
+    )
+
+
+if __name__ == "__main__":
+    main()